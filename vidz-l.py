@@ -6,11 +6,29 @@ import json
 import uuid
 import subprocess
 import shutil
+import hashlib
+import threading
+from collections import OrderedDict
 import numpy as np
 import librosa
 import mido 
 from pydub import AudioSegment
 
+# --- SAFE IMPORT FOR FAST DECODE ---
+try:
+    import soundfile as sf
+    HAS_SOUNDFILE = True
+except ImportError:
+    HAS_SOUNDFILE = False
+SF_EXTENSIONS = {".wav", ".flac", ".ogg"} # Read by libsndfile straight into NumPy; everything else goes through pydub/ffmpeg
+
+# --- SAFE IMPORT FOR JIT ---
+try:
+    from numba import njit
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
 # --- IMPORTS ---
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QGridLayout, 
                              QLabel, QVBoxLayout, QPushButton, QSlider,
@@ -21,9 +39,10 @@ from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QGridLayout,
 from PyQt6.QtOpenGLWidgets import QOpenGLWidget
 from PyQt6.QtMultimedia import (QMediaPlayer, QAudioOutput, QMediaDevices)
 from PyQt6.QtMultimediaWidgets import QGraphicsVideoItem
-from PyQt6.QtCore import (QUrl, Qt, QTimer, QEvent, QThread, pyqtSignal, 
-                          QRectF, QPointF, QSizeF, QRect, QObject)
-from PyQt6.QtGui import QPainter, QColor, QPen, QBrush, QPixmap, QPolygonF, QFont, QCursor, QAction, QKeySequence
+from PyQt6.QtCore import (QUrl, Qt, QTimer, QEvent, QThread, pyqtSignal, pyqtSlot, QMetaObject,
+                          QRectF, QPointF, QSizeF, QRect, QObject, QLineF, QRunnable, QThreadPool,
+                          QVariantAnimation, QAbstractAnimation, QEasingCurve)
+from PyQt6.QtGui import QPainter, QColor, QPen, QBrush, QPixmap, QImage, QPolygonF, QFont, QCursor, QAction, QKeySequence
 
 # --- STYLING ---
 DARK_THEME = """
@@ -57,8 +76,55 @@ QHeaderView::section { background-color: #2a2a2a; padding: 4px; border: 1px soli
 QTableWidget::item:selected { background-color: #00CCFF; color: black; }
 """
 
+# Tempo-only estimator (moved to librosa.feature.rhythm in 0.10)
+_estimate_tempo = librosa.feature.rhythm.tempo if hasattr(librosa.feature, "rhythm") else librosa.beat.tempo
+
 KEY_MAP = {'a': (0, 0, "#FF0055"), 's': (0, 1, "#00CCFF"), 'd': (1, 0, "#00FF66"), 'f': (1, 1, "#FFAA00")}
 
+# --- ZERO-CROSSING SEARCH (hot path on every trigger) ---
+if HAS_NUMBA:
+    @njit(cache=True)
+    def _zc_argmin(samples, s, e):
+        # Scalar scan, no temporaries; widened so abs(-32768) can't wrap
+        bi = s; best = abs(np.int32(samples[s]))
+        for i in range(s + 1, e):
+            v = abs(np.int32(samples[i]))
+            if v < best: best = v; bi = i
+        return bi
+    # Pay the JIT cost at import, not on the first trigger: one specialization per dtype, and
+    # read-only arrays (memmapped wavs) are a distinct numba type from writable ones
+    for _dt in (np.int16, np.int32):
+        _warm = np.zeros(4, dtype=_dt); _zc_argmin(_warm, 0, 4); _warm.setflags(write=False); _zc_argmin(_warm, 0, 4)
+    del _dt, _warm
+else:
+    def _zc_argmin(samples, s, e, scratch):
+        # abs computed in int32 straight into the deck's buffer: no per-trigger allocation, no int16 wrap
+        buf = scratch[:e - s]; np.absolute(samples[s:e], out=buf, dtype=np.int32)
+        return s + int(buf.argmin())
+
+def map_wav_samples(path):
+    """Interleaved PCM of a 16/32-bit WAV as a read-only memmap (pages in on touch), or None."""
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(12)
+            if head[:4] != b'RIFF' or head[8:12] != b'WAVE': return None
+            dtype = None
+            while True:
+                chunk = f.read(8)
+                if len(chunk) < 8: return None
+                cid, size = chunk[:4], int.from_bytes(chunk[4:], 'little')
+                if cid == b'fmt ':
+                    fmt = f.read(size); f.seek(size & 1, 1)
+                    if int.from_bytes(fmt[0:2], 'little') in (1, 0xFFFE): dtype = {16: np.int16, 32: np.int32}.get(int.from_bytes(fmt[14:16], 'little'))
+                elif cid == b'data':
+                    if dtype is None: return None
+                    offset = f.tell(); count = min(size, os.path.getsize(path) - offset) // np.dtype(dtype).itemsize
+                    break
+                else: f.seek(size + (size & 1), 1)
+        # Plain ndarray view of the mapping: same lazy paging, and numba only types exact ndarrays
+        return np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=(count,)).view(np.ndarray) if count else None
+    except (OSError, ValueError): return None
+
 # ==========================================
 # 1. WORKERS & HELPERS
 # ==========================================
@@ -70,6 +136,9 @@ class MidiWorker(QThread):
         self.input_port = None
         self.port_name = None
         self.running = False
+        # Messages in arrival order, drained by _flush on the GUI thread; a knob sweep collapses to its latest CC per
+        # (channel, control) per pass. A note bumps _seg so later CCs can't merge into (and jump ahead of) earlier slots
+        self._pending = {}; self._pending_lock = threading.Lock(); self._flush_queued = False; self._seg = 0
     def set_port(self, name):
         if self.input_port: self.input_port.close()
         self.port_name = name
@@ -77,70 +146,128 @@ class MidiWorker(QThread):
         self.running = True
         if not self.port_name: return
         try:
-            with mido.open_input(self.port_name) as port:
+            # Backend (RtMidi) calls _on_midi on arrival; this thread just keeps the port open
+            with mido.open_input(self.port_name, callback=self._on_midi) as port:
                 self.input_port = port
-                while self.running:
-                    for msg in port.iter_pending(): self.message_received.emit(msg)
-                    time.sleep(0.001) 
+                while self.running: self.msleep(50)
         except: pass
+    def _on_midi(self, msg):
+        with self._pending_lock:
+            if msg.type == 'control_change': self._pending[(self._seg, msg.channel, msg.control)] = msg
+            else: self._seg += 1; self._pending[self._seg] = msg # Notes are never merged
+            if self._flush_queued: return
+            self._flush_queued = True
+        QMetaObject.invokeMethod(self, "_flush", Qt.ConnectionType.QueuedConnection)
+    @pyqtSlot()
+    def _flush(self):
+        with self._pending_lock: pending = self._pending; self._pending = {}; self._flush_queued = False
+        for m in pending.values(): self.message_received.emit(m)
     def stop(self): self.running = False; self.wait()
 
-class AudioAnalysisWorker(QThread):
-    finished = pyqtSignal(str, QPixmap, float, int, object, int, str)
-    def __init__(self, key, filepath, width, height, color_hex, gen_id):
+class _AnalysisSignals(QObject):
+    finished = pyqtSignal(str, QImage, float, int, int, str) # QImage: QPixmap is GUI-thread only
+
+class _RubberBandSignals(QObject):
+    finished = pyqtSignal(str, str, float)
+
+class PoolTask(QRunnable):
+    # Runs on the shared QThreadPool; signals live on a main-thread QObject since QRunnable can't emit
+    def __init__(self, signals):
         super().__init__()
+        self.setAutoDelete(False) # LooperApp keeps the reference
+        self.signals = signals; self._cancelled = False; self.done = False
+    def cancel(self): self._cancelled = True
+    def run(self):
+        try: self.work()
+        finally:
+            self.done = True
+            self.signals.deleteLater() # Posted behind any queued finished emit, so it's still delivered
+    def work(self): pass
+
+class AudioAnalysisTask(PoolTask):
+    def __init__(self, key, filepath, width, height, color_hex, gen_id, for_deck=False):
+        super().__init__(_AnalysisSignals())
+        self.finished = self.signals.finished
         self.key, self.filepath, self.width, self.height = key, filepath, width, height
         self.bg_color, self.gen_id = QColor(color_hex), gen_id
-    def run(self):
+        self.for_deck = for_deck # A deck is waiting on this result for its audio, so a bank switch must not cancel it
+    def work(self):
         try:
-            if self.isInterruptionRequested(): return
-            audio_full = AudioSegment.from_file(self.filepath)
+            if self._cancelled: return
             temp_dir = os.path.join(os.getcwd(), "temp_audio")
             if not os.path.exists(temp_dir): os.makedirs(temp_dir)
+            
+            # --- ANALYSIS CACHE: same file (path+mtime+size) and pad look -> skip decode, beat tracking and drawing ---
+            cache_key = hashlib.sha1(f"{self.filepath}|{os.path.getmtime(self.filepath)}|{os.path.getsize(self.filepath)}|{self.width}x{self.height}|{self.bg_color.name()}".encode()).hexdigest()
+            meta_path = os.path.join(temp_dir, cache_key + ".json"); png_path = os.path.join(temp_dir, cache_key + ".png")
+            if os.path.exists(meta_path) and os.path.exists(png_path):
+                with open(meta_path, 'r') as f: meta = json.load(f)
+                if os.path.exists(meta["wav_path"]):
+                    if not self._cancelled: self.finished.emit(self.key, QImage(png_path), meta["bpm"], meta["duration_ms"], meta["sample_rate"], meta["wav_path"])
+                    return
+            
             clean_name = os.path.basename(self.filepath).replace(" ", "_")
             wav_path = os.path.join(temp_dir, f"{clean_name}_base.wav")
-            if not os.path.exists(wav_path): audio_full.export(wav_path, format="wav")
-            duration_ms = len(audio_full)
-            if duration_ms > 60000: audio_vis = audio_full[:60000]
-            else: audio_vis = audio_full
-            raw_samples = np.array(audio_full.get_array_of_samples())
-            sample_rate = audio_full.frame_rate
-            vis_samples = np.array(audio_vis.set_channels(1).set_frame_rate(11025).get_array_of_samples())
-            tempo, _ = librosa.beat.beat_track(y=vis_samples.astype(np.float32)/32768.0, sr=11025)
-            bpm = float(tempo.item()) if isinstance(tempo, np.ndarray) else float(round(tempo, 2))
-            draw_samples = vis_samples[::150]
-            pixmap = QPixmap(self.width, self.height)
-            pixmap.fill(Qt.GlobalColor.transparent)
-            painter = QPainter(pixmap)
+            if HAS_SOUNDFILE and os.path.splitext(self.filepath)[1].lower() in SF_EXTENSIONS:
+                data, sample_rate = sf.read(self.filepath, dtype='int16', always_2d=True) # frames x channels
+                if not os.path.exists(wav_path): sf.write(wav_path, data, sample_rate, subtype='PCM_16')
+                duration_ms = int(1000 * len(data) / sample_rate)
+                mono = data[:sample_rate * 60].mean(axis=1, dtype=np.float32) / 32768.0
+                vis_samples = (np.clip(librosa.resample(mono, orig_sr=sample_rate, target_sr=11025), -1.0, 1.0) * 32767).astype(np.int16)
+            else:
+                audio_full = AudioSegment.from_file(self.filepath)
+                if not os.path.exists(wav_path): audio_full.export(wav_path, format="wav")
+                duration_ms = len(audio_full)
+                sample_rate = audio_full.frame_rate
+                if shutil.which("ffmpeg"):
+                    # First 60s decoded by ffmpeg straight to 11025 Hz mono int16, no pydub slice/downmix/resample copies
+                    proc = subprocess.run(["ffmpeg", "-v", "quiet", "-i", self.filepath, "-ar", "11025", "-ac", "1", "-t", "60", "-f", "s16le", "-"], capture_output=True, check=True)
+                    vis_samples = np.frombuffer(proc.stdout, dtype=np.int16)
+                else:
+                    audio_vis = audio_full[:60000] if duration_ms > 60000 else audio_full
+                    vis_samples = np.array(audio_vis.set_channels(1).set_frame_rate(11025).get_array_of_samples())
+            # Only the tempo is kept, so skip beat_track's DP backtrace and estimate from the onset envelope
+            onset_env = librosa.onset.onset_strength(y=vis_samples.astype(np.float32)/32768.0, sr=11025, hop_length=512)
+            bpm = round(float(_estimate_tempo(onset_envelope=onset_env, sr=11025, hop_length=512, aggregate=np.median)[0]), 2)
+            # Peak per pixel column (every sample counts, no decimation); int32 so abs(-32768) doesn't wrap
+            n = len(vis_samples); bin_size = max(1, n // self.width); cols = min(self.width, n // bin_size)
+            peaks = np.abs(vis_samples[:bin_size * cols].astype(np.int32).reshape(cols, bin_size)).max(axis=1) * (self.height * 0.9 / 32768.0)
+            if self._cancelled: return
+            img = QImage(self.width, self.height, QImage.Format.Format_ARGB32_Premultiplied)
+            img.fill(Qt.GlobalColor.transparent)
+            painter = QPainter(img)
             painter.setPen(QPen(self.bg_color.darker(150), 1))
             center_y = self.height / 2
-            step = len(draw_samples) / self.width
-            for x in range(self.width):
-                if self.isInterruptionRequested(): return
-                idx = int(x * step)
-                if idx < len(draw_samples):
-                    h = abs(draw_samples[idx]) * (self.height * 0.9) / 32768.0
-                    painter.drawLine(x, int(center_y - h/2), x, int(center_y + h/2))
+            painter.drawLines([QLineF(x, int(center_y - h/2), x, int(center_y + h/2)) for x, h in enumerate(peaks.tolist())])
             painter.end()
-            if not self.isInterruptionRequested(): self.finished.emit(self.key, pixmap, bpm, duration_ms, raw_samples, sample_rate, wav_path)
+            if self._cancelled: return
+            img.save(png_path, "PNG")
+            with open(meta_path, 'w') as f: json.dump({"bpm": bpm, "duration_ms": duration_ms, "sample_rate": sample_rate, "wav_path": wav_path}, f) # Written last: marks the entry complete
+            self.finished.emit(self.key, img, bpm, duration_ms, sample_rate, wav_path)
         except:
-            if not self.isInterruptionRequested(): self.finished.emit(self.key, QPixmap(), 120.0, 0, None, 44100, "")
+            if not self._cancelled: self.finished.emit(self.key, QImage(), 120.0, 0, 44100, "")
 
-class RubberBandWorker(QThread):
-    finished = pyqtSignal(str, str, float)
+class RubberBandTask(PoolTask):
     def __init__(self, key, original_wav, tempo_ratio):
-        super().__init__()
+        super().__init__(_RubberBandSignals())
+        self.finished = self.signals.finished
         self.key, self.original_wav, self.tempo_ratio = key, original_wav, tempo_ratio
-    def run(self):
+    def work(self):
         try:
-            if not os.path.exists(self.original_wav) or self.tempo_ratio <= 0: return
-            unique_id = uuid.uuid4().hex[:8]
+            if self._cancelled or not os.path.exists(self.original_wav) or self.tempo_ratio <= 0: return
+            # One file per (source, ratio to 3dp): a repeat tempo skips the process spawn and WAV read entirely
             base, ext = os.path.splitext(self.original_wav)
-            out_path = f"{base}_st_{self.tempo_ratio:.2f}_{unique_id}{ext}"
+            out_path = f"{base}_st_{self.tempo_ratio:.3f}{ext}"
+            if os.path.exists(out_path):
+                os.utime(out_path) # Keep recently used ratios out of the pruner's reach
+                if not self._cancelled: self.finished.emit(self.key, out_path, self.tempo_ratio)
+                return
             if shutil.which("rubberband") is None: return
-            subprocess.run(["rubberband", "-q", "realtime", "-t", str(1.0/self.tempo_ratio), self.original_wav, out_path],
+            tmp_path = f"{base}_st_{uuid.uuid4().hex[:8]}.part{ext}" # Renamed into place so no task ever sees a half-written file
+            subprocess.run(["rubberband", "-q", "-t", f"{1.0/self.tempo_ratio:.4f}", self.original_wav, tmp_path],
                            check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-            self.finished.emit(self.key, out_path, self.tempo_ratio)
+            os.replace(tmp_path, out_path)
+            if not self._cancelled: self.finished.emit(self.key, out_path, self.tempo_ratio)
         except: pass
 
 # ==========================================
@@ -160,8 +287,11 @@ class VJDeck:
         self.video_audio = QAudioOutput(); self.player.setAudioOutput(self.video_audio); self.video_audio.setVolume(0) 
         self.audio_player = QMediaPlayer(); self.main_output = QAudioOutput(); self.audio_player.setAudioOutput(self.main_output); self.audio_player.setLoops(QMediaPlayer.Loops.Infinite)
         self.cue_player = QMediaPlayer(); self.cue_output = QAudioOutput(); self.cue_player.setAudioOutput(self.cue_output); self.cue_player.setLoops(QMediaPlayer.Loops.Infinite)
+        self._player_cache = OrderedDict() # wav path -> (audio, cue) players with that source already opened
         self.cue_active = False; self.raw_samples = None; self.sample_rate = 44100; self.target_volume = 1.0; self.playback_rate = 1.0
-        self.fade_level = 1.0; self.fade_timer = QTimer(); self.fade_timer.setInterval(10); self.fade_timer.timeout.connect(self._process_fade)
+        # Trigger fade-in: Qt's animation driver ticks it (shared across decks), no per-deck 10ms Python timer
+        self.fade_level = 1.0; self.fade_anim = QVariantAnimation(); self.fade_anim.setDuration(100); self.fade_anim.setStartValue(0.0); self.fade_anim.setEndValue(1.0)
+        self.fade_anim.setEasingCurve(QEasingCurve.Type.OutQuad); self.fade_anim.valueChanged.connect(self._on_fade_value)
 
     def set_loop_mode(self, looping):
         self.is_looping = looping
@@ -179,9 +309,22 @@ class VJDeck:
         self.current_filepath = filepath; self.player.setSource(QUrl.fromLocalFile(filepath))
     def load_base_audio(self, wav_path):
         self.base_wav_path = wav_path; self.swap_audio(wav_path, reset_rate_to_video=True)
+    def players_for(self, path):
+        # Re-using a prepared pair skips the backend's demuxer/pipeline rebuild (and its click) on tempo flips
+        if path in self._player_cache: self._player_cache.move_to_end(path); return self._player_cache[path]
+        url = QUrl.fromLocalFile(path); pair = (QMediaPlayer(), QMediaPlayer()); pair[0].setSource(url); pair[1].setSource(url)
+        self._player_cache[path] = pair
+        while len(self._player_cache) > 4:
+            _, old = self._player_cache.popitem(last=False)
+            for p in old: p.stop(); p.setSource(QUrl())
+        return pair
     def swap_audio(self, path, reset_rate_to_video=False):
-        pos = self.player.position(); playing = self.player.playbackState() == QMediaPlayer.PlaybackState.PlayingState; url = QUrl.fromLocalFile(path)
-        self.audio_player.setSource(url); self.cue_player.setSource(url)
+        pos = self.player.position(); playing = self.player.playbackState() == QMediaPlayer.PlaybackState.PlayingState
+        audio, cue = self.players_for(path)
+        if audio is not self.audio_player:
+            self.audio_player.pause(); self.cue_player.pause()
+            audio.setAudioOutput(self.main_output); cue.setAudioOutput(self.cue_output) # Outputs follow the active pair
+            self.audio_player, self.cue_player = audio, cue
         loop_const = QMediaPlayer.Loops.Infinite if self.is_looping else QMediaPlayer.Loops.Once
         self.audio_player.setLoops(loop_const); self.cue_player.setLoops(loop_const)
         if reset_rate_to_video:
@@ -192,13 +335,16 @@ class VJDeck:
             mapped_pos = int(pos / self.playback_rate); self.audio_player.setPosition(mapped_pos); self.cue_player.setPosition(mapped_pos)
         if playing: self.audio_player.play(); self.cue_player.play() if self.cue_active else None
     def has_media(self): return self.player.mediaStatus() != QMediaPlayer.MediaStatus.NoMedia
-    def set_audio_data(self, samples, rate): self.raw_samples = samples; self.sample_rate = rate
+    def set_audio_data(self, wav_path, rate):
+        self.raw_samples = map_wav_samples(wav_path) if wav_path else None; self.sample_rate = rate
+        self._scratch = np.empty(2 * int(0.02 * rate) + 2, dtype=np.int32) # Fits find_zero_crossing's widest window
     def find_zero_crossing(self, target_ms):
         if self.raw_samples is None: return target_ms
         idx = int((target_ms / 1000.0) * self.sample_rate); idx -= idx % 2 
         win = int(0.02 * self.sample_rate); s = max(0, idx - win); e = min(len(self.raw_samples), idx + win)
         if s >= e: return target_ms
-        return int(((s + np.argmin(np.abs(self.raw_samples[s:e]))) / self.sample_rate) * 1000.0)
+        bi = _zc_argmin(self.raw_samples, s, e) if HAS_NUMBA else _zc_argmin(self.raw_samples, s, e, self._scratch)
+        return int((bi / self.sample_rate) * 1000.0)
     
     def trigger(self, pos):
         self.main_output.setMuted(True); self.cue_output.setMuted(True) if self.cue_active else None
@@ -209,14 +355,13 @@ class VJDeck:
         self.player.play(); self.audio_player.play(); self.cue_player.play() if self.cue_active else None
         self.fade_level = 0.0; self.main_output.setVolume(0); self.main_output.setMuted(False)
         if self.cue_active: self.cue_output.setVolume(0); self.cue_output.setMuted(False)
-        if not self.fade_timer.isActive(): self.fade_timer.start()
-
-    def _process_fade(self):
-        self.fade_level += 0.1
-        if self.fade_level >= 1.0: self.fade_level = 1.0; self.fade_timer.stop()
-        self.main_output.setVolume(self.target_volume * self.fade_level)
-        if self.cue_active: self.cue_output.setVolume(1.0 * self.fade_level)
-    def set_volume(self, vol): self.target_volume = vol; self.main_output.setVolume(vol) if not self.fade_timer.isActive() else None
+        self.fade_anim.stop(); self.fade_anim.start()
+
+    def _on_fade_value(self, v):
+        self.fade_level = v
+        self.main_output.setVolume(self.target_volume * v)
+        if self.cue_active: self.cue_output.setVolume(1.0 * v)
+    def set_volume(self, vol): self.target_volume = vol; self.main_output.setVolume(vol) if self.fade_anim.state() != QAbstractAnimation.State.Running else None
     def set_cue_active(self, active):
         self.cue_active = active
         if active:
@@ -250,14 +395,23 @@ class InteractiveWaveform(QLabel):
         self.filename = "[Empty]"; self.bpm_text = ""; self.waveform_pixmap = None
         self.playhead_x = 0; self.is_deck_a = False; self.is_deck_b = False
         self.loading = False; self.hotcues = {}; self.track_duration = 0
+        self._overlay = None; self._overlay_key = None
     def paintEvent(self, event):
-        painter = QPainter(self); painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        painter = QPainter(self)
         if self.waveform_pixmap: painter.drawPixmap(0, 0, self.waveform_pixmap)
+        # Border + text layer only changes with these; text shaping stays out of the playhead repaints
+        key = (self.filename, self.bpm_text, self.loading, self.is_deck_a, self.is_deck_b, self.size(), self.devicePixelRatioF())
+        if key != self._overlay_key: self._overlay = self.render_overlay(); self._overlay_key = key
+        painter.drawPixmap(0, 0, self._overlay); painter.end()
+    def render_overlay(self):
+        dpr = self.devicePixelRatioF(); pix = QPixmap(int(self.width() * dpr), int(self.height() * dpr)); pix.setDevicePixelRatio(dpr); pix.fill(Qt.GlobalColor.transparent)
+        painter = QPainter(pix); painter.setRenderHint(QPainter.RenderHint.Antialiasing)
         if self.is_deck_a: painter.setPen(QPen(QColor("#FF0055"), 4)); painter.drawRect(self.rect().adjusted(2,2,-2,-2)); painter.drawText(10, 20, "DECK A")
         elif self.is_deck_b: painter.setPen(QPen(QColor("#00CCFF"), 4)); painter.drawRect(self.rect().adjusted(2,2,-2,-2)); painter.drawText(self.width()-60, 20, "DECK B")
-        painter.setPen(QColor("white")); font = painter.font(); font.setBold(True); painter.setFont(font)
+        painter.setPen(QColor("white")); font = self.font(); font.setBold(True); painter.setFont(font)
         status = " (...)" if self.loading else ""; label = f"KEY: {self.key_char.upper()}\n{self.filename}{status}\n{self.bpm_text}"
         painter.drawText(self.rect(), Qt.AlignmentFlag.AlignCenter, label); painter.end()
+        return pix
     def mousePressEvent(self, event):
         if QApplication.keyboardModifiers() == Qt.KeyboardModifier.AltModifier: self.parent_app.assign_to_deck("B", self.key_char)
         elif event.button() == Qt.MouseButton.LeftButton: self.parent_app.assign_to_deck("A", self.key_char)
@@ -277,7 +431,7 @@ class MidiConfigDialog(QDialog):
         super().__init__(parent)
         self.setWindowTitle("MIDI Configuration"); self.resize(600, 500)
         self.worker = midi_worker; self.midi_map = current_map; self.learning_row = -1
-        self.worker.message_received.connect(self.on_midi_message)
+        self.worker.message_received.connect(self.on_midi_message, Qt.ConnectionType.QueuedConnection)
         layout = QVBoxLayout(self)
         dev_row = QHBoxLayout(); dev_row.addWidget(QLabel("MIDI Input Device:"))
         self.c_dev = QComboBox()
@@ -339,11 +493,19 @@ class LoopBar(QWidget):
     def __init__(self, parent_sequencer):
         super().__init__(); self.sequencer = parent_sequencer; self.setFixedHeight(30); self.setStyleSheet("background-color: #1a1a1a; border-bottom: 1px solid #333;")
         self.setMouseTracking(True); self.dragging = False; self.drag_start_x = 0; self.start_step_cache = 0
+        self._cached = None; self._cached_key = None
     def paintEvent(self, event):
-        painter = QPainter(self); w = self.width(); h = self.height(); step_w = w / 64.0; painter.fillRect(self.rect(), QColor("#111"))
+        # Only the loop window changes what's drawn; replay the last render until it moves
+        key = (self.sequencer.loop_length, self.sequencer.loop_start, self.size(), self.devicePixelRatioF())
+        if key != self._cached_key: self._cached = self.render_bar(); self._cached_key = key
+        painter = QPainter(self); painter.drawPixmap(0, 0, self._cached); painter.end()
+    def render_bar(self):
+        w = self.width(); h = self.height(); step_w = w / 64.0; dpr = self.devicePixelRatioF()
+        pix = QPixmap(int(w * dpr), int(h * dpr)); pix.setDevicePixelRatio(dpr); painter = QPainter(pix); painter.fillRect(self.rect(), QColor("#111"))
         start_x = self.sequencer.loop_start * step_w; loop_w = self.sequencer.loop_length * step_w
         bar_rect = QRectF(start_x, 2, loop_w, h - 4); painter.setBrush(QColor("#00CCFF")); painter.setPen(Qt.PenStyle.NoPen); painter.drawRoundedRect(bar_rect, 4, 4)
-        painter.setPen(QColor("black")); painter.setFont(QFont("Arial", 10, QFont.Weight.Bold)); label = f"{self.sequencer.loop_length} STEPS"; painter.drawText(bar_rect, Qt.AlignmentFlag.AlignCenter, label)
+        painter.setPen(QColor("black")); painter.setFont(QFont("Arial", 10, QFont.Weight.Bold)); label = f"{self.sequencer.loop_length} STEPS"; painter.drawText(bar_rect, Qt.AlignmentFlag.AlignCenter, label); painter.end()
+        return pix
     def mousePressEvent(self, event):
         step_w = self.width() / 64.0; start_x = self.sequencer.loop_start * step_w; loop_w = self.sequencer.loop_length * step_w; bar_rect = QRectF(start_x, 0, loop_w, self.height())
         if bar_rect.contains(event.position()): self.dragging = True; self.drag_start_x = event.position().x(); self.start_step_cache = self.sequencer.loop_start; self.setCursor(Qt.CursorShape.SizeHorCursor)
@@ -357,18 +519,18 @@ class LoopBar(QWidget):
 class PianoRollSequencer(QWidget):
     def __init__(self, parent_app):
         super().__init__(); self.parent_app = parent_app; self.setMinimumHeight(300); self.setStyleSheet("background-color: #080808; border: 2px solid #333; margin-top: 0px; border-radius: 0px 0px 4px 4px;")
-        self.points = {}; self.selection = set(); self.current_step = 0; self.steps = 64; self.loop_start = 0; self.loop_length = 64
-        self.mode = "IDLE"; self.drag_start_pos = QPointF(); self.last_mouse_pos = QPointF(); self.marquee_rect = QRectF(); self.move_snapshot = {}; self.clean_slate_points = {}
+        self.points = np.full(64, np.nan, dtype=np.float32); self.selection = set(); self.current_step = 0; self.steps = 64; self.loop_start = 0; self.loop_length = 64
+        self.mode = "IDLE"; self.drag_start_pos = QPointF(); self.last_mouse_pos = QPointF(); self.marquee_rect = QRectF(); self._snap_steps = (); self._snap_vals = (); self._last_move = None; self.clean_slate_points = self.points.copy()
+        self._steps_np = np.zeros(0, dtype=np.int32); self._vals_np = np.zeros(0, dtype=np.float32)
+        self._beat_lines = []; self._level_lines = []; self.cache_geometry()
         self.undo_stack = []; self.redo_stack = []; self.state_at_press = {}; self.setMouseTracking(True); self.setFocusPolicy(Qt.FocusPolicy.ClickFocus) 
     def quantize_selection(self, grid=4):
         if not self.selection: return
-        self.push_to_undo(self.points.copy()); new_points = self.points.copy(); new_selection = set(); moves = []
-        for step in list(self.selection):
-            if step in new_points: target = max(0, min(round(step / grid) * grid, 63)); moves.append((step, target, new_points[step]))
-        for o, n, v in moves: 
-            if o in new_points: del new_points[o]
-        for o, n, v in moves: new_points[n] = v; new_selection.add(n)
-        self.points = new_points; self.selection = new_selection; self.update(); self.parent_app.save_curve_data()
+        self.push_to_undo(self.points.copy()); new_points = self.points.copy()
+        src = np.array(sorted(self.selection), dtype=np.intp); src = src[~np.isnan(new_points[src])]
+        dst = np.clip(np.round(src / grid) * grid, 0, 63).astype(np.intp); vals = new_points[src]
+        new_points[src] = np.nan; new_points[dst] = vals # Collisions: the later step wins
+        self.points = new_points; self.selection = set(dst.tolist()); self.update(); self.parent_app.save_curve_data()
     def push_to_undo(self, state):
         self.undo_stack.append(state); 
         if len(self.undo_stack) > 50: self.undo_stack.pop(0)
@@ -382,13 +544,21 @@ class PianoRollSequencer(QWidget):
     def set_loop_window(self, start, length):
         self.loop_length = length; self.loop_start = max(0, min(start, 64 - length)); self.update()
         if hasattr(self.parent_app, 'loop_bar'): self.parent_app.loop_bar.update()
-    def set_data(self, data): self.points = data.copy() if data else {}; self.selection.clear(); self.undo_stack.clear(); self.redo_stack.clear(); self.update()
-    def get_data(self): return self.points
-    def get_step_from_x(self, x): return max(0, min(int(x / (self.width()/self.steps)), self.steps - 1))
+    def set_data(self, data):
+        self.points = np.full(64, np.nan, dtype=np.float32)
+        for k, v in (data or {}).items(): self.points[int(k)] = v
+        self.selection.clear(); self.undo_stack.clear(); self.redo_stack.clear(); self.update()
+    def get_data(self): return {int(i): float(self.points[i]) for i in self.note_steps()}
+    def note_steps(self): return np.flatnonzero(~np.isnan(self.points))
+    def has_note(self, step): return 0 <= step < self.steps and not math.isnan(self.points[step])
+    def get_step_from_x(self, x): return max(0, min(int(x / self._step_w), self.steps - 1))
     def get_val_from_y(self, y): return max(0.0, min(1.0 - (y / self.height()), 1.0))
     def get_rect_for_note(self, step, val):
-        step_w = self.width() / self.steps; block_h = 20; y = int(self.height() - (val * self.height())) - 10; y = max(0, min(y, self.height() - 20))
-        return QRectF(int(step * step_w), y, step_w, block_h)
+        y = int(self._h - (val * self._h)) - 10; y = max(0, min(y, self._h - 20))
+        return QRectF(int(self._xs[step]), y, self._step_w, 20)
+    def cache_geometry(self):
+        # Per-size constants for note rects and hit tests; x of every step edge as an int lookup
+        self._step_w = self.width() / self.steps; self._h = self.height(); self._xs = (np.arange(self.steps + 1) * self._step_w).astype(np.int32)
     
     def keyPressEvent(self, event):
         k = event.key(); keys = self.parent_app.key_bindings
@@ -396,31 +566,29 @@ class PianoRollSequencer(QWidget):
             if not self.selection: event.ignore(); super().keyPressEvent(event); return 
             self.push_to_undo(self.points.copy())
             increment = 0.01 if k == Qt.Key.Key_Up else -0.01
-            for step in self.selection:
-                if step in self.points: self.points[step] = max(0.0, min(1.0, self.points[step] + increment))
+            sel = list(self.selection); self.points[sel] = np.clip(self.points[sel] + increment, 0.0, 1.0) # NaN stays NaN
             self.update(); self.parent_app.save_curve_data(); event.accept(); return
         if k == Qt.Key.Key_Left or k == Qt.Key.Key_Right:
             if not self.selection: event.ignore(); super().keyPressEvent(event); return 
             delta = -1 if k == Qt.Key.Key_Left else 1
             min_s = min(self.selection); max_s = max(self.selection)
             if (min_s + delta < 0) or (max_s + delta > 63): return 
-            self.push_to_undo(self.points.copy()); new_points = self.points.copy(); [new_points.pop(s, None) for s in self.selection]; new_sel = set()
-            for s in self.selection: new_points[s+delta] = self.points[s]; new_sel.add(s+delta)
-            self.points = new_points; self.selection = new_sel; self.update(); self.parent_app.save_curve_data(); event.accept(); return
+            self.push_to_undo(self.points.copy()); new_points = self.points.copy(); sel = np.array(list(self.selection), dtype=np.intp)
+            new_points[sel] = np.nan; new_points[sel + delta] = self.points[sel]
+            self.points = new_points; self.selection = set((sel + delta).tolist()); self.update(); self.parent_app.save_curve_data(); event.accept(); return
         if k == keys.get("QUANTIZE", Qt.Key.Key_Q): self.quantize_selection(); return
         if event.modifiers() & Qt.KeyboardModifier.ControlModifier and k == Qt.Key.Key_Z:
             self.perform_redo() if event.modifiers() & Qt.KeyboardModifier.ShiftModifier else self.perform_undo(); return
         if k in [Qt.Key.Key_Delete, Qt.Key.Key_Backspace]:
             self.push_to_undo(self.points.copy())
-            for step in list(self.selection):
-                if step in self.points: del self.points[step]
+            self.points[list(self.selection)] = np.nan
             self.selection.clear(); self.update(); self.parent_app.save_curve_data()
         else: super().keyPressEvent(event)
 
     def erase_at_pos(self, pos):
         step = self.get_step_from_x(pos.x())
-        if step in self.points and self.get_rect_for_note(step, self.points[step]).adjusted(-5,-20,5,20).contains(pos):
-            del self.points[step]; self.selection.discard(step); self.update()
+        if self.has_note(step) and self.get_rect_for_note(step, self.points[step]).adjusted(-5,-20,5,20).contains(pos):
+            self.points[step] = np.nan; self.selection.discard(step); self.update()
     def interpolate_erase(self, p1, p2):
         steps = int(math.hypot(p2.x()-p1.x(), p2.y()-p1.y()) / 5) + 1 
         for i in range(steps + 1): t = i / steps; self.erase_at_pos(QPointF(p1.x() + (p2.x()-p1.x())*t, p1.y() + (p2.y()-p1.y())*t))
@@ -428,19 +596,24 @@ class PianoRollSequencer(QWidget):
         self.setFocus(); self.state_at_press = self.points.copy(); pos = event.position(); self.last_mouse_pos = pos; step = self.get_step_from_x(pos.x())
         if (event.modifiers() & Qt.KeyboardModifier.ControlModifier) or (event.button() == Qt.MouseButton.RightButton):
             self.mode = "ERASING"; self.setCursor(Qt.CursorShape.ForbiddenCursor); self.erase_at_pos(pos); return
+        # Only the column under the cursor (and its neighbours, for the 2px slop) can hold the hit
         clicked = -1
-        for s, v in self.points.items():
-            if self.get_rect_for_note(s, v).adjusted(-2,-5,2,5).contains(pos): clicked = s; break
+        for s in (step, step - 1, step + 1):
+            if self.has_note(s) and self.get_rect_for_note(s, self.points[s]).adjusted(-2,-5,2,5).contains(pos): clicked = s; break
         if clicked != -1:
             if clicked not in self.selection:
                 if not (QApplication.keyboardModifiers() & Qt.KeyboardModifier.ShiftModifier): self.selection.clear()
                 self.selection.add(clicked)
-            self.mode = "MOVING"; self.drag_start_pos = pos; self.move_snapshot = {s: self.points[s] for s in self.selection}
+            self.mode = "MOVING"; self.drag_start_pos = pos; self._last_move = None
+            self._snap_steps = tuple(self.selection); self._snap_vals = tuple(self.points[list(self._snap_steps)].tolist())
             if QApplication.keyboardModifiers() & Qt.KeyboardModifier.ShiftModifier: self.clean_slate_points = self.points.copy(); self.setCursor(Qt.CursorShape.DragCopyCursor)
-            else: self.clean_slate_points = self.points.copy(); [self.clean_slate_points.pop(s, None) for s in self.selection]; self.setCursor(Qt.CursorShape.ClosedHandCursor)
+            else: self.clean_slate_points = self.points.copy(); self.clean_slate_points[list(self.selection)] = np.nan; self.setCursor(Qt.CursorShape.ClosedHandCursor)
             self.points = self.clean_slate_points.copy()
         else:
-            if QApplication.keyboardModifiers() & Qt.KeyboardModifier.ShiftModifier: self.mode = "SELECTING"; self.drag_start_pos = pos; self.marquee_rect = QRectF(pos, pos)
+            if QApplication.keyboardModifiers() & Qt.KeyboardModifier.ShiftModifier:
+                self.mode = "SELECTING"; self.drag_start_pos = pos; self.marquee_rect = QRectF(pos, pos)
+                # Points can't change during a marquee drag: snapshot them as arrays once
+                self._steps_np = self.note_steps(); self._vals_np = self.points[self._steps_np]
             else:
                 if self.selection: self.selection.clear(); self.mode = "IDLE"
                 else: self.selection.clear(); self.mode = "DRAWING"; self.points[step] = self.get_val_from_y(pos.y()); self.selection.add(step); self.setCursor(Qt.CursorShape.CrossCursor)
@@ -449,41 +622,55 @@ class PianoRollSequencer(QWidget):
         pos = event.position()
         if self.mode == "ERASING": self.interpolate_erase(self.last_mouse_pos, pos)
         elif self.mode == "SELECTING":
-            self.marquee_rect = QRectF(self.dragged_rect(self.drag_start_pos, pos)); self.selection.clear()
-            for s, v in self.points.items():
-                if self.marquee_rect.intersects(self.get_rect_for_note(s, v)): self.selection.add(s)
+            self.marquee_rect = QRectF(self.dragged_rect(self.drag_start_pos, pos)); m = self.marquee_rect; self.selection.clear()
+            if not m.isEmpty() and self._steps_np.size:
+                # Same test as QRectF.intersects against every note rect, as array comparisons
+                h = self._h; x = self._xs[self._steps_np]
+                y = np.clip((h - self._vals_np * h).astype(np.int32) - 10, 0, h - 20)
+                hit = (x < m.right()) & (x + self._step_w > m.left()) & (y < m.bottom()) & (y + 20 > m.top())
+                self.selection = set(self._steps_np[hit].tolist())
             self.update()
         elif self.mode == "MOVING":
             d_s = int((pos.x()-self.drag_start_pos.x())/(self.width()/64)); d_v = -(pos.y()-self.drag_start_pos.y())/self.height()
-            self.points = self.clean_slate_points.copy(); new_sel = set()
-            for os, ov in self.move_snapshot.items():
+            if (d_s, d_v) == self._last_move: self.last_mouse_pos = pos; return # Sub-pixel jitter: nothing would move
+            self._last_move = (d_s, d_v); self.points = self.clean_slate_points.copy(); new_sel = set()
+            for os, ov in zip(self._snap_steps, self._snap_vals):
                 ns = os + d_s; nv = max(0.0, min(ov + d_v, 1.0))
                 if 0 <= ns < 64: self.points[ns] = nv; new_sel.add(ns)
             self.selection = new_sel; self.update()
         elif self.mode == "DRAWING": self.points[self.get_step_from_x(pos.x())] = self.get_val_from_y(pos.y()); self.update()
         else:
-            step = self.get_step_from_x(pos.x()); hover = False
-            for s, v in self.points.items():
-                if s == step and self.get_rect_for_note(s, v).contains(pos): hover = True; break
+            step = self.get_step_from_x(pos.x())
+            hover = self.has_note(step) and self.get_rect_for_note(step, self.points[step]).contains(pos)
             self.setCursor(Qt.CursorShape.OpenHandCursor if hover else Qt.CursorShape.ArrowCursor)
         self.last_mouse_pos = pos
     def mouseReleaseEvent(self, event):
-        if self.points != self.state_at_press: self.push_to_undo(self.state_at_press)
+        if not np.array_equal(self.points, self.state_at_press, equal_nan=True): self.push_to_undo(self.state_at_press)
         self.mode = "IDLE"; self.marquee_rect = QRectF(); self.setCursor(Qt.CursorShape.ArrowCursor); self.parent_app.save_curve_data(); self.update()
     def dragged_rect(self, p1, p2): return QRectF(p1, p2).normalized()
+    def resizeEvent(self, event):
+        self.cache_geometry(); w = self.width(); h = self.height(); step_w = self._step_w
+        self._beat_lines = [QLineF(int(i*step_w), 0, int(i*step_w), h) for i in range(0, 64, 4)]
+        self._level_lines = [QLineF(0, int(i*(h/5)), w, int(i*(h/5))) for i in range(1, 5)]
+        super().resizeEvent(event)
     def paintEvent(self, event):
         painter = QPainter(self); painter.setRenderHint(QPainter.RenderHint.Antialiasing, False); w = self.width(); h = self.height(); step_w = w / 64
         painter.fillRect(self.rect(), QColor("#080808")); lx = int(self.loop_start * step_w); lw = int(self.loop_length * step_w)
         painter.fillRect(0, 0, lx, h, QColor(0,0,0,180)); painter.fillRect(lx+lw, 0, w-(lx+lw), h, QColor(0,0,0,180))
-        painter.setPen(QPen(QColor(40,40,40), 1)); [painter.drawLine(int(i*step_w),0,int(i*step_w),h) for i in range(0,64,4)]
-        painter.setPen(QPen(QColor(30,30,30), 1)); [painter.drawLine(0,int(i*(h/5)),w,int(i*(h/5))) for i in range(1,5)]
+        painter.setPen(QPen(QColor(40,40,40), 1)); painter.drawLines(self._beat_lines)
+        painter.setPen(QPen(QColor(30,30,30), 1)); painter.drawLines(self._level_lines)
         painter.setPen(Qt.PenStyle.NoPen); painter.setBrush(QColor(255,255,255,30)); painter.drawRect(int(self.current_step*step_w), 0, int(step_w), h)
-        for s, v in self.points.items():
-            in_loop = self.loop_start <= s < (self.loop_start + self.loop_length)
-            painter.setBrush(QColor("#FFFFFF") if s in self.selection else (QColor("#00CCFF") if in_loop else QColor("#004455")))
-            rect = self.get_rect_for_note(s, v); painter.drawRect(rect)
-            painter.setPen(QPen(QColor(0,204,255,60) if in_loop else QColor(0,50,60,40), 1))
-            painter.drawLine(int(rect.center().x()), int(rect.bottom()), int(rect.center().x()), h); painter.setPen(Qt.PenStyle.NoPen)
+        # Bucket notes by style so each brush/pen is set once, not once per note
+        sel_rects = []; loop_rects = []; out_rects = []; loop_stems = []; out_stems = []
+        steps = self.note_steps()
+        for s, v in zip(steps.tolist(), self.points[steps].tolist()):
+            in_loop = self.loop_start <= s < (self.loop_start + self.loop_length); rect = self.get_rect_for_note(s, v); cx = int(rect.center().x())
+            (sel_rects if s in self.selection else (loop_rects if in_loop else out_rects)).append(rect)
+            (loop_stems if in_loop else out_stems).append(QLineF(cx, int(rect.bottom()), cx, h))
+        for color, rects in (("#FFFFFF", sel_rects), ("#00CCFF", loop_rects), ("#004455", out_rects)):
+            if rects: painter.setBrush(QColor(color)); painter.drawRects(rects)
+        if loop_stems: painter.setPen(QPen(QColor(0,204,255,60), 1)); painter.drawLines(loop_stems)
+        if out_stems: painter.setPen(QPen(QColor(0,50,60,40), 1)); painter.drawLines(out_stems)
         if self.mode == "SELECTING": painter.setPen(QPen(QColor(255,255,255),1,Qt.PenStyle.DashLine)); painter.setBrush(QColor(255,255,255,30)); painter.drawRect(self.marquee_rect)
 
 # ==========================================
@@ -500,7 +687,7 @@ class LooperApp(QMainWindow):
         self.key_bindings = { "PLAY_PAUSE": Qt.Key.Key_Space, "TOGGLE_SEQUENCER": Qt.Key.Key_P, "TAP_TEMPO": Qt.Key.Key_Return, "CROSSFADER_LEFT": Qt.Key.Key_Left, "CROSSFADER_RIGHT": Qt.Key.Key_Right, "BANK_1": Qt.Key.Key_5, "BANK_2": Qt.Key.Key_6, "BANK_3": Qt.Key.Key_7, "QUANTIZE": Qt.Key.Key_Q }
         self.midi_map = { "CROSSFADER": {'type': 'control_change', 'val': 1, 'channel': 0}, "PLAY_PAUSE": None, "TOGGLE_SEQUENCER": None, "TAP_TEMPO": None, "TRIGGER_A": None, "TRIGGER_S": None, "TRIGGER_D": None, "TRIGGER_F": None }
         
-        self.midi_worker = MidiWorker(); self.midi_worker.message_received.connect(self.handle_midi_message); self.midi_worker.start()
+        self.midi_worker = MidiWorker(); self.midi_worker.message_received.connect(self.handle_midi_message, Qt.ConnectionType.QueuedConnection); self.midi_worker.start()
 
         self.projector = QWidget(); self.projector.resize(800,600); self.projector.setStyleSheet("background:black")
         self.proj_scene = QGraphicsScene(0,0,800,600); self.proj_view = QGraphicsView(self.projector); self.proj_view.setViewport(QOpenGLWidget()); self.proj_view.resize(800,600); self.proj_view.setScene(self.proj_scene)
@@ -514,6 +701,7 @@ class LooperApp(QMainWindow):
         self.buttons = {}; self.bank_data = {0: {}, 1: {}, 2: {}}; self.clip_meta = {}; self.clip_curves = {}; self.clip_loops = {}; self.active_clip_a = None; self.active_clip_b = None
         self.current_bank = 0; self.current_generation = 0; self.active_workers = []; self.crossfader_value = 0.0; self.master_bpm = 120.0; self.tap_times = []; self.transport_start_time = time.time()
         self.seq_running = False; self.current_step = 0; self.seq_multiplier = 1.0; self.seq_timer = QTimer(); self.seq_timer.setTimerType(Qt.TimerType.PreciseTimer); self.seq_timer.timeout.connect(self.run_sequencer_step)
+        self.prune_timer = QTimer(); self.prune_timer.timeout.connect(self.prune_stretch_cache); self.prune_timer.start(5 * 60 * 1000)
 
         scroll = QScrollArea(); scroll.setWidgetResizable(True); self.setCentralWidget(scroll); w = QWidget(); w.setObjectName("Container"); scroll.setWidget(w); l = QVBoxLayout(w); l.setSpacing(10)
 
@@ -645,21 +833,40 @@ class LooperApp(QMainWindow):
     def sync_deck(self, deck, key):
         path = self.bank_data[self.current_bank].get(key); cb = self.clip_meta.get(path, 120.0) if path else 120.0
         rate = self.master_bpm / cb if cb > 0 else 1.0; deck.setPlaybackRate(rate)
-        if deck.base_wav_path: w = RubberBandWorker(key, deck.base_wav_path, rate); w.finished.connect(lambda k,p,r: deck.swap_audio(p,False)); self.active_workers.append(w); w.start()
+        if deck.base_wav_path:
+            src = deck.base_wav_path; w = RubberBandTask(key, src, rate)
+            w.finished.connect(lambda k, p, r, src=src: self._stretch_done(deck, src, p, r)); self.submit_task(w)
+    def _stretch_done(self, deck, src, path, rate):
+        # Renders land out of order (a cache hit emits at once, an older ratio may still be running): only swap one that still fits
+        if self.btn_vid_sync.isChecked() and deck.base_wav_path == src and abs(deck.playback_rate - rate) < 1e-3: deck.swap_audio(path, False)
+    def prune_stretch_cache(self, max_age_s=30 * 60):
+        temp_dir = os.path.join(os.getcwd(), "temp_audio")
+        if not os.path.isdir(temp_dir): return
+        in_use = {p for d in (self.deck_a, self.deck_b) for p in d._player_cache}; cutoff = time.time() - max_age_s
+        for name in os.listdir(temp_dir):
+            p = os.path.join(temp_dir, name)
+            if "_base_st_" not in name or p in in_use: continue # Renders of {clip}_base.wav; a clip name may contain "_st_" itself
+            try:
+                if os.path.getmtime(p) < cutoff: os.remove(p)
+            except OSError: pass
     def toggle_vid_sync(self):
         on = self.btn_vid_sync.isChecked(); self.btn_vid_sync.setText(f"VID SYNC: {'ON' if on else 'OFF'}")
         if on: self.sync_deck(self.deck_a, self.active_clip_a); self.sync_deck(self.deck_b, self.active_clip_b)
         else: self.deck_a.setPlaybackRate(1.0); self.deck_b.setPlaybackRate(1.0)
     def assign_clip_to_bank(self, key, path):
         self.bank_data[self.current_bank][key] = path; self.buttons[key].set_loading()
-        w = AudioAnalysisWorker(key, path, 200, 120, self.buttons[key].base_color.name(), self.current_generation); w.finished.connect(self.prep_done); self.active_workers.append(w); w.start()
-    def prep_done(self, key, pix, bpm, dur, raw, rate, wav):
+        w = AudioAnalysisTask(key, path, 200, 120, self.buttons[key].base_color.name(), self.current_generation); w.finished.connect(self.prep_done); self.submit_task(w)
+    def submit_task(self, task):
+        self.active_workers = [w for w in self.active_workers if not w.done]
+        task.signals.setParent(self) # C++ owns it now; the task deletes it once run() is over
+        self.active_workers.append(task); QThreadPool.globalInstance().start(task)
+    def prep_done(self, key, img, bpm, dur, rate, wav):
         path = self.bank_data[self.current_bank].get(key)
         if path:
             self.clip_meta[path] = bpm
-            if self.active_clip_a == key: self.deck_a.set_audio_data(raw, rate); self.deck_a.load_base_audio(wav)
-            if self.active_clip_b == key: self.deck_b.set_audio_data(raw, rate); self.deck_b.load_base_audio(wav)
-        self.buttons[key].set_data(pix, bpm, dur)
+            if self.active_clip_a == key: self.deck_a.set_audio_data(wav, rate); self.deck_a.load_base_audio(wav)
+            if self.active_clip_b == key: self.deck_b.set_audio_data(wav, rate); self.deck_b.load_base_audio(wav)
+        self.buttons[key].set_data(QPixmap.fromImage(img), bpm, dur)
     def assign_to_deck(self, deck_name, key):
         path = self.bank_data[self.current_bank].get(key); t = self.deck_a if deck_name == "A" else self.deck_b
         if not path: return
@@ -675,7 +882,7 @@ class LooperApp(QMainWindow):
         
         if deck_name == "A": self.active_clip_a = key
         else: self.active_clip_b = key
-        self.buttons[key].set_loading(); w = AudioAnalysisWorker(key, path, 200, 120, self.buttons[key].base_color.name(), self.current_generation); w.finished.connect(self.prep_done); self.active_workers.append(w); w.start()
+        self.buttons[key].set_loading(); w = AudioAnalysisTask(key, path, 200, 120, self.buttons[key].base_color.name(), self.current_generation, for_deck=True); w.finished.connect(self.prep_done); self.submit_task(w)
         sz = self.proj_scene.sceneRect().size(); t.video_item.setSize(sz if sz.width()>0 else QSizeF(800,600)); t.video_item.show()
         for k, b in self.buttons.items():
             if deck_name == "A": b.is_deck_a = (k==key)
@@ -696,6 +903,8 @@ class LooperApp(QMainWindow):
         if self.active_clip_b: self.buttons[self.active_clip_b].update_playhead(p/self.deck_b.duration())
     def switch_bank(self, i):
         self.current_bank = i; self.current_generation += 1
+        for w in self.active_workers:
+            if isinstance(w, AudioAnalysisTask) and not w.for_deck and w.gen_id != self.current_generation: w.cancel() # Old bank's pads
         for b in self.bank_btns: b.setChecked(False)
         self.bank_btns[i].setChecked(True)
         for k in KEY_MAP: self.buttons[k].filename = "[Empty]"; self.buttons[k].update(); p = self.bank_data[i].get(k); self.assign_clip_to_bank(k, p) if p else None
@@ -745,6 +954,7 @@ class LooperApp(QMainWindow):
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
+    QThreadPool.globalInstance().setMaxThreadCount(min(4, QThread.idealThreadCount())) # Keep cores free for UI/MIDI
     window = LooperApp()
     window.show()
     sys.exit(app.exec())
\ No newline at end of file
@@ -1,12 +1,13 @@
 import sys
 import os
 import time
-import math
 import json
 import uuid
 import subprocess
 import shutil
+import wave
 import numpy as np
+from collections import deque, OrderedDict
 import librosa
 import mido 
 from pydub import AudioSegment
@@ -19,6 +20,13 @@ except ImportError:
     HAS_SCIPY = False
     print("WARNING: 'scipy' not found. DJ EQ filters will be disabled. Run 'pip install scipy'")
 
+# --- OPTIONAL FAST JSON (set files) ---
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
 # --- IMPORTS ---
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QGridLayout, 
                              QLabel, QVBoxLayout, QPushButton, QSlider, QDial,
@@ -30,8 +38,8 @@ from PyQt6.QtOpenGLWidgets import QOpenGLWidget
 from PyQt6.QtMultimedia import (QMediaPlayer, QAudioOutput, QMediaDevices)
 from PyQt6.QtMultimediaWidgets import QGraphicsVideoItem
 from PyQt6.QtCore import (QUrl, Qt, QTimer, QEvent, QThread, pyqtSignal, 
-                          QRectF, QPointF, QSizeF, QRect, QObject)
-from PyQt6.QtGui import QPainter, QColor, QPen, QBrush, QPixmap, QPolygonF, QFont, QCursor, QAction, QKeySequence
+                          QRectF, QPointF, QSizeF, QRect, QObject, QLineF, QElapsedTimer)
+from PyQt6.QtGui import QPainter, QColor, QPen, QBrush, QPixmap, QImage, QPolygonF, QFont, QCursor, QAction, QKeySequence
 
 # --- STYLING ---
 DARK_THEME = """
@@ -66,16 +74,18 @@ QTableWidget::item:selected { background-color: #00CCFF; color: black; }
 """
 
 KEY_MAP = {'a': (0, 0, "#FF0055"), 's': (0, 1, "#00CCFF"), 'd': (1, 0, "#00FF66"), 'f': (1, 1, "#FFAA00")}
+MEMMAP_MIN_SAMPLES = 44100 * 2 * 120 # ~2 min of 44.1k stereo; longer stems are paged from the exported WAV
 
 # ==========================================
 # 1. WORKERS & HELPERS
 # ==========================================
 
 class MidiWorker(QThread):
-    message_received = pyqtSignal(object) 
     def __init__(self):
         super().__init__()
         self.input_port = None; self.port_name = None; self.running = False
+        # SPSC hand-off to the GUI thread: deque append/popleft are atomic under the GIL, no queued-signal hop per message
+        self.ring = deque(maxlen=1024)
     def set_port(self, name):
         if self.input_port: self.input_port.close()
         self.port_name = name
@@ -86,11 +96,32 @@ class MidiWorker(QThread):
             with mido.open_input(self.port_name) as port:
                 self.input_port = port
                 while self.running:
-                    for msg in port.iter_pending(): self.message_received.emit(msg)
+                    for msg in port.iter_pending(): self.ring.append(msg)
                     time.sleep(0.001) 
         except: pass
     def stop(self): self.running = False; self.wait()
 
+def read_set_file(path):
+    if HAS_ORJSON:
+        with open(path, 'rb') as fh: return orjson.loads(fh.read())
+    with open(path, 'r') as fh: return json.load(fh)
+
+def write_set_file(path, data):
+    # int dict keys (banks, step numbers) are written as strings either way
+    if HAS_ORJSON:
+        with open(path, 'wb') as fh: fh.write(orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY))
+    else:
+        with open(path, 'w') as fh: json.dump(data, fh)
+
+def wav_memmap(path):
+    # Read-only int16 view of an exported WAV's PCM (the data chunk is last, so it ends the file)
+    try:
+        with wave.open(path, 'rb') as w:
+            if w.getsampwidth() != 2: return None
+            n = w.getnframes() * w.getnchannels()
+        return np.memmap(path, dtype=np.int16, mode='r', offset=os.path.getsize(path) - 2 * n, shape=(n,))
+    except: return None
+
 class AudioAnalysisWorker(QThread):
     finished = pyqtSignal(str, QPixmap, float, int, object, int, str, str, str)
     def __init__(self, key, filepath, width, height, color_hex, gen_id):
@@ -132,6 +163,7 @@ class AudioAnalysisWorker(QThread):
 
             duration_ms = len(audio_full); audio_vis = audio_full[:60000] if duration_ms > 60000 else audio_full
             raw_samples = np.array(audio_full.get_array_of_samples())
+            if audio_full.channels > 1: raw_samples = raw_samples.reshape(-1, audio_full.channels) # Frames x channels, not interleaved
             sample_rate = audio_full.frame_rate
             vis_samples = np.array(audio_vis.set_channels(1).set_frame_rate(11025).get_array_of_samples())
             tempo, _ = librosa.beat.beat_track(y=vis_samples.astype(np.float32)/32768.0, sr=11025)
@@ -150,16 +182,18 @@ class AudioAnalysisWorker(QThread):
             if not self.isInterruptionRequested(): self.finished.emit(self.key, QPixmap(), 120.0, 0, None, 44100, "", "", "")
 
 class RubberBandWorker(QThread):
-    finished = pyqtSignal(str, str, float)
-    def __init__(self, key, original_wav, tempo_ratio):
-        super().__init__(); self.key, self.original_wav, self.tempo_ratio = key, original_wav, tempo_ratio
+    finished = pyqtSignal(str, object, float) # key, (bass render, treble render), ratio
+    def __init__(self, key, stems, tempo_ratio):
+        super().__init__(); self.key, self.stems, self.tempo_ratio = key, stems, tempo_ratio
     def run(self):
         try:
-            if not os.path.exists(self.original_wav) or self.tempo_ratio <= 0: return
-            unique_id = uuid.uuid4().hex[:8]; base, ext = os.path.splitext(self.original_wav); out_path = f"{base}_st_{self.tempo_ratio:.2f}_{unique_id}{ext}"
-            if shutil.which("rubberband") is None: return
-            subprocess.run(["rubberband", "-q", "realtime", "-t", str(1.0/self.tempo_ratio), self.original_wav, out_path], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-            self.finished.emit(self.key, out_path, self.tempo_ratio)
+            if self.tempo_ratio <= 0 or shutil.which("rubberband") is None: return
+            unique_id = uuid.uuid4().hex[:8]; outs = {}
+            for src in dict.fromkeys(self.stems): # Both players share the full mix when a stem is missing: render it once
+                if not os.path.exists(src) or self.isInterruptionRequested(): return
+                base, ext = os.path.splitext(src); outs[src] = f"{base}_st_{self.tempo_ratio:.2f}_{unique_id}{ext}"
+                subprocess.run(["rubberband", "-q", "realtime", "-t", str(1.0/self.tempo_ratio), src, outs[src]], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            if not self.isInterruptionRequested(): self.finished.emit(self.key, tuple(outs[s] for s in self.stems), self.tempo_ratio)
         except: pass
 
 # ==========================================
@@ -167,19 +201,29 @@ class RubberBandWorker(QThread):
 # ==========================================
 
 class VJDeck:
+    # Fixed attribute layout (no per-instance __dict__); __weakref__ keeps Qt signal connections to bound methods working
+    __slots__ = ('name', 'video_item', 'current_filepath', 'base_wav_path', 'is_looping', 'attack_ms', 'release_ms', 'fade_level', 'envelope_state', 'seq_current_step',
+                 'base_wav', 'bass_wav', 'treble_wav', 'player', 'video_audio', 'audio_player', 'main_output', 'cue_player', 'cue_output',
+                 'player_bass', 'out_bass', 'player_treble', 'out_treble', 'cue_active', 'raw_samples', 'sample_rate', 'target_volume', 'playback_rate', 'filter_val', 'fade_timer',
+                 '_sr_over_1000', '_zc_indices', '_attack_curve', '_release_curve', '_env_tick', '_release_from', '_last_applied', '_inv_rate', '_audio_rate', '_seek_pending', '_vol_timer', '_seq_cache', '_duration_ms', 'rb_worker', '_last_sync_rate', 'audio_stretched', '__weakref__')
+    # filter_val (0-100) -> (bass_mult, treble_mult)
+    _FILTER_LUT = np.array([(1.0, v / 50.0) if v <= 50 else (1.0 - (v - 50) / 50.0, 1.0) for v in range(101)], dtype=np.float32)
+
     def __init__(self, name, video_item):
         self.name = name; self.video_item = video_item
         self.current_filepath = None; self.base_wav_path = None
         self.is_looping = True 
         self.attack_ms = 10; self.release_ms = 10
         self.fade_level = 0.0; self.envelope_state = "IDLE"
-        self.seq_current_step = 0
+        self._attack_curve = self._build_curve(10, True); self._release_curve = self._build_curve(10, False); self._env_tick = 0; self._release_from = 1.0
+        self.seq_current_step = 0; self.rb_worker = None; self._last_sync_rate = None; self._seq_cache = None # (loop_start, loop_length, dense) of the loaded clip, set by LooperApp
         
         # Audio Paths
         self.base_wav = None; self.bass_wav = None; self.treble_wav = None
         
         self.player = QMediaPlayer(); self.player.setVideoOutput(self.video_item); self.player.setLoops(QMediaPlayer.Loops.Infinite) 
         self.player.mediaStatusChanged.connect(self.on_media_status)
+        self._duration_ms = 0; self.player.durationChanged.connect(self._on_duration)
         self.video_audio = QAudioOutput(); self.player.setAudioOutput(self.video_audio); self.video_audio.setVolume(0) 
         
         self.audio_player = QMediaPlayer(); self.main_output = QAudioOutput(); self.audio_player.setAudioOutput(self.main_output); self.audio_player.setLoops(QMediaPlayer.Loops.Infinite)
@@ -190,10 +234,14 @@ class VJDeck:
         
         for p in [self.player_bass, self.player_treble]: p.setLoops(QMediaPlayer.Loops.Infinite)
         
-        self.cue_active = False; self.raw_samples = None; self.sample_rate = 44100; 
-        self.target_volume = 1.0; self.playback_rate = 1.0; self.filter_val = 50 
+        self.cue_active = False; self.raw_samples = None; self.sample_rate = 44100; self._sr_over_1000 = 44.1; self._zc_indices = None
+        self.target_volume = 1.0; self.playback_rate = 1.0; self.filter_val = 50; self._last_applied = None
+        self._inv_rate = 1.0; self._audio_rate = 1.0; self._seek_pending = None # Last rate written to the stem players / coalesced seek
+        self.audio_stretched = False # Stem players hold RubberBand renders (already at tempo, played at 1.0)
         
         self.fade_timer = QTimer(); self.fade_timer.setInterval(5); self.fade_timer.timeout.connect(self._process_envelope)
+        # Filter/volume changes (MIDI CC sweeps) are flushed to the outputs at most every 8ms
+        self._vol_timer = QTimer(); self._vol_timer.setInterval(8); self._vol_timer.setSingleShot(True); self._vol_timer.timeout.connect(self.apply_volume)
 
     def set_loop_mode(self, looping):
         self.is_looping = looping; loop_const = QMediaPlayer.Loops.Infinite if looping else QMediaPlayer.Loops.Once
@@ -204,118 +252,175 @@ class VJDeck:
         if not self.is_looping and status == QMediaPlayer.MediaStatus.EndOfMedia:
             self.audio_player.stop(); self.cue_player.stop(); self.player_bass.stop(); self.player_treble.stop()
 
+    def _on_duration(self, d): self._duration_ms = d
     def load_video(self, filepath): self.current_filepath = filepath; self.player.setSource(QUrl.fromLocalFile(filepath))
     
     def load_stems(self, wav, bass, treble):
         self.base_wav = wav; self.bass_wav = bass; self.treble_wav = treble
-        self.swap_audio(reset_rate=True)
-
-    def swap_audio(self, reset_rate=False):
-        b_url = QUrl.fromLocalFile(self.bass_wav) if self.bass_wav else QUrl.fromLocalFile(self.base_wav)
-        t_url = QUrl.fromLocalFile(self.treble_wav) if self.treble_wav else QUrl.fromLocalFile(self.base_wav)
-        pos = self.player.position(); playing = self.player.playbackState() == QMediaPlayer.PlaybackState.PlayingState
-        self.player_bass.setSource(b_url); self.player_treble.setSource(t_url)
-        if reset_rate:
-            self.player_bass.setPlaybackRate(self.playback_rate); self.player_treble.setPlaybackRate(self.playback_rate)
-            self.player_bass.setPosition(pos); self.player_treble.setPosition(pos)
+        self.base_wav_path = wav
+        if self.rb_worker is not None: self.rb_worker.requestInterruption(); self.rb_worker = None # Stretch of the previous clip
+        self.swap_audio()
+
+    def swap_audio(self, renders=None):
+        # renders: (bass, treble) RubberBand renders of the stems, already at tempo, so played at 1.0; None = the stems themselves
+        if renders: b_url, t_url = QUrl.fromLocalFile(renders[0]), QUrl.fromLocalFile(renders[1])
         else:
-            self.player_bass.setPlaybackRate(1.0); self.player_treble.setPlaybackRate(1.0)
-            mapped = int(pos / self.playback_rate); self.player_bass.setPosition(mapped); self.player_treble.setPosition(mapped)
+            b_url = QUrl.fromLocalFile(self.bass_wav) if self.bass_wav else QUrl.fromLocalFile(self.base_wav)
+            t_url = QUrl.fromLocalFile(self.treble_wav) if self.treble_wav else QUrl.fromLocalFile(self.base_wav)
+        pos = self.position(); playing = self.player.playbackState() == QMediaPlayer.PlaybackState.PlayingState
+        self.player_bass.setSource(b_url); self.player_treble.setSource(t_url); self.audio_stretched = bool(renders)
+        if renders:
+            self._set_audio_rate(1.0)
+            mapped = int(pos * self._inv_rate); self.player_bass.setPosition(mapped); self.player_treble.setPosition(mapped)
+        else:
+            self._set_audio_rate(self.playback_rate)
+            self.player_bass.setPosition(pos); self.player_treble.setPosition(pos)
         if playing: self.player_bass.play(); self.player_treble.play()
 
     def has_media(self): return self.player.mediaStatus() != QMediaPlayer.MediaStatus.NoMedia
-    def set_audio_data(self, samples, rate): self.raw_samples = samples; self.sample_rate = rate
+    def set_audio_data(self, samples, rate, wav_path=None):
+        # --- int16 STORAGE (the zero-crossing table only needs sign bits) ---
+        if samples is not None and samples.dtype != np.int16:
+            if samples.dtype.kind == 'f': samples = (np.clip(samples, -1.0, 1.0) * 32767).astype(np.int16)
+            elif samples.dtype.itemsize > 2: samples = (samples >> (8 * samples.dtype.itemsize - 16)).astype(np.int16)
+            else: samples = samples.astype(np.int16) << 8
+        if samples is not None and wav_path and len(samples) > MEMMAP_MIN_SAMPLES:
+            mapped = wav_memmap(wav_path)
+            if mapped is not None and mapped.size == samples.size: samples = mapped.reshape(samples.shape)
+        self.raw_samples = samples; self.sample_rate = rate; self._sr_over_1000 = rate / 1000.0
+        # --- ZERO-CROSSING TABLE (built once per stem, binary-searched per trigger) ---
+        # Multichannel: sign of the int32 channel sum per frame (exact, no float downmix kept around)
+        if samples is None: self._zc_indices = None; return
+        mono = samples if samples.ndim == 1 else samples.sum(axis=1, dtype=np.int32)
+        self._zc_indices = np.flatnonzero(np.diff(np.signbit(mono).view(np.int8))).astype(np.int32)
     
     def find_zero_crossing(self, target_ms):
-        if self.raw_samples is None: return target_ms
-        idx = int((target_ms / 1000.0) * self.sample_rate)
-        search_window = int(0.02 * self.sample_rate) 
-        start = max(0, idx - search_window); end = min(len(self.raw_samples), idx + search_window)
-        if start >= end: return target_ms
-        segment = self.raw_samples[start:end]
-        if len(segment) == 0: return target_ms
-        min_idx = np.argmin(np.abs(segment))
-        best_ms = int(((start + min_idx) / self.sample_rate) * 1000.0)
-        return best_ms
+        if self._zc_indices is None or self._zc_indices.size == 0: return target_ms
+        idx = int(target_ms * self._sr_over_1000); pos = np.searchsorted(self._zc_indices, idx)
+        cand = self._zc_indices[max(0, pos - 1):pos + 1]; best = int(cand[np.argmin(np.abs(cand - idx))])
+        if abs(best - idx) > 0.02 * self.sample_rate: return target_ms
+        return int(best / self._sr_over_1000)
+    def _as_float(self): return None if self.raw_samples is None else self.raw_samples.astype(np.float32) / 32768.0
 
     def trigger(self, pos):
-        self.out_bass.setMuted(True); self.out_treble.setMuted(True); self.video_item.setOpacity(0)
+        self.out_bass.setMuted(True); self.out_treble.setMuted(True); self.video_item.setOpacity(0); self._last_applied = None; self._seek_pending = None
         safe_pos = self.find_zero_crossing(pos)
         self.player.setPosition(safe_pos)
-        a_pos = int(safe_pos / self.playback_rate) if (self.player_bass.playbackRate() == 1.0 and self.playback_rate != 1.0) else safe_pos
+        a_pos = self._audio_pos(safe_pos)
         self.player_bass.setPosition(a_pos); self.player_treble.setPosition(a_pos)
         if self.player.playbackState() != QMediaPlayer.PlaybackState.PlayingState:
             self.player.play(); self.player_bass.play(); self.player_treble.play()
         self.fade_level = 0.0; self.out_bass.setMuted(False); self.out_treble.setMuted(False)
-        self.envelope_state = "ATTACK"; 
+        self.envelope_state = "ATTACK"; self._env_tick = 0
+        if not self.fade_timer.isActive(): self.fade_timer.start()
+
+    def release(self):
+        self._release_from = self.fade_level; self._env_tick = 0; self.envelope_state = "RELEASE"
         if not self.fade_timer.isActive(): self.fade_timer.start()
 
+    # --- ENVELOPE LUT (one entry per 5ms tick, rebuilt only when A/R change) ---
+    @staticmethod
+    def _build_curve(ms, rising):
+        n = max(1, -(-int(ms) // 5)); ramp = np.arange(1, n + 1, dtype=np.float32) / n
+        return ramp if rising else 1.0 - ramp
+    def set_attack(self, ms): self.attack_ms = ms; self._attack_curve = self._build_curve(ms, True)
+    def set_release(self, ms): self.release_ms = ms; self._release_curve = self._build_curve(ms, False)
+
     def _process_envelope(self):
-        step_time = 5.0
+        last_level = self.fade_level
         if self.envelope_state == "ATTACK":
-            self.fade_level += step_time / self.attack_ms
-            if self.fade_level >= 1.0: self.fade_level = 1.0; self.envelope_state = "SUSTAIN"
+            curve = self._attack_curve; self.fade_level = float(curve[min(self._env_tick, len(curve) - 1)]); self._env_tick += 1
+            if self._env_tick >= len(curve): self.envelope_state = "SUSTAIN"; self.fade_timer.stop() # No ticks while held
         elif self.envelope_state == "RELEASE":
-            self.fade_level -= step_time / self.release_ms
-            if self.fade_level <= 0.0: self.fade_level = 0.0; self.envelope_state = "IDLE"; self.pause(); self.fade_timer.stop()
-        elif self.envelope_state == "SUSTAIN": self.fade_level = 1.0
-        self.apply_volume()
+            curve = self._release_curve; self.fade_level = self._release_from * float(curve[min(self._env_tick, len(curve) - 1)]); self._env_tick += 1
+            if self._env_tick >= len(curve): self.fade_level = 0.0; self.envelope_state = "IDLE"; self.pause(); self.fade_timer.stop()
+        else: self.fade_timer.stop()
+        if self.fade_level != last_level: self.apply_volume()
 
-    def set_filter(self, val): self.filter_val = val; self.apply_volume()
-    def set_volume(self, vol): self.target_volume = vol; self.apply_volume()
+    def set_filter(self, val): self.filter_val = val; self._schedule_volume()
+    def set_volume(self, vol): self.target_volume = vol; self._schedule_volume()
+    def _schedule_volume(self):
+        if not self._vol_timer.isActive(): self._vol_timer.start()
 
     def apply_volume(self):
-        base_vol = self.target_volume * self.fade_level
+        base_vol = self.target_volume * self.fade_level; state = (base_vol, self.filter_val)
+        if state == self._last_applied: return # Nothing changed, skip the Qt setters
+        self._last_applied = state; bass_mult, treble_mult = self._FILTER_LUT[int(self.filter_val)]
         self.video_item.setOpacity(base_vol) 
-        if self.filter_val <= 50:
-            bass_mult = 1.0; treble_mult = self.filter_val / 50.0
-        else:
-            bass_mult = 1.0 - ((self.filter_val - 50) / 50.0); treble_mult = 1.0
-        self.out_bass.setVolume(base_vol * bass_mult)
-        self.out_treble.setVolume(base_vol * treble_mult)
+        self.out_bass.setVolume(float(base_vol * bass_mult))
+        self.out_treble.setVolume(float(base_vol * treble_mult))
 
     def play(self): 
         if not self.is_looping and self.player.mediaStatus() == QMediaPlayer.MediaStatus.EndOfMedia: self.seek(0)
-        self.trigger(self.player.position()) 
+        self.trigger(self.position()) 
     def pause(self): self.player.pause(); self.player_bass.pause(); self.player_treble.pause()
+    # --- COALESCED SEEK: a burst of seeks (scrubbing) reaches the backend once per event-loop pass ---
     def seek(self, pos): 
-        self.player.setPosition(pos)
-        a_pos = int(pos / self.playback_rate) if (self.player_bass.playbackRate() == 1.0 and self.playback_rate != 1.0) else pos
+        if self._seek_pending is None: QTimer.singleShot(0, self._commit_seek)
+        self._seek_pending = pos
+    def _commit_seek(self):
+        if self._seek_pending is None: return
+        pos = self._seek_pending; self._seek_pending = None
+        self.player.setPosition(pos); a_pos = self._audio_pos(pos)
         self.player_bass.setPosition(a_pos); self.player_treble.setPosition(a_pos)
-    def position(self): return self.player.position()
+    def _audio_pos(self, pos): return int(pos * self._inv_rate) if self.audio_stretched else pos
+    def _set_audio_rate(self, rate):
+        if rate == self._audio_rate: return
+        self._audio_rate = rate; self.player_bass.setPlaybackRate(rate); self.player_treble.setPlaybackRate(rate)
+    def position(self): self._commit_seek(); return self.player.position()
     def duration(self): return self.player.duration()
     def playbackState(self): return self.player.playbackState()
     def setPlaybackRate(self, rate): 
-        self.playback_rate = rate; self.player.setPlaybackRate(rate)
-        if self.base_wav_path and self.player_bass.playbackRate() == 1.0: self.swap_audio(reset_rate=True)
-        self.player_bass.setPlaybackRate(rate); self.player_treble.setPlaybackRate(rate)
+        self.playback_rate = rate; self._inv_rate = 1.0 / rate if rate else 1.0; self.player.setPlaybackRate(rate)
+        if self.audio_stretched: self.swap_audio() # The render is for the old rate: back to the stems until a new one lands
+        self._set_audio_rate(rate)
     def set_main_output(self, device): self.out_bass.setDevice(device); self.out_treble.setDevice(device)
     def set_cue_output(self, device): pass
 
 class InteractiveWaveform(QLabel):
+    _PEN_ACTIVE = QPen(QColor("#FFFFFF"), 3)
+    _LABEL_FONT = None # Built on first widget (QFont needs the QApplication)
     def __init__(self, key_char, color, parent_app):
         super().__init__()
+        if InteractiveWaveform._LABEL_FONT is None: InteractiveWaveform._LABEL_FONT = QFont("Arial", 10, QFont.Weight.Bold)
         self.key_char, self.parent_app = key_char, parent_app
-        self.setAcceptDrops(True); self.setMouseTracking(True); self.base_color = QColor(color)
+        self.setAcceptDrops(True); self.setMouseTracking(True); self.base_color = QColor(color); self._border_pen = QPen(self.base_color, 2)
         self.setFixedSize(160, 100); self.setStyleSheet(f"border: 2px solid {color}; border-radius: 4px; background-color: #222;")
         self.filename = "[Empty]"; self.bpm_text = ""; self.waveform_pixmap = None
         self.playhead_x = 0; self.is_deck_a = False; self.is_deck_b = False
-        self.loading = False; self.hotcues = {}; self.track_duration = 0
+        self.loading = False; self.hotcues = {}; self.track_duration = 0; self._last_playhead_x = 0
+        self._label_cache_pixmap = None; self._label_cache_key = None
+    def _label_pixmap(self):
+        # Text layout only re-runs when the label contents change, not per playhead repaint
+        key = (self.filename, self.bpm_text, self.loading, self.width(), self.height())
+        if key != self._label_cache_key:
+            dpr = self.devicePixelRatioF(); pix = QPixmap(int(self.width() * dpr), int(self.height() * dpr)); pix.setDevicePixelRatio(dpr); pix.fill(Qt.GlobalColor.transparent)
+            p = QPainter(pix); p.setRenderHint(QPainter.RenderHint.Antialiasing); p.setPen(QColor("white")); p.setFont(self._LABEL_FONT)
+            status = " (...)" if self.loading else ""
+            p.drawText(self.rect(), Qt.AlignmentFlag.AlignCenter, f"TRACK {self.key_char.upper()}\n{self.filename}{status}\n{self.bpm_text}"); p.end()
+            self._label_cache_pixmap = pix; self._label_cache_key = key
+        return self._label_cache_pixmap
     def paintEvent(self, event):
         painter = QPainter(self); painter.setRenderHint(QPainter.RenderHint.Antialiasing)
         if self.waveform_pixmap: painter.drawPixmap(0, 0, self.waveform_pixmap)
         if self.parent_app.active_edit_track == self.key_char:
-            painter.setPen(QPen(QColor("#FFFFFF"), 3)); painter.drawRect(self.rect().adjusted(2,2,-2,-2))
+            painter.setPen(self._PEN_ACTIVE); painter.drawRect(self.rect().adjusted(2,2,-2,-2))
         else:
-            painter.setPen(QPen(self.base_color, 2)); painter.drawRect(self.rect().adjusted(1,1,-1,-1))
-        painter.setPen(QColor("white")); font = painter.font(); font.setBold(True); font.setPointSize(10); painter.setFont(font)
-        label = f"TRACK {self.key_char.upper()}\n{self.filename}{status}\n{self.bpm_text}" if (status := " (...)" if self.loading else "") else f"TRACK {self.key_char.upper()}\n{self.filename}\n{self.bpm_text}"
-        painter.drawText(self.rect(), Qt.AlignmentFlag.AlignCenter, label); painter.end()
+            painter.setPen(self._border_pen); painter.drawRect(self.rect().adjusted(1,1,-1,-1))
+        painter.drawPixmap(0, 0, self._label_pixmap()); painter.end()
     def mousePressEvent(self, event): self.parent_app.select_track_for_edit(self.key_char)
     def dragEnterEvent(self, event): event.accept() if event.mimeData().hasUrls() else event.ignore()
-    def dropEvent(self, event): self.parent_app.load_track(self.key_char, [u.toLocalFile() for u in event.mimeData().urls()][0])
-    def set_data(self, pixmap, bpm, duration): self.waveform_pixmap = pixmap; self.bpm_text = f"{bpm} BPM"; self.track_duration = duration; self.loading = False; self.update()
-    def update_playhead(self, ratio): self.playhead_x = int(ratio * self.width()); self.update()
+    def dropEvent(self, event): self.parent_app.load_track(self.key_char, event.mimeData().urls()[0].toLocalFile())
+    def set_data(self, pixmap, bpm, duration):
+        # Scale once to exact device pixels in premultiplied ARGB so paintEvent's drawPixmap is an unscaled blit
+        if pixmap is not None and not pixmap.isNull():
+            dpr = self.devicePixelRatio(); img = pixmap.toImage().scaled(self.size() * dpr, Qt.AspectRatioMode.IgnoreAspectRatio, Qt.TransformationMode.SmoothTransformation)
+            pixmap = QPixmap.fromImage(img.convertToFormat(QImage.Format.Format_ARGB32_Premultiplied)); pixmap.setDevicePixelRatio(dpr)
+        self.waveform_pixmap = pixmap; self.bpm_text = f"{bpm} BPM"; self.track_duration = duration; self.loading = False; self.update()
+    def update_playhead(self, ratio):
+        # Only the strip between the old and new playhead columns is invalidated
+        new_x = int(ratio * self.width()); old_x = self._last_playhead_x; self.playhead_x = self._last_playhead_x = new_x
+        if new_x != old_x: self.update(QRect(min(old_x, new_x) - 2, 0, abs(new_x - old_x) + 4, self.height()))
     def set_loading(self): self.loading = True; self.update()
 
 # ==========================================
@@ -327,7 +432,6 @@ class MidiConfigDialog(QDialog):
         super().__init__(parent)
         self.setWindowTitle("MIDI Config"); self.resize(500, 400)
         self.worker = midi_worker; self.midi_map = current_map; self.learning_row = -1
-        self.worker.message_received.connect(self.on_midi_message)
         layout = QVBoxLayout(self)
         self.c_dev = QComboBox(); inputs = mido.get_input_names(); self.c_dev.addItems(inputs)
         if self.worker.port_name in inputs: self.c_dev.setCurrentText(self.worker.port_name)
@@ -336,7 +440,7 @@ class MidiConfigDialog(QDialog):
         self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch); self.table.verticalHeader().setVisible(False); layout.addWidget(self.table)
         self.populate_table()
         btn_close = QPushButton("Done"); btn_close.clicked.connect(self.accept); layout.addWidget(btn_close)
-    def change_device(self, name): self.worker.stop(); self.worker.set_port(name); self.worker.start()
+    def change_device(self, name): self.worker.stop(); self.worker.set_port(name); self.worker.start(QThread.Priority.TimeCriticalPriority)
     def populate_table(self):
         self.table.setRowCount(0)
         for action, binding in sorted(self.midi_map.items()):
@@ -373,14 +477,17 @@ class HotkeyEditor(QDialog):
     def get_bindings(self): return self.bindings
 
 class LoopBar(QWidget):
+    _C_BG = QColor("#111"); _C_BAR = QColor("#00CCFF"); _C_TEXT = QColor("black"); _FONT = None # Font built with the first bar (needs QApplication)
     def __init__(self, parent_sequencer):
-        super().__init__(); self.sequencer = parent_sequencer; self.setFixedHeight(25); self.setStyleSheet("background-color: #1a1a1a; border-bottom: 1px solid #333;")
+        super().__init__()
+        if LoopBar._FONT is None: LoopBar._FONT = QFont("Arial", 9, QFont.Weight.Bold)
+        self.sequencer = parent_sequencer; self.setFixedHeight(25); self.setStyleSheet("background-color: #1a1a1a; border-bottom: 1px solid #333;")
         self.setMouseTracking(True); self.dragging = False; self.drag_start_x = 0; self.start_step_cache = 0
     def paintEvent(self, event):
-        painter = QPainter(self); w = self.width(); h = self.height(); step_w = w / 64.0; painter.fillRect(self.rect(), QColor("#111"))
+        painter = QPainter(self); w = self.width(); h = self.height(); step_w = w / 64.0; painter.fillRect(self.rect(), self._C_BG)
         start_x = self.sequencer.loop_start * step_w; loop_w = self.sequencer.loop_length * step_w
-        bar_rect = QRectF(start_x, 2, loop_w, h - 4); painter.setBrush(QColor("#00CCFF")); painter.setPen(Qt.PenStyle.NoPen); painter.drawRoundedRect(bar_rect, 2, 2)
-        painter.setPen(QColor("black")); painter.setFont(QFont("Arial", 9, QFont.Weight.Bold)); label = f"{self.sequencer.loop_length}"; painter.drawText(bar_rect, Qt.AlignmentFlag.AlignCenter, label)
+        bar_rect = QRectF(start_x, 2, loop_w, h - 4); painter.setBrush(self._C_BAR); painter.setPen(Qt.PenStyle.NoPen); painter.drawRoundedRect(bar_rect, 2, 2)
+        painter.setPen(self._C_TEXT); painter.setFont(self._FONT); label = f"{self.sequencer.loop_length}"; painter.drawText(bar_rect, Qt.AlignmentFlag.AlignCenter, label)
     def mousePressEvent(self, event):
         step_w = self.width() / 64.0; start_x = self.sequencer.loop_start * step_w; loop_w = self.sequencer.loop_length * step_w; bar_rect = QRectF(start_x, 0, loop_w, self.height())
         if bar_rect.contains(event.position()): self.dragging = True; self.drag_start_x = event.position().x(); self.start_step_cache = self.sequencer.loop_start; self.setCursor(Qt.CursorShape.SizeHorCursor)
@@ -390,37 +497,66 @@ class LoopBar(QWidget):
     def mouseReleaseEvent(self, event): self.dragging = False; self.setCursor(Qt.CursorShape.ArrowCursor)
 
 class PianoRollSequencer(QWidget):
+    _C_DIM = QColor(0,0,0,180); _C_SEL = QColor("#FFFFFF"); _C_IN = QColor("#00CCFF"); _C_OUT = QColor("#004455")
+    _PEN_STEM_IN = QPen(QColor(0,204,255,60), 1); _PEN_STEM_OUT = QPen(QColor(0,50,60,40), 1)
+    _C_BG = QColor("#080808"); _C_HILITE = QColor(255,255,255,30); _PEN_GRID4 = QPen(QColor(40,40,40), 1); _PEN_GRID5 = QPen(QColor(30,30,30), 1); _PEN_SELECT = QPen(QColor(255,255,255), 1, Qt.PenStyle.DashLine)
     def __init__(self, parent_app):
         super().__init__(); self.parent_app = parent_app; self.setMinimumHeight(200); self.setStyleSheet("background-color: #080808; border: 1px solid #333;")
-        self.points = {}; self.selection = set(); self.current_step = 0; self.steps = 64; self.loop_start = 0; self.loop_length = 64
-        self.mode = "IDLE"; self.drag_start_pos = QPointF(); self.last_mouse_pos = QPointF(); self.marquee_rect = QRectF(); self.move_snapshot = {}; self.clean_slate_points = {}
-        self.undo_stack = []; self.redo_stack = []; self.state_at_press = {}; self.setMouseTracking(True); self.setFocusPolicy(Qt.FocusPolicy.ClickFocus) 
+        # --- SoA NOTE STORAGE: one value + presence flag per step (inactive steps hold 0.0) ---
+        self._vals = np.zeros(64, dtype=np.float32); self._active = np.zeros(64, dtype=bool)
+        self.selection = 0; self.current_step = 0; self.steps = 64; self.loop_start = 0; self.loop_length = 64
+        self.mode = "IDLE"; self.drag_start_pos = QPointF(); self.last_mouse_pos = QPointF(); self.marquee_rect = QRectF()
+        self._move_steps = np.zeros(0, dtype=np.int32); self._move_vals = np.zeros(0, dtype=np.float32); self._clean_vals = self._vals.copy(); self._clean_active = self._active.copy()
+        self.undo_stack = deque(maxlen=50); self.redo_stack = deque(maxlen=50); self.state_at_press = self._snapshot(); self.setMouseTracking(True); self.setFocusPolicy(Qt.FocusPolicy.ClickFocus) 
+        self._vgrid_lines = []; self._hgrid_lines = []; self._last_undo_time = 0.0; self._last_undo_key = None; self._last_cursor_col = 0
+    # Undo snapshots are raw bytes (256 + 64): immutable, comparable with ==, and cheap to keep 50 of
+    def _snapshot(self): return (self._vals.tobytes(), self._active.tobytes())
+    def _restore(self, state): self._vals[:] = np.frombuffer(state[0], dtype=np.float32); self._active[:] = np.frombuffer(state[1], dtype=bool)
+    # --- SELECTION BITMASK: one Python int, bit s set <=> step s selected ---
+    def _sel_add(self, s): self.selection |= (1 << s)
+    def _sel_has(self, s): return (self.selection >> s) & 1
+    def _sel_discard(self, s): self.selection &= ~(1 << s)
+    def _sel_mask(self): return np.unpackbits(np.frombuffer(self.selection.to_bytes(8, 'little'), dtype=np.uint8), bitorder='little').view(bool)
+    @staticmethod
+    def _bits_from_mask(mask): return int.from_bytes(np.packbits(mask, bitorder='little').tobytes(), 'little')
+    @staticmethod
+    def _bits_from_steps(steps): m = np.zeros(64, dtype=bool); m[steps] = True; return PianoRollSequencer._bits_from_mask(m)
+    def _remove(self, mask): self._vals[mask] = 0.0; self._active[mask] = False
     def quantize_selection(self, grid=4):
         if not self.selection: return
-        self.push_to_undo(self.points.copy()); new_points = self.points.copy(); new_selection = set(); moves = []
-        for step in list(self.selection):
-            if step in new_points: target = max(0, min(round(step / grid) * grid, 63)); moves.append((step, target, new_points[step]))
-        for o, n, v in moves: 
-            if o in new_points: del new_points[o]
-        for o, n, v in moves: new_points[n] = v; new_selection.add(n)
-        self.points = new_points; self.selection = new_selection; self.update(); self.parent_app.save_curve_data()
+        self.push_to_undo(self._snapshot())
+        idx = np.flatnonzero(self._active & self._sel_mask()); tgt = np.clip(np.round(idx / grid) * grid, 0, 63).astype(np.int32)
+        moved = self._vals[idx].copy(); self._remove(idx); self._vals[tgt] = moved; self._active[tgt] = True
+        self.selection = self._bits_from_steps(tgt); self.update(); self.parent_app.save_curve_data()
     def push_to_undo(self, state):
-        self.undo_stack.append(state); 
-        if len(self.undo_stack) > 50: self.undo_stack.pop(0)
-        self.redo_stack.clear()
+        self.undo_stack.append(state); self.redo_stack.clear(); self._last_undo_key = None
+    def push_nudge_undo(self, key):
+        # Held arrow keys autorepeat at ~30Hz: one undo entry per burst of the same key (<300ms apart)
+        now = time.monotonic(); recent = key == self._last_undo_key and now - self._last_undo_time < 0.3 and self.undo_stack
+        if not recent: self.push_to_undo(self._snapshot()); self._last_undo_key = key
+        self._last_undo_time = now
     def perform_undo(self):
         if not self.undo_stack: return
-        self.redo_stack.append(self.points.copy()); self.points = self.undo_stack.pop(); self.selection.clear(); self.update(); self.parent_app.save_curve_data()
+        self._last_undo_key = None; self.redo_stack.append(self._snapshot()); self._restore(self.undo_stack.pop()); self.selection = 0; self.update(); self.parent_app.save_curve_data()
     def perform_redo(self):
         if not self.redo_stack: return
-        self.undo_stack.append(self.points.copy()); self.points = self.redo_stack.pop(); self.selection.clear(); self.update(); self.parent_app.save_curve_data()
+        self._last_undo_key = None; self.undo_stack.append(self._snapshot()); self._restore(self.redo_stack.pop()); self.selection = 0; self.update(); self.parent_app.save_curve_data()
     def set_loop_window(self, start, length):
         # FORCE INT CASTING to prevent TypeError crash
         self.loop_length = int(length); self.loop_start = max(0, min(int(start), 64 - self.loop_length)); self.update()
         if hasattr(self.parent_app, 'loop_bar'): self.parent_app.loop_bar.update()
         self.parent_app.update_active_track_loop(self.loop_start, self.loop_length)
-    def set_data(self, data): self.points = data.copy() if data else {}; self.selection.clear(); self.undo_stack.clear(); self.redo_stack.clear(); self.update()
-    def get_data(self): return self.points
+    def set_data(self, data):
+        self._remove(slice(None))
+        if data: steps = np.fromiter(data.keys(), dtype=np.int32, count=len(data)); self._vals[steps] = np.fromiter(data.values(), dtype=np.float32, count=len(data)); self._active[steps] = True
+        self.selection = 0; self.undo_stack.clear(); self.redo_stack.clear(); self.update()
+    def set_current_step(self, step):
+        # Repaint only the column the playhead left and the one it entered
+        old = self._last_cursor_col; self.current_step = self._last_cursor_col = step
+        if old == step: return
+        col_w = self.width() / self.steps; h = self.height()
+        self.update(QRect(int(old * col_w) - 1, 0, int(col_w) + 3, h)); self.update(QRect(int(step * col_w) - 1, 0, int(col_w) + 3, h))
+    def get_data(self): steps = np.flatnonzero(self._active); return dict(zip(steps.tolist(), self._vals[steps].tolist()))
     def get_step_from_x(self, x): return max(0, min(int(x / (self.width()/self.steps)), self.steps - 1))
     def get_val_from_y(self, y): return max(0.0, min(1.0 - (y / self.height()), 1.0))
     def get_rect_for_note(self, step, val):
@@ -431,107 +567,127 @@ class PianoRollSequencer(QWidget):
         k = event.key(); keys = self.parent_app.key_bindings
         if k == Qt.Key.Key_Up or k == Qt.Key.Key_Down:
             if not self.selection: event.ignore(); super().keyPressEvent(event); return 
-            self.push_to_undo(self.points.copy()); increment = 0.01 if k == Qt.Key.Key_Up else -0.01
-            for step in self.selection:
-                if step in self.points: self.points[step] = max(0.0, min(1.0, self.points[step] + increment))
+            self.push_nudge_undo(k); increment = 0.01 if k == Qt.Key.Key_Up else -0.01
+            sel = self._sel_mask() & self._active; self._vals[sel] = np.clip(self._vals[sel] + increment, 0.0, 1.0)
             self.update(); self.parent_app.save_curve_data(); event.accept(); return
         if k == Qt.Key.Key_Left or k == Qt.Key.Key_Right:
             if not self.selection: event.ignore(); super().keyPressEvent(event); return 
             delta = -1 if k == Qt.Key.Key_Left else 1
-            min_s = min(self.selection); max_s = max(self.selection)
-            if (min_s + delta < 0) or (max_s + delta > 63): return 
-            self.push_to_undo(self.points.copy()); new_points = self.points.copy(); [new_points.pop(s, None) for s in self.selection]; new_sel = set()
-            for s in self.selection: new_points[s+delta] = self.points[s]; new_sel.add(s+delta)
-            self.points = new_points; self.selection = new_sel; self.update(); self.parent_app.save_curve_data(); event.accept(); return
+            if (delta < 0 and self.selection & 1) or (delta > 0 and self.selection >> 63): return # Step 0 / 63 selected
+            self.push_nudge_undo(k); src = np.flatnonzero(self._sel_mask() & self._active); vals = self._vals[src].copy()
+            self._remove(src); self._vals[src + delta] = vals; self._active[src + delta] = True
+            self.selection = self.selection >> 1 if delta < 0 else self.selection << 1; self.update(); self.parent_app.save_curve_data(); event.accept(); return
         if k == keys.get("QUANTIZE", Qt.Key.Key_Q): self.quantize_selection(); return
         if event.modifiers() & Qt.KeyboardModifier.ControlModifier and k == Qt.Key.Key_Z:
             self.perform_redo() if event.modifiers() & Qt.KeyboardModifier.ShiftModifier else self.perform_undo(); return
         if k in [Qt.Key.Key_Delete, Qt.Key.Key_Backspace]:
-            self.push_to_undo(self.points.copy())
-            for step in list(self.selection):
-                if step in self.points: del self.points[step]
-            self.selection.clear(); self.update(); self.parent_app.save_curve_data()
+            self.push_to_undo(self._snapshot()); self._remove(self._sel_mask())
+            self.selection = 0; self.update(); self.parent_app.save_curve_data()
         else: super().keyPressEvent(event)
 
     def erase_at_pos(self, pos):
         step = self.get_step_from_x(pos.x())
-        if step in self.points and self.get_rect_for_note(step, self.points[step]).adjusted(-5,-20,5,20).contains(pos):
-            del self.points[step]; self.selection.discard(step); self.update()
+        if self._active[step] and self.get_rect_for_note(step, float(self._vals[step])).adjusted(-5,-20,5,20).contains(pos):
+            self._remove(step); self._sel_discard(step); self.update()
     def interpolate_erase(self, p1, p2):
-        steps = int(math.hypot(p2.x()-p1.x(), p2.y()-p1.y()) / 5) + 1 
-        for i in range(steps + 1): t = i / steps; self.erase_at_pos(QPointF(p1.x() + (p2.x()-p1.x())*t, p1.y() + (p2.y()-p1.y())*t))
+        # One test per swept step column: does the segment's y-span inside the column overlap the padded note rect?
+        x1, y1, x2, y2 = p1.x(), p1.y(), p2.x(), p2.y(); a = self.get_step_from_x(min(x1, x2)); b = self.get_step_from_x(max(x1, x2))
+        steps = np.flatnonzero(self._active[a:b + 1]) + a
+        if not steps.size: return
+        step_w = self.width() / self.steps; h = self.height(); dx = x2 - x1
+        if dx:
+            cx0 = np.clip(steps * step_w - 5, min(x1, x2), max(x1, x2)); cx1 = np.clip((steps + 1) * step_w + 5, min(x1, x2), max(x1, x2))
+            ya = y1 + (y2 - y1) * (cx0 - x1) / dx; yb = y1 + (y2 - y1) * (cx1 - x1) / dx; ylo = np.minimum(ya, yb); yhi = np.maximum(ya, yb)
+        else: ylo = min(y1, y2); yhi = max(y1, y2)
+        top = np.clip((h - self._vals[steps] * h).astype(np.int32) - 8, 0, h - 16)
+        hit = steps[(yhi >= top - 20) & (ylo <= top + 36)]
+        if hit.size: self._remove(hit); self.selection &= ~self._bits_from_steps(hit); self.update()
     def mousePressEvent(self, event):
-        self.setFocus(); self.state_at_press = {'points': self.points.copy(), 'selection': self.selection.copy()}; pos = event.position(); self.last_mouse_pos = pos; step = self.get_step_from_x(pos.x())
+        self.setFocus(); self.state_at_press = self._snapshot(); pos = event.position(); self.last_mouse_pos = pos; step = self.get_step_from_x(pos.x())
         if (event.modifiers() & Qt.KeyboardModifier.ControlModifier) or (event.button() == Qt.MouseButton.RightButton):
             self.mode = "ERASING"; self.setCursor(Qt.CursorShape.ForbiddenCursor); self.erase_at_pos(pos); return
-        clicked = -1
-        for s, v in self.points.items():
-            if self.get_rect_for_note(s, v).adjusted(-2,-5,2,5).contains(pos): clicked = s; break
+        clicked = -1 # x maps straight to a step column; only neighbours can catch the 2px edge pad
+        for s in (step, step - 1, step + 1):
+            if 0 <= s < 64 and self._active[s] and self.get_rect_for_note(s, float(self._vals[s])).adjusted(-2,-5,2,5).contains(pos): clicked = s; break
         if clicked != -1:
-            if clicked not in self.selection:
-                if not (QApplication.keyboardModifiers() & Qt.KeyboardModifier.ShiftModifier): self.selection.clear()
-                self.selection.add(clicked)
-            self.mode = "MOVING"; self.drag_start_pos = pos; self.move_snapshot = {s: self.points[s] for s in self.selection}
-            if QApplication.keyboardModifiers() & Qt.KeyboardModifier.ShiftModifier: self.clean_slate_points = self.points.copy(); self.setCursor(Qt.CursorShape.DragCopyCursor)
-            else: self.clean_slate_points = self.points.copy(); [self.clean_slate_points.pop(s, None) for s in self.selection]; self.setCursor(Qt.CursorShape.ClosedHandCursor)
-            self.points = self.clean_slate_points.copy()
+            if not self._sel_has(clicked):
+                if not (QApplication.keyboardModifiers() & Qt.KeyboardModifier.ShiftModifier): self.selection = 0
+                self._sel_add(clicked)
+            self.mode = "MOVING"; self.drag_start_pos = pos
+            self._move_steps = np.flatnonzero(self._sel_mask() & self._active).astype(np.int32); self._move_vals = self._vals[self._move_steps].copy()
+            self._clean_vals = self._vals.copy(); self._clean_active = self._active.copy()
+            if QApplication.keyboardModifiers() & Qt.KeyboardModifier.ShiftModifier: self.setCursor(Qt.CursorShape.DragCopyCursor)
+            else: self._clean_vals[self._move_steps] = 0.0; self._clean_active[self._move_steps] = False; self.setCursor(Qt.CursorShape.ClosedHandCursor)
+            self._vals[:] = self._clean_vals; self._active[:] = self._clean_active
         else:
             if QApplication.keyboardModifiers() & Qt.KeyboardModifier.ShiftModifier: self.mode = "SELECTING"; self.drag_start_pos = pos; self.marquee_rect = QRectF(pos, pos)
             else:
-                if self.selection: self.selection.clear(); self.mode = "IDLE"
-                else: self.selection.clear(); self.mode = "DRAWING"; self.points[step] = self.get_val_from_y(pos.y()); self.selection.add(step); self.setCursor(Qt.CursorShape.CrossCursor)
+                if self.selection: self.selection = 0; self.mode = "IDLE"
+                else: self.mode = "DRAWING"; self._vals[step] = self.get_val_from_y(pos.y()); self._active[step] = True; self.selection = 1 << step; self.setCursor(Qt.CursorShape.CrossCursor)
         self.update()
     def mouseMoveEvent(self, event):
         pos = event.position()
         if self.mode == "ERASING": self.interpolate_erase(self.last_mouse_pos, pos)
         elif self.mode == "SELECTING":
-            self.marquee_rect = QRectF(self.dragged_rect(self.drag_start_pos, pos)); self.selection.clear()
-            for s, v in self.points.items():
-                if self.marquee_rect.intersects(self.get_rect_for_note(s, v)): self.selection.add(s)
+            self.marquee_rect = QRectF(self.dragged_rect(self.drag_start_pos, pos)); m = self.marquee_rect; self.selection = 0
+            if not m.isEmpty():
+                # All 64 note rects against the marquee in one NumPy pass (same geometry as get_rect_for_note)
+                h = self.height(); step_w = self.width() / self.steps; x0 = (np.arange(64) * step_w).astype(np.int32); y0 = np.clip((h - self._vals * h).astype(np.int32) - 8, 0, h - 16)
+                hit = self._active & (x0 + step_w > m.left()) & (x0 < m.right()) & (y0 + 16 > m.top()) & (y0 < m.bottom())
+                self.selection = self._bits_from_mask(hit)
             self.update()
         elif self.mode == "MOVING":
             d_s = int((pos.x()-self.drag_start_pos.x())/(self.width()/64)); d_v = -(pos.y()-self.drag_start_pos.y())/self.height()
-            self.points = self.clean_slate_points.copy(); new_sel = set()
-            for os, ov in self.move_snapshot.items():
-                ns = os + d_s; nv = max(0.0, min(ov + d_v, 1.0))
-                if 0 <= ns < 64: self.points[ns] = nv; new_sel.add(ns)
-            self.selection = new_sel; self.update()
-        elif self.mode == "DRAWING": self.points[self.get_step_from_x(pos.x())] = self.get_val_from_y(pos.y()); self.update()
+            ns = self._move_steps + d_s; ok = (ns >= 0) & (ns < 64); ns = ns[ok]
+            self._vals[:] = self._clean_vals; self._active[:] = self._clean_active; self._vals[ns] = np.clip(self._move_vals[ok] + d_v, 0.0, 1.0); self._active[ns] = True
+            self.selection = self._bits_from_steps(ns); self.update()
+        elif self.mode == "DRAWING": step = self.get_step_from_x(pos.x()); self._vals[step] = self.get_val_from_y(pos.y()); self._active[step] = True; self.update()
         else:
-            step = self.get_step_from_x(pos.x()); hover = False
-            for s, v in self.points.items():
-                if s == step and self.get_rect_for_note(s, v).contains(pos): hover = True; break
+            step = self.get_step_from_x(pos.x()); hover = bool(self._active[step]) and self.get_rect_for_note(step, float(self._vals[step])).contains(pos)
             self.setCursor(Qt.CursorShape.OpenHandCursor if hover else Qt.CursorShape.ArrowCursor)
         self.last_mouse_pos = pos
     def mouseReleaseEvent(self, event):
-        if self.points != self.state_at_press['points']: 
-            self.undo_stack.append(self.state_at_press) # Push start state
-            if len(self.undo_stack) > 50: self.undo_stack.pop(0)
-            self.redo_stack.clear()
+        if self._snapshot() != self.state_at_press: self.push_to_undo(self.state_at_press) # Push start state
         self.mode = "IDLE"; self.marquee_rect = QRectF(); self.setCursor(Qt.CursorShape.ArrowCursor); self.parent_app.save_curve_data(); self.update()
     def dragged_rect(self, p1, p2): return QRectF(p1, p2).normalized()
+    def resizeEvent(self, event):
+        # Grid geometry only depends on size: rebuild the line lists here, not per paint
+        w = self.width(); h = self.height(); step_w = w / 64
+        self._vgrid_lines = [QLineF(int(i*step_w), 0, int(i*step_w), h) for i in range(0, 64, 4)]
+        self._hgrid_lines = [QLineF(0, int(i*(h/5)), w, int(i*(h/5))) for i in range(1, 5)]
+        super().resizeEvent(event)
     def paintEvent(self, event):
         painter = QPainter(self); painter.setRenderHint(QPainter.RenderHint.Antialiasing, False); w = self.width(); h = self.height(); step_w = w / 64
-        painter.fillRect(self.rect(), QColor("#080808")); lx = int(self.loop_start * step_w); lw = int(self.loop_length * step_w)
-        painter.fillRect(0, 0, lx, h, QColor(0,0,0,180)); painter.fillRect(lx+lw, 0, w-(lx+lw), h, QColor(0,0,0,180))
-        painter.setPen(QPen(QColor(40,40,40), 1)); [painter.drawLine(int(i*step_w),0,int(i*step_w),h) for i in range(0,64,4)]
-        painter.setPen(QPen(QColor(30,30,30), 1)); [painter.drawLine(0,int(i*(h/5)),w,int(i*(h/5))) for i in range(1,5)]
+        painter.fillRect(self.rect(), self._C_BG); lx = int(self.loop_start * step_w); lw = int(self.loop_length * step_w)
+        painter.fillRect(0, 0, lx, h, self._C_DIM); painter.fillRect(lx+lw, 0, w-(lx+lw), h, self._C_DIM)
+        painter.setPen(self._PEN_GRID4); painter.drawLines(self._vgrid_lines)
+        painter.setPen(self._PEN_GRID5); painter.drawLines(self._hgrid_lines)
         if self.parent_app.tracks[self.parent_app.active_edit_track].seq_current_step >= 0:
             ph_x = int(self.parent_app.tracks[self.parent_app.active_edit_track].seq_current_step * step_w)
-            painter.setPen(Qt.PenStyle.NoPen); painter.setBrush(QColor(255,255,255,30)); painter.drawRect(ph_x, 0, int(step_w), h)
-        for s, v in self.points.items():
-            in_loop = self.loop_start <= s < (self.loop_start + self.loop_length)
-            painter.setBrush(QColor("#FFFFFF") if s in self.selection else (QColor("#00CCFF") if in_loop else QColor("#004455")))
-            rect = self.get_rect_for_note(s, v); painter.drawRect(rect)
-            painter.setPen(QPen(QColor(0,204,255,60) if in_loop else QColor(0,50,60,40), 1))
-            painter.drawLine(int(rect.center().x()), int(rect.bottom()), int(rect.center().x()), h); painter.setPen(Qt.PenStyle.NoPen)
-        if self.mode == "SELECTING": painter.setPen(QPen(QColor(255,255,255),1,Qt.PenStyle.DashLine)); painter.setBrush(QColor(255,255,255,30)); painter.drawRect(self.marquee_rect)
+            painter.setPen(Qt.PenStyle.NoPen); painter.setBrush(self._C_HILITE); painter.drawRect(ph_x, 0, int(step_w), h)
+        # --- BATCHED NOTES: geometry in NumPy, one drawRects/drawLines per colour group ---
+        # Only steps whose column touches the dirty rect (partial repaints, e.g. the playhead column)
+        dirty = event.rect(); s0 = max(0, int(dirty.left() / step_w) - 1); s1 = int(dirty.right() / step_w) + 1
+        steps = np.flatnonzero(self._active[s0:s1 + 1]) + s0
+        if steps.size:
+            xs = (steps * step_w).astype(np.int32).tolist(); ys = np.clip((h - self._vals[steps] * h).astype(np.int32) - 8, 0, h - 16).tolist()
+            rects = [QRectF(x, y, step_w, 16) for x, y in zip(xs, ys)]; stems = [QLineF(int(x + step_w/2), y + 16, int(x + step_w/2), h) for x, y in zip(xs, ys)]
+            sel = self._sel_mask()[steps]; in_loop = (steps >= self.loop_start) & (steps < self.loop_start + self.loop_length)
+            painter.setPen(Qt.PenStyle.NoPen)
+            for mask, color in ((sel, self._C_SEL), (~sel & in_loop, self._C_IN), (~sel & ~in_loop, self._C_OUT)):
+                if mask.any(): painter.setBrush(color); painter.drawRects([rects[i] for i in np.flatnonzero(mask).tolist()])
+            for mask, pen in ((in_loop, self._PEN_STEM_IN), (~in_loop, self._PEN_STEM_OUT)):
+                if mask.any(): painter.setPen(pen); painter.drawLines([stems[i] for i in np.flatnonzero(mask).tolist()])
+            painter.setPen(Qt.PenStyle.NoPen)
+        if self.mode == "SELECTING": painter.setPen(self._PEN_SELECT); painter.setBrush(self._C_HILITE); painter.drawRect(self.marquee_rect)
 
 # ==========================================
 # 4. MAIN APPLICATION (4-TRACK MIXER)
 # ==========================================
 
 class LooperApp(QMainWindow):
+    # Fader position (0-100) -> gain on an equal-power (quarter-cosine) curve
+    _VOL_LUT = np.cos((1.0 - np.arange(101) / 100.0) * np.pi / 2).astype(np.float32)
     def __init__(self):
         super().__init__()
         self.setWindowTitle("VJ Sequencer v30.0 (Battery Proof)")
@@ -545,11 +701,15 @@ class LooperApp(QMainWindow):
         }
         self.midi_map = { "FADER_A": None, "FADER_S": None, "FADER_D": None, "FADER_F": None, "PLAY_PAUSE": None, "TOGGLE_SEQUENCER": None, "TAP_TEMPO": None, "TRIGGER_A": None, "TRIGGER_S": None, "TRIGGER_D": None, "TRIGGER_F": None }
         
-        self.midi_worker = MidiWorker(); self.midi_worker.message_received.connect(self.handle_midi_message); self.midi_worker.start()
+        self.midi_worker = MidiWorker(); self.midi_worker.start(QThread.Priority.TimeCriticalPriority); self.midi_learn_dialog = None; self._rebuild_midi_dispatch()
+        self.midi_drain_timer = QTimer(); self.midi_drain_timer.timeout.connect(self._drain_midi); self.midi_drain_timer.start(5)
 
         self.projector = QWidget(); self.projector.resize(800,600); self.projector.setStyleSheet("background:black")
         self.proj_scene = QGraphicsScene(0,0,800,600); self.proj_view = QGraphicsView(self.projector); self.proj_view.setViewport(QOpenGLWidget()); self.proj_view.resize(800,600); self.proj_view.setScene(self.proj_scene)
         self.proj_view.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff); self.proj_view.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        # Repaint only what the video items invalidate; the scene is four opaque, non-antialiased rects
+        self.proj_view.setViewportUpdateMode(QGraphicsView.ViewportUpdateMode.SmartViewportUpdate); self.proj_view.setCacheMode(QGraphicsView.CacheModeFlag.CacheBackground)
+        self.proj_view.setRenderHints(QPainter.RenderHint(0)); self.proj_view.setOptimizationFlag(QGraphicsView.OptimizationFlag.DontSavePainterState, True); self.proj_view.setOptimizationFlag(QGraphicsView.OptimizationFlag.DontAdjustForAntialiasing, True)
         
         self.track_items = {}; positions = [(0,0), (400,0), (0,300), (400,300)]; keys = ['a', 's', 'd', 'f']
         for i, k in enumerate(keys):
@@ -562,19 +722,25 @@ class LooperApp(QMainWindow):
 
         self.buttons = {}; self.faders = {}; self.mute_buttons = {}; self.dials = {}
         self.bank_data = {0: {}, 1: {}, 2: {}}; self.clip_meta = {}; self.clip_sequencer_data = {}; self.clip_curves = {}; self.clip_loops = {}
-        self.active_edit_track = 'a'; self.current_bank = 0; self.current_generation = 0; self.active_workers = []; self.master_bpm = 120.0; self.tap_times = []; 
+        self.clip_dense = {} # path -> float32[64] trigger value per step, -1 where there is no note
+        self.active_edit_track = 'a'; self.current_bank = 0; self.current_generation = 0; self.active_workers = []; self.stretch_cache = OrderedDict(); self.analysis_cache = OrderedDict(); self.master_bpm = 120.0; self.tap_times = deque(maxlen=4); 
         
         # --- NEW TIMING SYSTEM ---
         self.transport_start_time = 0.0 # Will be reset on play
+        self.transport_clock = QElapsedTimer(); self.transport_clock.start() # Monotonic twin of transport_start_time (phase alignment)
         self.last_processed_step_global = -1 # Monotonic counter of 16th notes since start
         
         self.seq_running = False; self.current_step = 0; self.seq_multiplier = 1.0
+        self._step_ms = None # Cached 16th-note length; reset whenever BPM or rate changes
         
-        # Precise Timer for Sequencer
-        self.seq_timer = QTimer(); self.seq_timer.setTimerType(Qt.TimerType.PreciseTimer); 
+        # Precise single-shot Timer for Sequencer, re-armed for the next step's absolute deadline
+        self.seq_timer = QTimer(); self.seq_timer.setTimerType(Qt.TimerType.PreciseTimer); self.seq_timer.setSingleShot(True)
         self.seq_timer.timeout.connect(self.run_sequencer_step)
         
         self.mute_states = {'a': False, 's': False, 'd': False, 'f': False}
+        # Dial/fader drags: last value per control is flushed once per 16ms frame
+        self._sync_timer = QTimer(); self._sync_timer.setSingleShot(True); self._sync_timer.setInterval(16); self._sync_timer.timeout.connect(self.sync_all_decks)
+        self._pending_ctrl = {}; self._ctrl_flush = QTimer(); self._ctrl_flush.setSingleShot(True); self._ctrl_flush.setInterval(16); self._ctrl_flush.timeout.connect(self._flush_controls)
 
         scroll = QScrollArea(); scroll.setWidgetResizable(True); self.setCentralWidget(scroll); w = QWidget(); w.setObjectName("Container"); scroll.setWidget(w); l = QVBoxLayout(w); l.setSpacing(5)
 
@@ -587,7 +753,7 @@ class LooperApp(QMainWindow):
         top.addWidget(self.btn_vid_sync); top.addWidget(self.btn_align); l.addLayout(top)
 
         # 2. AUDIO & BANK
-        io = QHBoxLayout(); devs = QMediaDevices.audioOutputs(); self.c_main = QComboBox(); self.c_cue = QComboBox()
+        io = QHBoxLayout(); devs = QMediaDevices.audioOutputs(); self.audio_devices = devs; self.c_main = QComboBox(); self.c_cue = QComboBox()
         for d in devs: self.c_main.addItem(d.description()); self.c_cue.addItem(d.description())
         self.c_main.currentIndexChanged.connect(self.change_main_output); self.c_cue.currentIndexChanged.connect(self.change_cue_output)
         io.addWidget(QLabel("MAIN:")); io.addWidget(self.c_main); io.addWidget(QLabel("CUE:")); io.addWidget(self.c_cue)
@@ -647,7 +813,7 @@ class LooperApp(QMainWindow):
         l.addWidget(self.loop_bar); l.addWidget(self.piano_roll)
 
         self.reopen_btn = QPushButton("OPEN PROJECTOR WINDOW"); self.reopen_btn.clicked.connect(self.projector.show); l.addWidget(self.reopen_btn)
-        QApplication.instance().installEventFilter(self); self.update_mixer()
+        self._build_key_dispatch(); QApplication.instance().installEventFilter(self)
 
     def create_mixer_strip(self, k, col):
         v = QVBoxLayout()
@@ -665,10 +831,21 @@ class LooperApp(QMainWindow):
         self.mute_buttons[k] = mute; v.addWidget(mute, 0, Qt.AlignmentFlag.AlignCenter)
         return v
 
-    def set_global_attack(self, val):
-        for t in self.tracks.values(): t.attack_ms = max(1, val)
-    def set_global_release(self, val):
-        for t in self.tracks.values(): t.release_ms = max(1, val)
+    def set_global_attack(self, val): self._debounce('attack', self._apply_attack, val)
+    def set_global_release(self, val): self._debounce('release', self._apply_release, val)
+    def _apply_attack(self, val):
+        for t in self.tracks.values(): t.set_attack(max(1, val))
+    def _apply_release(self, val):
+        for t in self.tracks.values(): t.set_release(max(1, val))
+
+    def _debounce(self, slot, fn, *args):
+        # Only mouse drags are coalesced; keyboard and MIDI changes still apply immediately
+        if QApplication.mouseButtons() == Qt.MouseButton.NoButton: fn(*args); return
+        self._pending_ctrl[slot] = (fn, args)
+        if not self._ctrl_flush.isActive(): self._ctrl_flush.start() # Throttle, not restart: a steady drag still flushes every 16ms
+    def _flush_controls(self):
+        pending = self._pending_ctrl; self._pending_ctrl = {}
+        for fn, args in pending.values(): fn(*args)
 
     # --- TRACK LOGIC ---
     def select_track_for_edit(self, key):
@@ -690,30 +867,42 @@ class LooperApp(QMainWindow):
     def load_track(self, key, path):
         self.bank_data[self.current_bank][key] = path
         self.buttons[key].set_loading()
-        w = AudioAnalysisWorker(key, path, 200, 120, self.buttons[key].base_color.name(), self.current_generation)
-        w.finished.connect(self.prep_done); self.active_workers.append(w); w.start()
-        t = self.tracks[key]; t.load_video(path)
+        ck = (path, self.buttons[key].base_color.name()); cached = self.analysis_cache.get(ck) # The waveform pixmap is tinted per pad
+        if cached: self.analysis_cache.move_to_end(ck); QTimer.singleShot(0, lambda: self.prep_done(key, *cached)) # Same clip seen before (e.g. bank switch): no re-analysis
+        else:
+            w = AudioAnalysisWorker(key, path, 200, 120, self.buttons[key].base_color.name(), self.current_generation)
+            w.finished.connect(lambda *res, w=w: self._analysis_done(w, *res)); self.active_workers.append(w); w.start(QThread.Priority.LowPriority)
+        t = self.tracks[key]; t.load_video(path); t._last_sync_rate = None; self._refresh_seq_cache(path)
         loop_state = self.clip_loops.get(path, True); t.set_loop_mode(loop_state)
         if key == self.active_edit_track:
             self.chk_loop_track.blockSignals(True); self.chk_loop_track.setChecked(loop_state); self.chk_loop_track.blockSignals(False)
-        t.play(); self.update_curve_ui()
+        t.play()
+        if key == self.active_edit_track: self.update_curve_ui() # Other decks' curves aren't on screen
 
-    def set_track_volume(self, key, val):
-        if not self.mute_states[key]: self.tracks[key].set_volume(val / 100.0)
+    def set_track_volume(self, key, val): self._debounce(('vol', key), self._apply_track_volume, key, val)
+    def _apply_track_volume(self, key, val):
+        if not self.mute_states[key]: self.tracks[key].set_volume(float(self._VOL_LUT[val]))
     
-    def set_track_filter(self, key, val):
-        self.tracks[key].set_filter(val)
+    def set_track_filter(self, key, val): self._debounce(('filter', key), self.tracks[key].set_filter, val)
 
     def toggle_track_mute(self, key, muted):
+        # Only reached from the button's toggled signal, so the button already shows `muted`
         self.mute_states[key] = muted
-        self.mute_buttons[key].blockSignals(True); self.mute_buttons[key].setChecked(muted); self.mute_buttons[key].blockSignals(False)
-        self.tracks[key].set_volume(0 if muted else self.faders[key].value() / 100.0)
+        self.tracks[key].set_volume(0 if muted else float(self._VOL_LUT[self.faders[key].value()]))
+
+    def _analysis_done(self, worker, key, pix, bpm, dur, raw, rate, wav, bass, treble):
+        if worker in self.active_workers: self.active_workers.remove(worker)
+        self.prep_done(key, pix, bpm, dur, raw, rate, wav, bass, treble)
+        # Cache what the deck kept (int16 / memmapped), not the worker's raw array
+        if raw is None: return
+        self.analysis_cache[(worker.filepath, worker.bg_color.name())] = (pix, bpm, dur, self.tracks[key].raw_samples if self.tracks[key].current_filepath == worker.filepath else raw, rate, wav, bass, treble)
+        if len(self.analysis_cache) > 16: self.analysis_cache.popitem(last=False) # Entries hold sample arrays, keep the LRU small
 
     def prep_done(self, key, pix, bpm, dur, raw, rate, wav, bass, treble):
         path = self.bank_data[self.current_bank].get(key)
         if path:
             self.clip_meta[path] = bpm
-            self.tracks[key].set_audio_data(raw, rate)
+            self.tracks[key].set_audio_data(raw, rate, wav)
             self.tracks[key].load_stems(wav, bass, treble) # LOAD STEMS
         self.buttons[key].set_data(pix, bpm, dur)
 
@@ -721,10 +910,18 @@ class LooperApp(QMainWindow):
         self.current_bank = i; self.current_generation += 1
         for b in self.bank_btns: b.setChecked(False)
         self.bank_btns[i].setChecked(True)
+        # Mark every pad first so the UI reflects the switch before any load work starts
+        to_load = []
         for k in ['a','s','d','f']: 
-            self.buttons[k].filename = "[Empty]"; self.buttons[k].update()
-            p = self.bank_data[i].get(k)
-            if p: self.load_track(k, p)
+            self.buttons[k].filename = "[Empty]"; p = self.bank_data[i].get(k)
+            if p: self.buttons[k].set_loading(); to_load.append((k, p))
+            else: self.buttons[k].update()
+        # Let the loading state paint before the four players are re-sourced
+        gen = self.current_generation; QTimer.singleShot(0, lambda: self._load_tracks(gen, to_load))
+
+    def _load_tracks(self, gen, to_load):
+        if gen != self.current_generation: return # Another bank switch superseded this one
+        for k, p in to_load: self.load_track(k, p)
 
     def get_target_deck_info(self): t = self.tracks[self.active_edit_track]; return (t, t.current_filepath)
 
@@ -754,59 +951,93 @@ class LooperApp(QMainWindow):
                 # Trigger logic for current step
                 self.trigger_all_tracks_for_step()
 
+        # Sleep until the next step is due (deadline from transport start, so no drift accumulates)
+        next_step_time = self.transport_start_time + (self.last_processed_step_global + 1) * self.step_ms() / 1000.0
+        self.seq_timer.start(max(0, int((next_step_time - time.time()) * 1000) + 1))
+
     def trigger_all_tracks_for_step(self):
         # This function updates internal step counters and triggers audio
-        for k in ['a','s','d','f']:
-            t = self.tracks[k]; path = t.current_filepath
-            if path and path in self.clip_sequencer_data:
-                # Update track-specific step pointer
-                seq_data = self.clip_sequencer_data[path]
-                ls = int(seq_data['loop_start'])
-                ll = int(seq_data['loop_length'])
-                
-                # Advance step
-                t.seq_current_step = ls + ((t.seq_current_step + 1 - ls) % ll)
-                
-                # Check for trigger note
-                seq_points = seq_data['points']
-                if t.seq_current_step in seq_points:
-                    val = seq_points[t.seq_current_step]
-                    t.trigger(int(val * t.duration()))
+        for t in self.tracks.values():
+            cache = t._seq_cache
+            if cache is None: continue
+            ls, ll, dense = cache
+            
+            # Advance track-specific step pointer
+            step = ls + ((t.seq_current_step + 1 - ls) % ll); t.seq_current_step = step
+            
+            # Check for trigger note
+            val = dense[step]
+            if val >= 0: t.trigger(int(float(val) * t._duration_ms))
                     
         # Update UI for active track
-        active_t = self.tracks[self.active_edit_track]
-        self.piano_roll.current_step = active_t.seq_current_step
-        self.piano_roll.update()
+        self.piano_roll.set_current_step(self.tracks[self.active_edit_track].seq_current_step)
 
     def toggle_play_state(self):
-        for t in self.tracks.values(): t.play() if t.has_media() and t.playbackState()!=QMediaPlayer.PlaybackState.PlayingState else t.pause()
+        for t in self.tracks.values():
+            if not t.has_media(): t.pause()
+            elif t.playbackState() != QMediaPlayer.PlaybackState.PlayingState: t.play()
+            else: t.release() # Fades out on the release curve; the envelope pauses the players at IDLE
 
-    def update_mixer(self): pass
-    def change_main_output(self, i): d = self.audio_devices[i]; [t.set_main_output(d) for t in self.tracks.values()]
-    def change_cue_output(self, i): d = self.audio_devices[i]; [t.set_cue_output(d) for t in self.tracks.values()]
+    def change_main_output(self, i):
+        d = self.audio_devices[i]
+        for t in self.tracks.values(): t.set_main_output(d)
+    def change_cue_output(self, i):
+        d = self.audio_devices[i]
+        for t in self.tracks.values(): t.set_cue_output(d)
 
     def sync_deck(self, deck, key):
+        if not deck.has_media(): return
         path = deck.current_filepath; cb = self.clip_meta.get(path, 120.0) if path else 120.0
-        rate = self.master_bpm / cb if cb > 0 else 1.0; deck.setPlaybackRate(rate)
-        if deck.base_wav_path: w = RubberBandWorker(key, deck.base_wav_path, rate); w.finished.connect(lambda k,p,r: deck.swap_audio(p,False)); self.active_workers.append(w); w.start()
+        rate = self.master_bpm / cb if cb > 0 else 1.0
+        # Unchanged rate (e.g. a nudge that doesn't move this clip's ratio): no rate write, no RubberBand job
+        if deck._last_sync_rate is not None and abs(rate - deck._last_sync_rate) < 1e-3: return
+        deck._last_sync_rate = rate; deck.setPlaybackRate(rate)
+        self._cancel_stretch(deck) # One in-flight stretch per deck: a newer rate supersedes whatever is still running
+        if not deck.base_wav_path or abs(rate - 1.0) < 1e-3: return # Stems already play at 1.0
+        ck = (deck.base_wav_path, round(rate, 3)); cached = self.stretch_cache.get(ck)
+        if cached and all(os.path.exists(p) for p in cached): self.stretch_cache.move_to_end(ck); deck.swap_audio(cached); return
+        self.active_workers = [x for x in self.active_workers if not (x.isFinished() and x.isInterruptionRequested())] # Superseded, will never emit
+        stems = (deck.bass_wav or deck.base_wav, deck.treble_wav or deck.base_wav) # Stretched separately so the filter dial keeps working
+        w = RubberBandWorker(key, stems, rate); deck.rb_worker = w; src = deck.base_wav_path
+        w.finished.connect(lambda k, p, r, w=w: self._stretch_done(deck, w, src, p, r)); self.active_workers.append(w); w.start(QThread.Priority.LowPriority)
+
+    def _cancel_stretch(self, deck):
+        if deck.rb_worker is not None: deck.rb_worker.requestInterruption(); deck.rb_worker = None
+
+    def _stretch_done(self, deck, worker, src, renders, rate):
+        if worker in self.active_workers: self.active_workers.remove(worker)
+        ck = (src, round(rate, 3)); self.stretch_cache[ck] = renders; self.stretch_cache.move_to_end(ck)
+        if len(self.stretch_cache) > 32: self.stretch_cache.popitem(last=False)
+        if worker is not deck.rb_worker: return
+        deck.rb_worker = None
+        # Only if the deck is still on this clip at this tempo with sync on
+        if self.btn_vid_sync.isChecked() and deck.base_wav_path == src and round(deck.playback_rate, 3) == round(rate, 3): deck.swap_audio(renders)
+
+    def sync_all_decks(self):
+        for k, t in self.tracks.items(): self.sync_deck(t, k)
 
     def toggle_vid_sync(self):
         on = self.btn_vid_sync.isChecked(); self.btn_vid_sync.setText(f"SYNC: {'ON' if on else 'OFF'}")
-        if on: [self.sync_deck(self.tracks[k], k) for k in self.tracks]
-        else: [t.setPlaybackRate(1.0) for t in self.tracks.values()]
+        if on: self.sync_all_decks()
+        else:
+            for t in self.tracks.values(): self._cancel_stretch(t); t.setPlaybackRate(1.0); t._last_sync_rate = None
 
     def auto_align_phase(self):
         if self.master_bpm <= 0: return
         # Align using new transport start
-        beat_ms = 60000.0/self.master_bpm; phase = (time.time() - self.transport_start_time)*1000 % beat_ms
-        for t in self.tracks.values():
-            if t.has_media(): diff = phase - (t.position() % beat_ms); t.seek(max(0, int(t.position() + (diff + beat_ms if diff < -beat_ms/2 else diff - beat_ms if diff > beat_ms/2 else diff))))
+        beat_ms = 60000.0/self.master_bpm; phase = self.transport_clock.elapsed() % beat_ms
+        decks = [t for t in self.tracks.values() if t.has_media()]
+        if not decks: return
+        # Wrap each deck's phase error into (-beat/2, beat/2] and seek by it, all four lanes at once
+        positions = np.array([t.position() for t in decks], dtype=np.float64)
+        diffs = phase - positions % beat_ms; diffs = np.where(diffs < -beat_ms/2, diffs + beat_ms, np.where(diffs > beat_ms/2, diffs - beat_ms, diffs))
+        for t, pos in zip(decks, np.maximum(0, positions + diffs).astype(np.int64).tolist()): t.seek(pos)
 
     def set_loop_length(self, length): self.piano_roll.set_loop_window(self.piano_roll.loop_start, length)
     def nudge_bpm(self, amount):
         if QApplication.keyboardModifiers() & Qt.KeyboardModifier.ShiftModifier: amount *= 10
         self.master_bpm = round(max(10.0, self.master_bpm + amount), 1); self.bpm_lbl.setText(f"{self.master_bpm} BPM")
-        if self.btn_vid_sync.isChecked(): [self.sync_deck(self.tracks[k], k) for k in self.tracks]
+        if self.btn_vid_sync.isChecked(): self._sync_timer.start() # Coalesce rapid nudges into one resync
         self.update_clock()
     
     def update_curve_ui(self): 
@@ -826,52 +1057,86 @@ class LooperApp(QMainWindow):
                 self.clip_sequencer_data[path] = {'points': {}, 'loop_start': 0, 'loop_length': 64}
             self.clip_sequencer_data[path]['loop_start'] = int(start)
             self.clip_sequencer_data[path]['loop_length'] = int(length)
+            self._refresh_seq_cache(path)
 
     def save_curve_data(self): 
         _, path = self.get_target_deck_info()
         if path:
             if path not in self.clip_sequencer_data: self.clip_sequencer_data[path] = {'points': {}, 'loop_start': 0, 'loop_length': 64}
-            self.clip_sequencer_data[path]['points'] = self.piano_roll.get_data()
+            self.clip_sequencer_data[path]['points'] = self.piano_roll.get_data(); self._rebuild_dense(path)
+
+    def _rebuild_dense(self, path):
+        # Sparse {step: val} -> dense per-step array so the sequencer does one index per track per step
+        dense = np.full(64, -1.0, dtype=np.float32); points = self.clip_sequencer_data[path]['points']
+        if points: dense[np.fromiter(points.keys(), dtype=np.int32, count=len(points))] = np.fromiter(points.values(), dtype=np.float32, count=len(points))
+        self.clip_dense[path] = dense; self._refresh_seq_cache(path); return dense
+
+    def _refresh_seq_cache(self, path):
+        # Decks playing `path` hold (loop_start, loop_length, dense) so the step loop never walks the nested dicts
+        data = self.clip_sequencer_data.get(path); dense = self.clip_dense.get(path)
+        if data is not None and dense is None: self._rebuild_dense(path); return
+        cache = None if data is None else (int(data['loop_start']), int(data['loop_length']), dense)
+        for t in self.tracks.values():
+            if t.current_filepath == path: t._seq_cache = cache
 
     def toggle_sequencer(self): 
         self.seq_running = not self.seq_running
         self.btn_run.setChecked(self.seq_running)
         if self.seq_running:
-            self.transport_start_time = time.time() # Reset clock base
+            self.transport_start_time = time.time(); self.transport_clock.start() # Reset clock base
             self.last_processed_step_global = -1
             self.update_clock()
         else:
             self.seq_timer.stop()
 
+    def step_ms(self):
+        if self._step_ms is None: self._step_ms = 60000.0 / (self.master_bpm * 4 * self.seq_multiplier)
+        return self._step_ms
+
     def update_clock(self):
-        # Run timer fast (10ms) to check wall clock freq
-        if self.seq_running and not self.seq_timer.isActive(): self.seq_timer.start(10)
+        # Tempo changed (or transport started): drop the cached step length and re-arm against it
+        self._step_ms = None
+        if self.seq_running: self.seq_timer.start(0)
 
-    def change_seq_speed(self, i): self.seq_multiplier = [0.5, 1.0, 2.0][i]
+    def change_seq_speed(self, i): self.seq_multiplier = [0.5, 1.0, 2.0][i]; self.update_clock()
     
     def handle_tap_tempo(self):
         now = time.time(); self.tap_times.append(now)
-        if len(self.tap_times)>4: self.tap_times.pop(0)
         if len(self.tap_times)>1:
-            avg = sum([self.tap_times[i+1]-self.tap_times[i] for i in range(len(self.tap_times)-1)]) / (len(self.tap_times)-1)
+            # Mean of consecutive intervals telescopes to (last - first) / (n - 1)
+            avg = (self.tap_times[-1] - self.tap_times[0]) / (len(self.tap_times)-1)
             self.master_bpm = round(60.0/avg, 1); self.bpm_lbl.setText(f"{self.master_bpm} BPM")
-            if self.btn_vid_sync.isChecked(): [self.sync_deck(self.tracks[k], k) for k in self.tracks]
+            if self.btn_vid_sync.isChecked(): self._sync_timer.start()
             self.update_clock()
             
     def open_hotkey_editor(self):
         editor = HotkeyEditor(self.key_bindings, self)
-        if editor.exec() == QDialog.DialogCode.Accepted: self.key_bindings = editor.get_bindings()
-    def open_midi_editor(self): editor = MidiConfigDialog(self.midi_worker, self.midi_map, self); editor.exec()
+        if editor.exec() == QDialog.DialogCode.Accepted: self.key_bindings = editor.get_bindings(); self._build_key_dispatch()
+    def open_midi_editor(self):
+        editor = MidiConfigDialog(self.midi_worker, self.midi_map, self); self.midi_learn_dialog = editor
+        editor.exec(); self.midi_learn_dialog = None; self._rebuild_midi_dispatch()
+    def _rebuild_midi_dispatch(self):
+        # (msg.type, control/note) -> action, so each incoming message is one dict probe
+        self._midi_dispatch = {(b['type'], b['val']): a for a, b in self.midi_map.items() if b}
+    def _drain_midi(self):
+        # Handles every message queued since the last tick (CC bursts from a fader sweep arrive together)
+        ring = self.midi_worker.ring
+        while ring:
+            msg = ring.popleft()
+            if self.midi_learn_dialog: self.midi_learn_dialog.on_midi_message(msg)
+            self.handle_midi_message(msg)
     def handle_midi_message(self, msg):
-        for action, binding in self.midi_map.items():
-            if not binding: continue
-            if (msg.type == binding['type'] and (msg.control if msg.type == 'control_change' else msg.note) == binding['val']):
-                if action.startswith("FADER_"): self.faders[action.split("_")[1].lower()].setValue(int((msg.value / 127.0) * 100))
-                elif action == "PLAY_PAUSE" and msg.type == 'note_on' and msg.velocity > 0: self.toggle_play_state()
-                elif action == "TOGGLE_SEQUENCER" and msg.type == 'note_on' and msg.velocity > 0: self.toggle_sequencer()
-                elif action == "TAP_TEMPO" and msg.type == 'note_on' and msg.velocity > 0: self.handle_tap_tempo()
-                elif action.startswith("TRIGGER_") and msg.type == 'note_on' and msg.velocity > 0:
-                    k = action.split("_")[1].lower(); self.select_track_for_edit(k); self.tracks[k].seek(0); self.tracks[k].play()
+        if msg.type == 'control_change': action = self._midi_dispatch.get((msg.type, msg.control))
+        elif msg.type == 'note_on' and msg.velocity > 0: action = self._midi_dispatch.get((msg.type, msg.note))
+        else: return # note_off / zero-velocity note_on / clock etc. never map to an action
+        if action is None: return
+        if action.startswith("FADER_"): self.faders[action[6:].lower()].setValue(int((msg.value / 127.0) * 100))
+        elif msg.type != 'note_on': return
+        elif action == "PLAY_PAUSE": self.toggle_play_state()
+        elif action == "TOGGLE_SEQUENCER": self.toggle_sequencer()
+        elif action == "TAP_TEMPO": self.handle_tap_tempo()
+        elif action.startswith("TRIGGER_"):
+            k = action[8:].lower(); self.select_track_for_edit(k); self.tracks[k].seek(0); self.tracks[k].play()
 
     def on_deck_a_pos(self, p): self.buttons['a'].update_playhead(p/self.tracks['a'].duration())
     def on_deck_b_pos(self, p): self.buttons['b'].update_playhead(p/self.tracks['b'].duration()) 
@@ -879,46 +1144,44 @@ class LooperApp(QMainWindow):
     def load_set(self):
         f, _ = QFileDialog.getOpenFileName(self, "Load", "", "JSON (*.json)")
         if f: 
-            d=json.load(open(f,'r')); self.bank_data=d['banks']
-            self.key_bindings={k:int(v) for k,v in d.get('keys',self.key_bindings).items()}
-            self.midi_map=d.get('midi',self.midi_map)
+            d=read_set_file(f); self.bank_data=d['banks']
+            self.key_bindings={k:int(v) for k,v in d.get('keys',self.key_bindings).items()}; self._build_key_dispatch()
+            self.midi_map=d.get('midi',self.midi_map); self._rebuild_midi_dispatch()
             # Migration logic for v26 polyrhythms
             if 'curves' in d and 'sequencer' not in d:
                 for path, points in d['curves'].items():
                     self.clip_sequencer_data[path] = {'points': {int(k):v for k,v in points.items()}, 'loop_start':0, 'loop_length':64}
             else:
-                raw_seq = d.get('sequencer', {})
-                self.clip_sequencer_data = {}
-                for path, data in raw_seq.items():
-                    # FORCE INT CASTING ON LOAD
-                    self.clip_sequencer_data[path] = {
-                        'points': {int(k):v for k,v in data['points'].items()},
-                        'loop_start': int(data['loop_start']),
-                        'loop_length': int(data['loop_length'])
-                    }
-            self.clip_loops=d.get('loops', {})
+                # FORCE INT CASTING ON LOAD
+                self.clip_sequencer_data = {path: {'points': {int(k):v for k,v in data['points'].items()}, 'loop_start': int(data['loop_start']), 'loop_length': int(data['loop_length'])}
+                                            for path, data in d.get('sequencer', {}).items()}
+            self.clip_loops=d.get('loops', {}); self.clip_dense = {}
+            for t in self.tracks.values(): t._seq_cache = None
+            for path in self.clip_sequencer_data: self._rebuild_dense(path) # Eagerly, so the first beat after loading does no array building
             self.switch_bank(0)
 
     def save_set(self):
         f, _ = QFileDialog.getSaveFileName(self, "Save", "", "JSON (*.json)")
-        if f: json.dump({'banks':self.bank_data, 'sequencer':self.clip_sequencer_data, 'keys':self.key_bindings, 'midi':self.midi_map, 'loops':self.clip_loops}, open(f,'w'))
+        if f:
+            # Clips with no notes and the default full loop are not worth writing out
+            seq = {p: d for p, d in self.clip_sequencer_data.items() if d['points'] or d['loop_start'] != 0 or d['loop_length'] != 64}
+            write_set_file(f, {'banks':self.bank_data, 'sequencer':seq, 'keys':{k:int(v) for k,v in self.key_bindings.items()}, 'midi':self.midi_map, 'loops':self.clip_loops})
+
+    def _build_key_dispatch(self):
+        # key code -> handler; earlier entries win if two actions share a key (same priority as the old if-chain)
+        keys = self.key_bindings; self._keydispatch = {}
+        actions = [(f"MUTE_{k.upper()}", self.mute_buttons[k].toggle) for k in ('a', 's', 'd', 'f')]
+        actions += [("PLAY_PAUSE", self.toggle_play_state), ("TOGGLE_SEQUENCER", self.toggle_sequencer), ("TAP_TEMPO", self.handle_tap_tempo),
+                    ("BANK_1", lambda: self.switch_bank(0)), ("BANK_2", lambda: self.switch_bank(1)), ("BANK_3", lambda: self.switch_bank(2))]
+        for action, fn in actions:
+            if keys.get(action) is not None: self._keydispatch.setdefault(int(keys[action]), fn)
 
     def eventFilter(self, src, e):
-        if e.type() == QEvent.Type.KeyPress and not e.isAutoRepeat():
-            k = e.key(); keys = self.key_bindings
-            if k == keys.get("MUTE_A"): self.toggle_track_mute('a', not self.mute_states['a']); return True
-            if k == keys.get("MUTE_S"): self.toggle_track_mute('s', not self.mute_states['s']); return True
-            if k == keys.get("MUTE_D"): self.toggle_track_mute('d', not self.mute_states['d']); return True
-            if k == keys.get("MUTE_F"): self.toggle_track_mute('f', not self.mute_states['f']); return True
-            if k == Qt.Key.Key_Left or k == Qt.Key.Key_Right:
-                if self.piano_roll.hasFocus() and self.piano_roll.selection: return False 
-            if k == keys["PLAY_PAUSE"]: self.toggle_play_state(); return True
-            if k == keys["TOGGLE_SEQUENCER"]: self.toggle_sequencer(); return True
-            if k == keys["TAP_TEMPO"]: self.handle_tap_tempo(); return True
-            if k == keys["BANK_1"]: self.switch_bank(0); return True
-            if k == keys["BANK_2"]: self.switch_bank(1); return True
-            if k == keys["BANK_3"]: self.switch_bank(2); return True
-        return super().eventFilter(src, e)
+        if e.type() != QEvent.Type.KeyPress or e.isAutoRepeat(): return super().eventFilter(src, e)
+        fn = self._keydispatch.get(e.key())
+        if fn is None: return super().eventFilter(src, e)
+        if e.key() in (Qt.Key.Key_Left, Qt.Key.Key_Right) and self.piano_roll.hasFocus() and self.piano_roll.selection: return False # Nudge wins
+        fn(); return True
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
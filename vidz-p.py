@@ -6,11 +6,26 @@ import json
 import uuid
 import subprocess
 import shutil
+from collections import deque
 import numpy as np
 import librosa
 import mido 
 from pydub import AudioSegment
 
+# --- SAFE IMPORT FOR FAST JSON ---
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+# --- SAFE IMPORT FOR JIT ---
+try:
+    from numba import njit
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
 # --- IMPORTS ---
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QGridLayout, 
                              QLabel, QVBoxLayout, QPushButton, QSlider,
@@ -22,7 +37,7 @@ from PyQt6.QtOpenGLWidgets import QOpenGLWidget
 from PyQt6.QtMultimedia import (QMediaPlayer, QAudioOutput, QMediaDevices)
 from PyQt6.QtMultimediaWidgets import QGraphicsVideoItem
 from PyQt6.QtCore import (QUrl, Qt, QTimer, QEvent, QThread, pyqtSignal, 
-                          QRectF, QPointF, QSizeF, QRect, QObject)
+                          QRectF, QPointF, QSizeF, QRect, QObject, QLineF, QRunnable, QThreadPool)
 from PyQt6.QtGui import QPainter, QColor, QPen, QBrush, QPixmap, QPolygonF, QFont, QCursor, QAction, QKeySequence
 
 # --- STYLING ---
@@ -58,15 +73,27 @@ QTableWidget::item:selected { background-color: #00CCFF; color: black; }
 
 KEY_MAP = {'a': (0, 0, "#FF0055"), 's': (0, 1, "#00CCFF"), 'd': (1, 0, "#00FF66"), 'f': (1, 1, "#FFAA00")}
 
+# --- TAP TEMPO (ring of monotonic_ns stamps) ---
+def _tap_bpm(taps, n, head):
+    # Mean of the n-1 pairwise gaps, oldest..newest around the ring; head is the next write slot
+    s = 0.0; start = head - n
+    for i in range(start, head - 1):
+        s += taps[(i + 1) % taps.shape[0]] - taps[i % taps.shape[0]]
+    return round(60.0 / (s / (n - 1) * 1e-9), 1)
+if HAS_NUMBA:
+    _tap_bpm = njit(cache=True)(_tap_bpm)
+    _tap_bpm(np.arange(4, dtype=np.int64), 2, 2) # Compile at import so the first tap isn't the slow one
+
 # ==========================================
 # 1. WORKERS & HELPERS
 # ==========================================
 
 class MidiWorker(QThread):
-    message_received = pyqtSignal(object) 
+    message_received = pyqtSignal(object) # Emitted on the GUI thread by LooperApp._drain_midi, not from run()
     def __init__(self):
         super().__init__()
         self.input_port = None; self.port_name = None; self.running = False
+        self.queue = deque(maxlen=256) # Appended here, popped by the GUI; deque ends are thread-safe so no lock or per-message signal
     def set_port(self, name):
         if self.input_port: self.input_port.close()
         self.port_name = name
@@ -77,7 +104,7 @@ class MidiWorker(QThread):
             with mido.open_input(self.port_name) as port:
                 self.input_port = port
                 while self.running:
-                    for msg in port.iter_pending(): self.message_received.emit(msg)
+                    for msg in port.iter_pending(): self.queue.append(msg)
                     time.sleep(0.001) 
         except: pass
     def stop(self): self.running = False; self.wait()
@@ -102,30 +129,72 @@ class AudioAnalysisWorker(QThread):
             vis_samples = np.array(audio_vis.set_channels(1).set_frame_rate(11025).get_array_of_samples())
             tempo, _ = librosa.beat.beat_track(y=vis_samples.astype(np.float32)/32768.0, sr=11025)
             bpm = float(tempo.item()) if isinstance(tempo, np.ndarray) else float(round(tempo, 2))
-            draw_samples = vis_samples[::150]
+            # Abs-max per pixel column in one pass over a (cols, bin) view; int32 so abs(-32768) doesn't wrap
+            n = len(vis_samples); bin_size = max(1, n // self.width); cols = min(self.width, n // bin_size)
+            peaks = np.abs(vis_samples[:bin_size * cols].astype(np.int32).reshape(cols, bin_size)).max(axis=1) * (self.height * 0.9 / 32768.0)
+            if self.isInterruptionRequested(): return
             pixmap = QPixmap(self.width, self.height); pixmap.fill(Qt.GlobalColor.transparent)
-            painter = QPainter(pixmap); painter.setPen(QPen(self.bg_color.darker(150), 1)); center_y = self.height / 2; step = len(draw_samples) / self.width
-            for x in range(self.width):
-                if self.isInterruptionRequested(): return
-                idx = int(x * step)
-                if idx < len(draw_samples): h = abs(draw_samples[idx]) * (self.height * 0.9) / 32768.0; painter.drawLine(x, int(center_y - h/2), x, int(center_y + h/2))
+            painter = QPainter(pixmap); painter.setPen(QPen(self.bg_color.darker(150), 1)); center_y = self.height / 2
+            painter.drawLines([QLineF(x, int(center_y - h/2), x, int(center_y + h/2)) for x, h in enumerate(peaks.tolist())])
             painter.end()
             if not self.isInterruptionRequested(): self.finished.emit(self.key, pixmap, bpm, duration_ms, raw_samples, sample_rate, wav_path)
         except:
             if not self.isInterruptionRequested(): self.finished.emit(self.key, QPixmap(), 120.0, 0, None, 44100, "")
 
-class RubberBandWorker(QThread):
-    finished = pyqtSignal(str, str, float)
-    def __init__(self, key, original_wav, tempo_ratio):
-        super().__init__(); self.key, self.original_wav, self.tempo_ratio = key, original_wav, tempo_ratio
+class BatchRubberBandWorker(QThread):
+    # One thread renders every deck's stretch in turn; QThread.finished fires once the whole batch is through
+    item_done = pyqtSignal(str, str, str, float) # key, source wav, stretched wav, ratio
+    def __init__(self, items):
+        super().__init__(); self.items = items # [(key, original_wav, tempo_ratio), ...]
+    def run(self):
+        if shutil.which("rubberband") is None: return
+        for key, original_wav, tempo_ratio in self.items:
+            try:
+                if not os.path.exists(original_wav) or tempo_ratio <= 0: continue
+                unique_id = uuid.uuid4().hex[:8]; base, ext = os.path.splitext(original_wav); out_path = f"{base}_st_{tempo_ratio:.2f}_{unique_id}{ext}"
+                subprocess.run(["rubberband", "-q", "realtime", "-t", str(1.0/tempo_ratio), original_wav, out_path], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                self.item_done.emit(key, original_wav, out_path, tempo_ratio)
+            except: pass
+
+def read_set_file(path):
+    if HAS_ORJSON:
+        with open(path, 'rb') as fh: return orjson.loads(fh.read())
+    with open(path, 'r') as fh: return json.load(fh)
+
+def write_set_file(path, data):
+    # int dict keys (banks, step numbers) are written as strings either way
+    if HAS_ORJSON:
+        with open(path, 'wb') as fh: fh.write(orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS))
+    else:
+        with open(path, 'w') as fh: json.dump(data, fh)
+
+class _SetFileSignals(QObject):
+    loaded = pyqtSignal(object); failed = pyqtSignal(str); done = pyqtSignal() # done: always last, after loaded/failed
+
+class SetFileTask(QRunnable):
+    # Set file I/O + (de)serialisation on the global pool; data=None reads, anything else is written
+    def __init__(self, path, data=None):
+        super().__init__(); self.setAutoDelete(False); self.path, self.data = path, data; self.signals = _SetFileSignals()
     def run(self):
         try:
-            if not os.path.exists(self.original_wav) or self.tempo_ratio <= 0: return
-            unique_id = uuid.uuid4().hex[:8]; base, ext = os.path.splitext(self.original_wav); out_path = f"{base}_st_{self.tempo_ratio:.2f}_{unique_id}{ext}"
-            if shutil.which("rubberband") is None: return
-            subprocess.run(["rubberband", "-q", "realtime", "-t", str(1.0/self.tempo_ratio), self.original_wav, out_path], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-            self.finished.emit(self.key, out_path, self.tempo_ratio)
-        except: pass
+            if self.data is None: self.signals.loaded.emit(read_set_file(self.path))
+            else: write_set_file(self.path, self.data)
+        except Exception as e: self.signals.failed.emit(str(e))
+        finally: self.signals.done.emit()
+
+_KEY_PRESS = QEvent.Type.KeyPress # Bound once: the filter below sees every event in the app
+
+class KeyFilter(QObject):
+    # App-wide hotkey filter; a bare QObject so non-key events return without touching QMainWindow's eventFilter
+    def __init__(self, piano_roll, parent=None):
+        super().__init__(parent); self.piano_roll = piano_roll; self.dispatch = {}
+    def set_dispatch(self, dispatch): self.dispatch = dispatch
+    def eventFilter(self, src, e):
+        if e.type() != _KEY_PRESS or e.isAutoRepeat(): return False
+        fn = self.dispatch.get(e.key())
+        if fn is None: return False
+        if e.key() in (Qt.Key.Key_Left, Qt.Key.Key_Right) and self.piano_roll.hasFocus() and self.piano_roll.selection: return False # Nudge wins
+        fn(); return True
 
 # ==========================================
 # 2. CORE COMPONENTS
@@ -145,6 +214,8 @@ class VJDeck:
         self.audio_player = QMediaPlayer(); self.main_output = QAudioOutput(); self.audio_player.setAudioOutput(self.main_output); self.audio_player.setLoops(QMediaPlayer.Loops.Infinite)
         self.cue_player = QMediaPlayer(); self.cue_output = QAudioOutput(); self.cue_player.setAudioOutput(self.cue_output); self.cue_player.setLoops(QMediaPlayer.Loops.Infinite)
         self.cue_active = False; self.raw_samples = None; self.sample_rate = 44100; self.target_volume = 1.0; self.playback_rate = 1.0
+        self.audio_stretched = False; self.rate_trim = 0.0 # Audio is a rubberband render at 1.0x; small phase-correction factor on top of the rates
+        self._jump_ns = 0 # monotonic_ns of the last trigger/seek; auto-align leaves a deck alone for a beat after one
         
         # Envelope State
         self.fade_level = 0.0
@@ -173,7 +244,7 @@ class VJDeck:
         pos = self.player.position(); playing = self.player.playbackState() == QMediaPlayer.PlaybackState.PlayingState; url = QUrl.fromLocalFile(path)
         self.audio_player.setSource(url); self.cue_player.setSource(url)
         loop_const = QMediaPlayer.Loops.Infinite if self.is_looping else QMediaPlayer.Loops.Once
-        self.audio_player.setLoops(loop_const); self.cue_player.setLoops(loop_const)
+        self.audio_player.setLoops(loop_const); self.cue_player.setLoops(loop_const); self.audio_stretched = not reset_rate_to_video; self.rate_trim = 0.0
         if reset_rate_to_video:
             self.audio_player.setPlaybackRate(self.playback_rate); self.cue_player.setPlaybackRate(self.playback_rate)
             self.audio_player.setPosition(pos); self.cue_player.setPosition(pos)
@@ -193,8 +264,8 @@ class VJDeck:
         self.video_item.setOpacity(0)
         
         # 2. Seek & Play
-        self.player.setPosition(pos)
-        a_pos = int(pos / self.playback_rate) if (self.audio_player.playbackRate() == 1.0 and self.playback_rate != 1.0) else pos
+        self.player.setPosition(pos); self._jump_ns = time.monotonic_ns()
+        a_pos = int(pos / self.playback_rate) if (self.audio_stretched and self.playback_rate != 1.0) else pos
         self.audio_player.setPosition(a_pos); self.cue_player.setPosition(a_pos) if self.cue_active else None
         
         if self.player.playbackState() != QMediaPlayer.PlaybackState.PlayingState:
@@ -261,17 +332,21 @@ class VJDeck:
         if not self.fade_timer.isActive(): self.fade_timer.start()
 
     def seek(self, pos): 
-        self.player.setPosition(pos)
-        a_pos = int(pos / self.playback_rate) if (self.audio_player.playbackRate() == 1.0 and self.playback_rate != 1.0) else pos
+        self.player.setPosition(pos); self._jump_ns = time.monotonic_ns()
+        a_pos = int(pos / self.playback_rate) if (self.audio_stretched and self.playback_rate != 1.0) else pos
         self.audio_player.setPosition(a_pos); self.cue_player.setPosition(a_pos) if self.cue_active else None
         
     def position(self): return self.player.position()
     def duration(self): return self.player.duration()
     def playbackState(self): return self.player.playbackState()
     def setPlaybackRate(self, rate): 
-        self.playback_rate = rate; self.player.setPlaybackRate(rate)
-        if self.base_wav_path and self.audio_player.playbackRate() == 1.0: self.swap_audio(self.base_wav_path, reset_rate_to_video=True)
+        self.playback_rate = rate; self.rate_trim = 0.0; self.player.setPlaybackRate(rate)
+        if self.base_wav_path and self.audio_stretched: self.swap_audio(self.base_wav_path, reset_rate_to_video=True)
         self.audio_player.setPlaybackRate(rate); self.cue_player.setPlaybackRate(rate)
+    def trim_rate(self, trim):
+        # Phase correction: scale video and audio together, keeping the stretched file / base rate as is
+        self.rate_trim = trim; a_rate = (1.0 if self.audio_stretched else self.playback_rate) * (1.0 + trim)
+        self.player.setPlaybackRate(self.playback_rate * (1.0 + trim)); self.audio_player.setPlaybackRate(a_rate); self.cue_player.setPlaybackRate(a_rate)
     def set_main_output(self, device): self.main_output.setDevice(device)
     def set_cue_output(self, device): self.cue_output.setDevice(device)
 
@@ -284,21 +359,36 @@ class InteractiveWaveform(QLabel):
         self.filename = "[Empty]"; self.bpm_text = ""; self.waveform_pixmap = None
         self.playhead_x = 0; self.is_deck_a = False; self.is_deck_b = False
         self.loading = False; self.hotcues = {}; self.track_duration = 0
+        self._bg_pix = None; self._bg_key = None
     def paintEvent(self, event):
-        painter = QPainter(self); painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        painter = QPainter(self)
+        # Waveform + border + label only change with these; playhead moves just blit the cached layer
+        active = self.parent_app.active_edit_track == self.key_char
+        key = (self.waveform_pixmap.cacheKey() if self.waveform_pixmap else 0, active, self.filename, self.bpm_text, self.loading, self.size(), self.devicePixelRatioF())
+        if key != self._bg_key: self._bg_pix = self.render_background(active); self._bg_key = key
+        painter.drawPixmap(0, 0, self._bg_pix)
+        if self.track_duration: painter.setPen(QPen(QColor("white"), 1)); painter.drawLine(self.playhead_x, 0, self.playhead_x, self.height())
+        painter.end()
+    def render_background(self, active):
+        dpr = self.devicePixelRatioF(); pix = QPixmap(int(self.width() * dpr), int(self.height() * dpr)); pix.setDevicePixelRatio(dpr); pix.fill(Qt.GlobalColor.transparent)
+        painter = QPainter(pix); painter.setRenderHint(QPainter.RenderHint.Antialiasing)
         if self.waveform_pixmap: painter.drawPixmap(0, 0, self.waveform_pixmap)
-        if self.parent_app.active_edit_track == self.key_char:
+        if active:
             painter.setPen(QPen(QColor("#FFFFFF"), 3)); painter.drawRect(self.rect().adjusted(2,2,-2,-2))
         else:
             painter.setPen(QPen(self.base_color, 2)); painter.drawRect(self.rect().adjusted(1,1,-1,-1))
         painter.setPen(QColor("white")); font = painter.font(); font.setBold(True); font.setPointSize(10); painter.setFont(font)
         label = f"TRACK {self.key_char.upper()}\n{self.filename}{status}\n{self.bpm_text}" if (status := " (...)" if self.loading else "") else f"TRACK {self.key_char.upper()}\n{self.filename}\n{self.bpm_text}"
         painter.drawText(self.rect(), Qt.AlignmentFlag.AlignCenter, label); painter.end()
+        return pix
     def mousePressEvent(self, event): self.parent_app.select_track_for_edit(self.key_char)
     def dragEnterEvent(self, event): event.accept() if event.mimeData().hasUrls() else event.ignore()
     def dropEvent(self, event): self.parent_app.load_track(self.key_char, [u.toLocalFile() for u in event.mimeData().urls()][0])
     def set_data(self, pixmap, bpm, duration): self.waveform_pixmap = pixmap; self.bpm_text = f"{bpm} BPM"; self.track_duration = duration; self.loading = False; self.update()
-    def update_playhead(self, ratio): self.playhead_x = int(ratio * self.width()); self.update()
+    def update_playhead(self, ratio):
+        old, new = self.playhead_x, int(ratio * self.width())
+        if new == old: return
+        self.playhead_x = new; h = self.height(); self.update(QRect(old - 1, 0, 3, h)); self.update(QRect(new - 1, 0, 3, h)) # Two slivers, not the whole pad
     def set_loading(self): self.loading = True; self.update()
 
 # ==========================================
@@ -378,6 +468,13 @@ class PianoRollSequencer(QWidget):
         self.points = {}; self.selection = set(); self.current_step = 0; self.steps = 64; self.loop_start = 0; self.loop_length = 64
         self.mode = "IDLE"; self.drag_start_pos = QPointF(); self.last_mouse_pos = QPointF(); self.marquee_rect = QRectF(); self.move_snapshot = {}; self.clean_slate_points = {}
         self.undo_stack = []; self.redo_stack = []; self.state_at_press = {}; self.setMouseTracking(True); self.setFocusPolicy(Qt.FocusPolicy.ClickFocus) 
+        self._last_cursor_col = 0
+    def set_current_step(self, step):
+        # Repaint only the column the playhead left and the one it entered
+        old = self._last_cursor_col; self.current_step = self._last_cursor_col = step
+        if old == step: return
+        col_w = self.width() / self.steps; h = self.height()
+        self.update(QRect(int(old * col_w) - 1, 0, int(col_w) + 3, h)); self.update(QRect(int(step * col_w) - 1, 0, int(col_w) + 3, h))
     def quantize_selection(self, grid=4):
         if not self.selection: return
         self.push_to_undo(self.points.copy()); new_points = self.points.copy(); new_selection = set(); moves = []
@@ -521,27 +618,48 @@ class LooperApp(QMainWindow):
         }
         self.midi_map = { "FADER_A": None, "FADER_S": None, "FADER_D": None, "FADER_F": None, "PLAY_PAUSE": None, "TOGGLE_SEQUENCER": None, "TAP_TEMPO": None, "TRIGGER_A": None, "TRIGGER_S": None, "TRIGGER_D": None, "TRIGGER_F": None }
         
+        self._rebuild_midi_index()
         self.midi_worker = MidiWorker(); self.midi_worker.message_received.connect(self.handle_midi_message); self.midi_worker.start()
+        self._midi_drain = QTimer(); self._midi_drain.setInterval(2); self._midi_drain.timeout.connect(self._drain_midi); self._midi_drain.start()
 
         # --- 2x2 VIDEO GRID SCENE ---
         self.projector = QWidget(); self.projector.resize(800,600); self.projector.setStyleSheet("background:black")
         self.proj_scene = QGraphicsScene(0,0,800,600); self.proj_view = QGraphicsView(self.projector); self.proj_view.setViewport(QOpenGLWidget()); self.proj_view.resize(800,600); self.proj_view.setScene(self.proj_scene)
         self.proj_view.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff); self.proj_view.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        self.proj_scene.setItemIndexMethod(QGraphicsScene.ItemIndexMethod.NoIndex); self.proj_scene.setBspTreeDepth(0) # Four fixed tiles: a linear scan beats keeping a BSP
         
         self.track_items = {}; positions = [(0,0), (400,0), (0,300), (400,300)]; keys = ['a', 's', 'd', 'f']
         for i, k in enumerate(keys):
-            item = QGraphicsVideoItem(); item.setSize(QSizeF(400, 300)); item.setPos(positions[i][0], positions[i][1])
+            item = QGraphicsVideoItem(); item.setSize(QSizeF(400, 300)); item.setPos(positions[i][0], positions[i][1]); item.setVisible(False) # Shown once a clip loads
             self.proj_scene.addItem(item); self.track_items[k] = item
         self.projector.show()
 
         self.tracks = {}; 
         for k in keys: self.tracks[k] = VJDeck(f"Track {k.upper()}", self.track_items[k])
+        # Per-slot view of whatever clip each track holds; clip_* dicts below stay the per-path store that sets persist
+        self.slot = {k: {'path': None, 'bpm': 120.0, 'loop': True, 'curve': {}, 'wav': None, 'step_tbl': {}} for k in keys}
+        for k in keys: self.tracks[k].player.durationChanged.connect(lambda _, key=k: self._rebuild_step_table(key))
+        # Playheads: positionChanged only records a fraction; one 16ms single-shot pushes whatever arrived to the pads
+        self._dur_inv = {k: 0.0 for k in keys}; self._pending_pos = {}
+        self._pos_timer = QTimer(); self._pos_timer.setSingleShot(True); self._pos_timer.setInterval(16); self._pos_timer.timeout.connect(self._flush_playheads)
+        for k in keys: self.tracks[k].player.positionChanged.connect(lambda p, key=k: self._pos(key, p))
+        # key -> (has media, playing), kept current from the players' own signals so Space needn't query the backend
+        self._deck_state = {k: (False, False) for k in keys}
+        for k in keys:
+            self.tracks[k].player.mediaStatusChanged.connect(lambda st, key=k: self._on_media(key, st))
+            self.tracks[k].player.playbackStateChanged.connect(lambda st, key=k: self._on_play_state(key, st))
 
         self.buttons = {}; self.faders = {}; self.mute_buttons = {}
         self.bank_data = {0: {}, 1: {}, 2: {}}; self.clip_meta = {}; self.clip_curves = {}; self.clip_loops = {}
-        self.active_edit_track = 'a'; self.current_bank = 0; self.current_generation = 0; self.active_workers = []; self.master_bpm = 120.0; self.tap_times = []; self.transport_start_time = time.time()
-        self.seq_running = False; self.current_step = 0; self.seq_multiplier = 1.0; self.seq_timer = QTimer(); self.seq_timer.setTimerType(Qt.TimerType.PreciseTimer); self.seq_timer.timeout.connect(self.run_sequencer_step)
+        self.active_edit_track = 'a'; self.current_bank = 0; self.current_generation = 0; self.active_workers = []; self.master_bpm = 120.0; self._taps = np.zeros(4, dtype=np.int64); self._tap_i = 0; self._tap_n = 0; self._transport_start_ns = time.monotonic_ns()
+        self.seq_running = False; self.current_step = 0; self.seq_multiplier = 1.0; self.seq_timer = QTimer(); self.seq_timer.setTimerType(Qt.TimerType.PreciseTimer); self.seq_timer.setSingleShot(True); self.seq_timer.timeout.connect(self._tick)
+        # Integer clock at 24 PPQN: step n fires at anchor + n*step_ns, all in monotonic_ns
+        self._beat_ns = 500_000_000; self._tick_ns = self._beat_ns // 24; self._step_ns = 6 * self._tick_ns; self._seq_anchor = 0; self._seq_index = 0
         self.mute_states = {'a': False, 's': False, 'd': False, 'f': False}
+        self._rb_cache = {} # (base wav, rate to 3dp) -> stretched wav
+        self._waveform_cache = {} # (clip path, pad colour) -> prep_done args (pix, bpm, dur, None, rate, wav); lives across bank switches
+        self._sync_timer = QTimer(); self._sync_timer.setSingleShot(True); self._sync_timer.setInterval(150); self._sync_timer.timeout.connect(self._apply_sync_all)
+        self.align_timer = QTimer(); self.align_timer.timeout.connect(lambda: self.auto_align_phase() if self.btn_vid_sync.isChecked() else None); self.align_timer.start(100)
 
         scroll = QScrollArea(); scroll.setWidgetResizable(True); self.setCentralWidget(scroll); w = QWidget(); w.setObjectName("Container"); scroll.setWidget(w); l = QVBoxLayout(w); l.setSpacing(5)
 
@@ -550,7 +668,7 @@ class LooperApp(QMainWindow):
         for txt, fn in [("SAVE", self.save_set), ("LOAD", self.load_set), ("KEYS", self.open_hotkey_editor), ("MIDI", self.open_midi_editor)]:
             b = QPushButton(txt); b.clicked.connect(fn); top.addWidget(b)
         self.btn_vid_sync = QPushButton("SYNC: ON"); self.btn_vid_sync.setCheckable(True); self.btn_vid_sync.setChecked(True); self.btn_vid_sync.setProperty("sync","true"); self.btn_vid_sync.clicked.connect(self.toggle_vid_sync)
-        self.btn_align = QPushButton("ALIGN"); self.btn_align.clicked.connect(self.auto_align_phase)
+        self.btn_align = QPushButton("ALIGN"); self.btn_align.clicked.connect(lambda: self.auto_align_phase(hard=True))
         top.addWidget(self.btn_vid_sync); top.addWidget(self.btn_align); l.addLayout(top)
 
         # 2. AUDIO & BANK
@@ -615,7 +733,7 @@ class LooperApp(QMainWindow):
         l.addWidget(self.loop_bar); l.addWidget(self.piano_roll)
 
         self.reopen_btn = QPushButton("OPEN PROJECTOR WINDOW"); self.reopen_btn.clicked.connect(self.projector.show); l.addWidget(self.reopen_btn)
-        QApplication.instance().installEventFilter(self); self.update_mixer()
+        self._kf = KeyFilter(self.piano_roll, self); self._build_key_dispatch(); QApplication.instance().installEventFilter(self._kf); self.update_mixer()
 
     def create_mixer_strip(self, k, col):
         v = QVBoxLayout()
@@ -641,25 +759,35 @@ class LooperApp(QMainWindow):
     def change_edit_track(self, key):
         self.active_edit_track = key
         self.update_curve_ui()
-        path = self.tracks[key].current_filepath
-        if path:
-            state = self.clip_loops.get(path, True)
+        if self.slot[key]['path']:
+            state = self.slot[key]['loop']
             self.chk_loop_track.blockSignals(True); self.chk_loop_track.setChecked(state); self.chk_loop_track.blockSignals(False)
 
     def toggle_loop_current_track(self, state):
-        t = self.tracks[self.active_edit_track]; t.set_loop_mode(state)
-        if t.current_filepath: self.clip_loops[t.current_filepath] = state
+        sl = self.slot[self.active_edit_track]; self.tracks[self.active_edit_track].set_loop_mode(state); sl['loop'] = state
+        if sl['path']: self.clip_loops[sl['path']] = state
 
     def load_track(self, key, path):
-        self.bank_data[self.current_bank][key] = path
-        self.buttons[key].set_loading()
-        w = AudioAnalysisWorker(key, path, 200, 120, self.buttons[key].base_color.name(), self.current_generation)
-        w.finished.connect(self.prep_done); self.active_workers.append(w); w.start()
-        t = self.tracks[key]; t.load_video(path)
-        loop_state = self.clip_loops.get(path, True); t.set_loop_mode(loop_state)
+        old = self.bank_data[self.current_bank].get(key); self.bank_data[self.current_bank][key] = path
+        if old and old != path and not any(old in slots.values() for slots in self.bank_data.values()): # No bank uses it any more
+            for b in self.buttons.values(): self._waveform_cache.pop((old, b.base_color.name()), None)
+        sl = self.slot[key]; loop_state = self.clip_loops.get(path, True)
+        sl.update(path=path, bpm=self.clip_meta.get(path, 120.0), loop=loop_state, curve=self.clip_curves.get(path) or {}, wav=None)
+        t = self.tracks[key]; t.load_video(path); t.set_loop_mode(loop_state); self.track_items[key].setVisible(not self.mute_states[key])
         if key == self.active_edit_track:
             self.chk_loop_track.blockSignals(True); self.chk_loop_track.setChecked(loop_state); self.chk_loop_track.blockSignals(False)
-        t.play(); self.update_curve_ui()
+        color = self.buttons[key].base_color.name() # The waveform pixmap is tinted per pad
+        if (cached := self._waveform_cache.get((path, color))): self.prep_done(key, *cached) # Seen on this pad before (any bank): no re-analysis
+        else:
+            self.buttons[key].set_loading()
+            w = AudioAnalysisWorker(key, path, 200, 120, color, self.current_generation)
+            w.finished.connect(lambda *res, p=path, c=color, g=self.current_generation: self._analysis_done(p, c, g, *res)); self.active_workers.append(w); w.start()
+        t.play(); self.update_curve_ui(); self._rebuild_step_table(key)
+
+    def _analysis_done(self, path, color, gen, key, *res):
+        # Failed analyses (no wav) are retried next time. No PCM kept: nothing in this app reads raw_samples back
+        if res[-1]: pix, bpm, dur, _, rate, wav = res; self._waveform_cache[(path, color)] = (pix, bpm, dur, None, rate, wav)
+        if gen == self.current_generation and self.slot[key]['path'] == path: self.prep_done(key, *res) # Drop results for a bank/slot we've left
 
     def set_track_volume(self, key, val):
         if not self.mute_states[key]: self.tracks[key].set_volume(val / 100.0)
@@ -668,14 +796,15 @@ class LooperApp(QMainWindow):
         self.mute_states[key] = muted
         self.mute_buttons[key].blockSignals(True); self.mute_buttons[key].setChecked(muted); self.mute_buttons[key].blockSignals(False)
         self.tracks[key].set_volume(0 if muted else self.faders[key].value() / 100.0)
+        self.track_items[key].setVisible(not muted and self.tracks[key].has_media()) # Hidden tiles aren't painted or uploaded
 
     def prep_done(self, key, pix, bpm, dur, raw, rate, wav):
-        path = self.bank_data[self.current_bank].get(key)
+        sl = self.slot[key]; path = sl['path']
         if path:
-            self.clip_meta[path] = bpm
+            self.clip_meta[path] = sl['bpm'] = bpm; sl['wav'] = wav
             self.tracks[key].set_audio_data(raw, rate)
             self.tracks[key].load_base_audio(wav)
-        self.buttons[key].set_data(pix, bpm, dur)
+        self.buttons[key].set_data(pix, bpm, dur); self._dur_inv[key] = 1.0 / dur if dur > 0 else 0.0; self._rebuild_step_table(key)
 
     def switch_bank(self, i):
         self.current_bank = i; self.current_generation += 1
@@ -685,110 +814,198 @@ class LooperApp(QMainWindow):
             self.buttons[k].filename = "[Empty]"; self.buttons[k].update()
             p = self.bank_data[i].get(k)
             if p: self.load_track(k, p)
+            else:
+                sl = self.slot[k] # Deck keeps its previous clip; re-read its settings in case a set load replaced them
+                if sl['path']: sl.update(curve=self.clip_curves.get(sl['path']) or {}, loop=self.clip_loops.get(sl['path'], True))
+                self._rebuild_step_table(k)
 
     def get_target_deck_info(self): t = self.tracks[self.active_edit_track]; return (t, t.current_filepath)
 
+    def _rebuild_step_table(self, key):
+        sl = self.slot[key]; curve = sl['curve']; dur = self.tracks[key].duration()
+        sl['step_tbl'] = {step: int(pos * dur) for step, pos in curve.items()} if curve and dur > 0 else {}
+
     def run_sequencer_step(self):
         ls = self.piano_roll.loop_start; ll = self.piano_roll.loop_length
         self.current_step = ls + ((self.current_step + 1 - ls) % ll)
-        self.piano_roll.current_step = self.current_step; self.piano_roll.update()
-        for k in ['a','s','d','f']:
-            t = self.tracks[k]; path = t.current_filepath
-            if path and path in self.clip_curves and self.current_step in self.clip_curves[path]:
-                t.trigger(int(self.clip_curves[path][self.current_step] * t.duration()))
+        self.piano_roll.set_current_step(self.current_step)
+        step = self.current_step
+        for k, sl in self.slot.items():
+            if (ms := sl['step_tbl'].get(step)) is not None: self.tracks[k].trigger(ms)
 
+    def _on_media(self, k, status): self._deck_state[k] = (status != QMediaPlayer.MediaStatus.NoMedia, self._deck_state[k][1])
+    def _on_play_state(self, k, state): self._deck_state[k] = (self._deck_state[k][0], state == QMediaPlayer.PlaybackState.PlayingState)
     def toggle_play_state(self):
-        for t in self.tracks.values(): t.play() if t.has_media() and t.playbackState()!=QMediaPlayer.PlaybackState.PlayingState else t.pause()
+        for k, (has_media, playing) in self._deck_state.items():
+            if has_media: self.tracks[k].pause() if playing else self.tracks[k].play()
 
     def update_mixer(self): pass
     def change_main_output(self, i): d = self.audio_devices[i]; [t.set_main_output(d) for t in self.tracks.values()]
     def change_cue_output(self, i): d = self.audio_devices[i]; [t.set_cue_output(d) for t in self.tracks.values()]
 
-    def sync_deck(self, deck, key):
-        path = deck.current_filepath; cb = self.clip_meta.get(path, 120.0) if path else 120.0
-        rate = self.master_bpm / cb if cb > 0 else 1.0; deck.setPlaybackRate(rate)
-        if deck.base_wav_path: w = RubberBandWorker(key, deck.base_wav_path, rate); w.finished.connect(lambda k,p,r: deck.swap_audio(p,False)); self.active_workers.append(w); w.start()
+    def sync_deck(self, deck, key, batch=None):
+        sl = self.slot[key]; cb = sl['bpm'] if sl['path'] else 120.0; wav = sl['wav']
+        rate = self.master_bpm / cb if cb > 0 else 1.0
+        if abs(rate - deck.playback_rate) >= 1e-3: deck.setPlaybackRate(rate) # A rate change flushes the decoder on some backends: only when it moves
+        elif deck.audio_stretched: return # Already at this rate with its render in place
+        if not wav or abs(rate - 1.0) < 0.002: return # Near 1.0x the player rate alone is inaudible; no render
+        rb_key = (wav, round(rate, 3))
+        if (cached := self._rb_cache.get(rb_key)) and os.path.exists(cached): deck.swap_audio(cached, False); return
+        item = (key, wav, rate)
+        if batch is None: self._start_stretch([item])
+        else: batch.append(item)
+
+    def sync_all_decks(self):
+        batch = []
+        for k in self.tracks: self.sync_deck(self.tracks[k], k, batch)
+        if batch: self._start_stretch(batch)
+
+    def _start_stretch(self, items):
+        w = BatchRubberBandWorker(items); w.item_done.connect(self._stretch_done); self.active_workers.append(w); w.start()
+
+    def _stretch_done(self, key, wav, path, rate):
+        rb_key = (wav, round(rate, 3)); self._rb_cache[rb_key] = path; deck = self.tracks[key]
+        if (deck.base_wav_path, round(deck.playback_rate, 3)) == rb_key: deck.swap_audio(path, False) # Skip renders for a rate we've since left
+
+    def _apply_sync_all(self):
+        if self.btn_vid_sync.isChecked(): self.sync_all_decks()
 
     def toggle_vid_sync(self):
         on = self.btn_vid_sync.isChecked(); self.btn_vid_sync.setText(f"SYNC: {'ON' if on else 'OFF'}")
-        if on: [self.sync_deck(self.tracks[k], k) for k in self.tracks]
-        else: [t.setPlaybackRate(1.0) for t in self.tracks.values()]
+        if on: self.sync_all_decks()
+        else: [t.setPlaybackRate(1.0) for t in self.tracks.values() if t.playback_rate != 1.0 or t.audio_stretched or t.rate_trim]
 
-    def auto_align_phase(self):
+    def auto_align_phase(self, hard=False):
         if self.master_bpm <= 0: return
-        beat_ms = 60000.0/self.master_bpm; phase = (time.time() - self.transport_start_time)*1000 % beat_ms
+        now = time.monotonic_ns(); beat_ns = self._beat_ns; phase = (now - self._transport_start_ns) % beat_ns
         for t in self.tracks.values():
-            if t.has_media(): diff = phase - (t.position() % beat_ms); t.seek(max(0, int(t.position() + (diff + beat_ms if diff < -beat_ms/2 else diff - beat_ms if diff > beat_ms/2 else diff))))
+            if not t.has_media(): continue
+            if not hard and now - t._jump_ns < beat_ns: # Just triggered/seeked off the grid on purpose: don't drag it back
+                if t.rate_trim: t.trim_rate(0.0)
+                continue
+            pos = t.position(); diff = phase - (pos * 1_000_000) % beat_ns # Integer mod: exact at any BPM
+            err = (diff + beat_ns if diff < -beat_ns // 2 else diff - beat_ns if diff > beat_ns // 2 else diff) / 1_000_000
+            if hard: t.seek(max(0, int(pos + err))) # ALIGN button only; the timer path never jumps playback
+            else: self._sync_correction(t, err, beat_ns / 1_000_000)
+    def _sync_correction(self, deck, err_ms, beat_ms):
+        # Cubic, sign-preserving: strong pull when far off, fades out near zero so it doesn't overshoot.
+        # |e| <= 0.5 after wrapping; gain 3.2 hits the 5% clamp at a quarter beat off
+        e = err_ms / beat_ms; trim = max(-0.05, min(0.05, e * e * e * 3.2))
+        if abs(trim - deck.rate_trim) > 1e-4: deck.trim_rate(trim)
 
     def set_loop_length(self, length): self.piano_roll.set_loop_window(self.piano_roll.loop_start, length)
     def nudge_bpm(self, amount):
         if QApplication.keyboardModifiers() & Qt.KeyboardModifier.ShiftModifier: amount *= 10
         self.master_bpm = round(max(10.0, self.master_bpm + amount), 1); self.bpm_lbl.setText(f"{self.master_bpm} BPM")
-        if self.btn_vid_sync.isChecked(): [self.sync_deck(self.tracks[k], k) for k in self.tracks]
+        self._sync_timer.start() # Restarted by each nudge: one re-sync once the clicks stop
         self.update_clock()
-    def update_curve_ui(self): _, path = self.get_target_deck_info(); self.piano_roll.set_data(self.clip_curves.get(path, {}))
-    def save_curve_data(self): _, path = self.get_target_deck_info(); self.clip_curves[path] = self.piano_roll.get_data() if path else None
-    def toggle_sequencer(self): self.seq_running = not self.seq_running; self.btn_run.setChecked(self.seq_running); self.update_clock() if self.seq_running else self.seq_timer.stop()
+    def update_curve_ui(self): self.piano_roll.set_data(self.slot[self.active_edit_track]['curve'])
+    def save_curve_data(self):
+        path = self.slot[self.active_edit_track]['path']
+        if not path: return
+        self.clip_curves[path] = curve = self.piano_roll.get_data()
+        for k, sl in self.slot.items():
+            if sl['path'] == path: sl['curve'] = curve; self._rebuild_step_table(k) # Same clip may sit on several tracks
+    def toggle_sequencer(self):
+        self.seq_running = not self.seq_running; self.btn_run.setChecked(self.seq_running)
+        if self.seq_running: self.update_clock(); self._seq_anchor = time.monotonic_ns(); self._seq_index = 0; self.seq_timer.start(0)
+        else: self.seq_timer.stop()
+    def _tick(self):
+        if not self.seq_running: return
+        self.run_sequencer_step(); self._seq_index += 1
+        # Schedule against the absolute grid: ms truncation of each delay never accumulates
+        late = time.monotonic_ns() - (self._seq_anchor + self._seq_index * self._step_ns)
+        if late > self._step_ns: self._seq_anchor += late # Stalled (e.g. modal dialog): resume from now rather than burst
+        self.seq_timer.start(max(0, (self._seq_anchor + self._seq_index * self._step_ns - time.monotonic_ns()) // 1_000_000))
     def update_clock(self):
-        if self.master_bpm > 0: self.seq_timer.setInterval(int(((60000.0 / self.master_bpm) / 4) / self.seq_multiplier)); 
-        if self.seq_running and not self.seq_timer.isActive(): self.seq_timer.start()
+        if self.master_bpm <= 0: return
+        self._beat_ns = int(60_000_000_000 / self.master_bpm); self._tick_ns = self._beat_ns // 24
+        step_ns = int(6 / self.seq_multiplier) * self._tick_ns # 1/16 = 6 ticks; 1/2x and 2x are 12 and 3
+        if self.seq_running and self._seq_index > 0:
+            # Re-base on the last fired step so the new tempo applies from there without a phase jump
+            self._seq_anchor += (self._seq_index - 1) * self._step_ns; self._seq_index = 1
+            self.seq_timer.start(max(0, (self._seq_anchor + step_ns - time.monotonic_ns()) // 1_000_000))
+        self._step_ns = step_ns
     def change_seq_speed(self, i): self.seq_multiplier = [0.5, 1.0, 2.0][i]; self.update_clock()
     def handle_tap_tempo(self):
-        now = time.time(); self.tap_times.append(now)
-        if len(self.tap_times)>4: self.tap_times.pop(0)
-        if len(self.tap_times)>1:
-            avg = sum([self.tap_times[i+1]-self.tap_times[i] for i in range(len(self.tap_times)-1)]) / (len(self.tap_times)-1)
-            self.master_bpm = round(60.0/avg, 1); self.bpm_lbl.setText(f"{self.master_bpm} BPM")
-            if self.btn_vid_sync.isChecked(): [self.sync_deck(self.tracks[k], k) for k in self.tracks]
+        self._taps[self._tap_i % 4] = time.monotonic_ns(); self._tap_i += 1; self._tap_n = min(self._tap_n + 1, 4) # Wall-clock jumps (NTP, DST) can't skew a tap
+        if self._tap_n > 1:
+            self.master_bpm = float(_tap_bpm(self._taps, self._tap_n, self._tap_i)); self.bpm_lbl.setText(f"{self.master_bpm} BPM")
+            if self.btn_vid_sync.isChecked(): self.sync_all_decks()
             self.update_clock()
             
     def open_hotkey_editor(self):
         editor = HotkeyEditor(self.key_bindings, self)
-        if editor.exec() == QDialog.DialogCode.Accepted: self.key_bindings = editor.get_bindings()
-    def open_midi_editor(self): editor = MidiConfigDialog(self.midi_worker, self.midi_map, self); editor.exec()
+        if editor.exec() == QDialog.DialogCode.Accepted: self.key_bindings = editor.get_bindings(); self._build_key_dispatch()
+    def open_midi_editor(self): editor = MidiConfigDialog(self.midi_worker, self.midi_map, self); editor.exec(); self._rebuild_midi_index()
+    def _rebuild_midi_index(self):
+        # (msg type, control/note) -> actions bound to it, so a message costs one hash lookup instead of a map scan
+        self._midi_index = {}
+        for action, b in self.midi_map.items():
+            if b: self._midi_index.setdefault((b['type'], b['val']), []).append(action)
+        self._midi_handlers = {"PLAY_PAUSE": self.toggle_play_state, "TOGGLE_SEQUENCER": self.toggle_sequencer, "TAP_TEMPO": self.handle_tap_tempo}
+        for k in KEY_MAP: self._midi_handlers[f"TRIGGER_{k.upper()}"] = lambda k=k: self.trigger_track(k)
+    def trigger_track(self, k): self.select_track_for_edit(k); self.tracks[k].seek(0); self.tracks[k].play()
+    def _drain_midi(self):
+        q = self.midi_worker.queue
+        if not q: return
+        batch = []; cc_slot = {}; seg = 0
+        for _ in range(min(len(q), 256)):
+            msg = q.popleft()
+            if msg.type == 'control_change':
+                ck = (seg, msg.channel, msg.control) # Same CC number on another channel is a different control
+                if (i := cc_slot.get(ck)) is not None: batch[i] = msg; continue # Fader sweep: only the newest value per CC matters
+                cc_slot[ck] = len(batch)
+            else: seg += 1 # A CC after a note can't merge into (and jump ahead of) a slot before it
+            batch.append(msg)
+        for msg in batch: self.midi_worker.message_received.emit(msg) # Same thread, so direct calls (app + any MIDI learn dialog)
+
     def handle_midi_message(self, msg):
-        for action, binding in self.midi_map.items():
-            if not binding: continue
-            if (msg.type == binding['type'] and (msg.control if msg.type == 'control_change' else msg.note) == binding['val']):
-                if action.startswith("FADER_"): self.faders[action.split("_")[1].lower()].setValue(int((msg.value / 127.0) * 100))
-                elif action == "PLAY_PAUSE" and msg.type == 'note_on' and msg.velocity > 0: self.toggle_play_state()
-                elif action == "TOGGLE_SEQUENCER" and msg.type == 'note_on' and msg.velocity > 0: self.toggle_sequencer()
-                elif action == "TAP_TEMPO" and msg.type == 'note_on' and msg.velocity > 0: self.handle_tap_tempo()
-                elif action.startswith("TRIGGER_") and msg.type == 'note_on' and msg.velocity > 0:
-                    k = action.split("_")[1].lower(); self.select_track_for_edit(k); self.tracks[k].seek(0); self.tracks[k].play()
-
-    def on_deck_a_pos(self, p): self.buttons['a'].update_playhead(p/self.tracks['a'].duration())
-    def on_deck_b_pos(self, p): self.buttons['b'].update_playhead(p/self.tracks['b'].duration()) 
+        actions = self._midi_index.get((msg.type, msg.control if msg.type == 'control_change' else getattr(msg, 'note', None)))
+        if not actions: return
+        for action in actions:
+            if action.startswith("FADER_"): self.faders[action[-1].lower()].setValue(int((msg.value / 127.0) * 100))
+            elif msg.type == 'note_on' and msg.velocity > 0 and (fn := self._midi_handlers.get(action)): fn()
+
+    def _pos(self, k, p):
+        self._pending_pos[k] = min(1.0, p * self._dur_inv[k])
+        if not self._pos_timer.isActive(): self._pos_timer.start()
+    def _flush_playheads(self):
+        for k, frac in self._pending_pos.items(): self.buttons[k].update_playhead(frac)
+        self._pending_pos.clear()
     
+    def run_set_task(self, task):
+        task.signals.failed.connect(lambda err: QMessageBox.warning(self, "Set File", err))
+        task.signals.done.connect(lambda: self.active_workers.remove(task)) # Queued behind loaded/failed
+        self.active_workers.append(task); QThreadPool.globalInstance().start(task)
     def load_set(self):
         f, _ = QFileDialog.getOpenFileName(self, "Load", "", "JSON (*.json)")
-        if f: 
-            d=json.load(open(f,'r')); self.bank_data=d['banks']
-            self.key_bindings={k:int(v) for k,v in d.get('keys',self.key_bindings).items()}
-            self.midi_map=d.get('midi',self.midi_map)
-            self.clip_curves={path:{int(k):v for k,v in points.items()} for path,points in d.get('curves',{}).items()}
-            self.clip_loops=d.get('loops', {})
-            self.switch_bank(0)
+        if f: task = SetFileTask(f); task.signals.loaded.connect(self.apply_set); self.run_set_task(task)
+    def apply_set(self, d):
+        # Parsed off-thread; hydrate on the GUI thread. JSON object keys come back as strings
+        self.bank_data={int(b):slots for b,slots in d['banks'].items()}
+        self.key_bindings={k:int(v) for k,v in d.get('keys',self.key_bindings).items()}; self._build_key_dispatch()
+        self.midi_map=d.get('midi',self.midi_map); self._rebuild_midi_index()
+        self.clip_curves={path:{int(k):v for k,v in points.items()} for path,points in d.get('curves',{}).items() if points}
+        self.clip_loops=d.get('loops', {})
+        self.switch_bank(0)
     def save_set(self):
         f, _ = QFileDialog.getSaveFileName(self, "Save", "", "JSON (*.json)")
-        if f: json.dump({'banks':self.bank_data, 'curves':self.clip_curves, 'keys':self.key_bindings, 'midi':self.midi_map, 'loops':self.clip_loops}, open(f,'w'))
-
-    def eventFilter(self, src, e):
-        if e.type() == QEvent.Type.KeyPress and not e.isAutoRepeat():
-            k = e.key(); keys = self.key_bindings
-            if k == keys.get("MUTE_A"): self.toggle_track_mute('a', not self.mute_states['a']); return True
-            if k == keys.get("MUTE_S"): self.toggle_track_mute('s', not self.mute_states['s']); return True
-            if k == keys.get("MUTE_D"): self.toggle_track_mute('d', not self.mute_states['d']); return True
-            if k == keys.get("MUTE_F"): self.toggle_track_mute('f', not self.mute_states['f']); return True
-            if k == Qt.Key.Key_Left or k == Qt.Key.Key_Right:
-                if self.piano_roll.hasFocus() and self.piano_roll.selection: return False 
-            if k == keys["PLAY_PAUSE"]: self.toggle_play_state(); return True
-            if k == keys["TOGGLE_SEQUENCER"]: self.toggle_sequencer(); return True
-            if k == keys["TAP_TEMPO"]: self.handle_tap_tempo(); return True
-            if k == keys["BANK_1"]: self.switch_bank(0); return True
-            if k == keys["BANK_2"]: self.switch_bank(1); return True
-            if k == keys["BANK_3"]: self.switch_bank(2); return True
-        return super().eventFilter(src, e)
+        if not f: return
+        # Snapshot on the GUI thread so the writer never sees these mid-edit
+        payload = {'banks':{b:dict(slots) for b,slots in self.bank_data.items()}, 'curves':{p:dict(c) for p,c in self.clip_curves.items() if c},
+                   'keys':{k:int(v) for k,v in self.key_bindings.items()}, 'midi':dict(self.midi_map), 'loops':dict(self.clip_loops)}
+        self.run_set_task(SetFileTask(f, payload))
+
+    def _build_key_dispatch(self):
+        # key code -> handler; earlier entries win if two actions share a key (same priority as the old if-chain)
+        keys = self.key_bindings; self._keydispatch = {}
+        actions = [(f"MUTE_{k.upper()}", lambda k=k: self.toggle_track_mute(k, not self.mute_states[k])) for k in ('a', 's', 'd', 'f')]
+        actions += [("PLAY_PAUSE", self.toggle_play_state), ("TOGGLE_SEQUENCER", self.toggle_sequencer), ("TAP_TEMPO", self.handle_tap_tempo),
+                    ("BANK_1", lambda: self.switch_bank(0)), ("BANK_2", lambda: self.switch_bank(1)), ("BANK_3", lambda: self.switch_bank(2))]
+        for action, fn in actions:
+            if keys.get(action) is not None: self._keydispatch.setdefault(int(keys[action]), fn)
+        self._kf.set_dispatch(self._keydispatch)
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
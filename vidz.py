@@ -1,9 +1,15 @@
 import sys
 import os
 import time
+import wave
 import json
+import hashlib
+import shutil
+import subprocess
+import multiprocessing
 import numpy as np
-import gc # Garbage Collector
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from pydub import AudioSegment
 
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QGridLayout, 
@@ -11,9 +17,9 @@ from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QGridLayout,
                              QFileDialog, QHBoxLayout, QProgressBar)
 from PyQt6.QtMultimedia import QMediaPlayer, QAudioOutput
 from PyQt6.QtMultimediaWidgets import QGraphicsVideoItem
-from PyQt6.QtCore import QUrl, Qt, QTimer, QEvent, QThread, pyqtSignal, QRectF
-from PyQt6.QtGui import QPainter, QColor, QPen, QPixmap
-from PyQt6.QtWidgets import QGraphicsView, QGraphicsScene, QGraphicsRectItem
+from PyQt6.QtCore import QUrl, Qt, QTimer, QEvent, pyqtSignal, QRect, QRectF, QLineF
+from PyQt6.QtGui import QPainter, QColor, QPen, QBrush, QPixmap, QImage
+from PyQt6.QtWidgets import QGraphicsView, QGraphicsScene
 
 # --- PRO STYLING ---
 DARK_THEME = """
@@ -38,52 +44,102 @@ KEY_MAP = {
 }
 
 DEFAULT_LOOP_SPEED = 500
-
-# --- BACKGROUND WORKER (Waveforms) ---
-class WaveformWorker(QThread):
-    finished = pyqtSignal(str, QPixmap) 
-    def __init__(self, key, filepath, width, height, color_hex):
-        super().__init__()
-        self.key, self.filepath, self.width, self.height = key, filepath, width, height
-        self.bg_color = QColor(color_hex)
-
-    def run(self):
-        try:
-            # SAFETY: Only read the first 60 seconds to prevent RAM explosion on long files
-            audio = AudioSegment.from_file(self.filepath)
-            if len(audio) > 60000: 
-                audio = audio[:60000] 
-
-            audio = audio.set_channels(1).set_frame_rate(50)
-            samples = np.array(audio.get_array_of_samples())
-            
-            pixmap = QPixmap(self.width, self.height)
-            pixmap.fill(Qt.GlobalColor.transparent)
-            
-            painter = QPainter(pixmap)
-            painter.setRenderHint(QPainter.RenderHint.Antialiasing)
-            pen_color = self.bg_color.darker(150)
-            painter.setPen(QPen(pen_color, 1))
-            
-            if len(samples) > 0:
-                step = len(samples) / self.width
-                center_y = self.height / 2
-                max_val = np.max(np.abs(samples)) or 1
-                for x in range(self.width):
-                    chunk = samples[int(x*step):int((x+1)*step)]
-                    if len(chunk) > 0:
-                        h = (np.max(np.abs(chunk)) / max_val) * (self.height * 0.9)
-                        painter.drawLine(x, int(center_y - h/2), x, int(center_y + h/2))
-            painter.end()
-            self.finished.emit(self.key, pixmap)
-            
-            # Help Python clear memory
-            del audio
-            del samples
-            gc.collect()
-            
-        except Exception as e:
-            print(f"Waveform Error: {e}")
+WAVEFORM_SECONDS = 60
+WAVEFORM_RATE = 4000 # ffmpeg low-passes when it resamples, so leave enough bandwidth for real peaks
+ENVELOPE_BLOCK = 40 # Samples per streamed peak: 10 ms at WAVEFORM_RATE, still ~30 peaks per pixel column for 60 s
+WAVEFORM_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "vidsynth", "waveforms")
+
+def _waveform_cache_path(key_tuple):
+    """ PNG path for a (filepath, mtime, size, width, height, color) tuple. """
+    digest = hashlib.blake2b(repr(key_tuple).encode("utf-8"), digest_size=16).hexdigest()
+    return os.path.join(WAVEFORM_CACHE_DIR, f"{digest}.png")
+
+# --- WAVEFORM DECODE (runs in the decode process pool; plain functions so they pickle) ---
+def _read_wav(filepath):
+    """ 16-bit PCM WAV straight into NumPy; None if the stdlib reader can't handle it. """
+    try:
+        with wave.open(filepath, 'rb') as wf:
+            if wf.getsampwidth() != 2: return None
+            n = min(wf.getnframes(), wf.getframerate() * WAVEFORM_SECONDS)
+            samples = np.frombuffer(wf.readframes(n), dtype=np.int16)
+            channels = wf.getnchannels()
+        if channels > 1: samples = samples[:len(samples) // channels * channels].reshape(-1, channels).mean(axis=1, dtype=np.float32)
+        return samples
+    except (wave.Error, EOFError): return None
+
+def _stream_peaks(cmd):
+    """ Read ffmpeg's float PCM through one reused buffer, keeping only a peak per ENVELOPE_BLOCK. """
+    block_bytes = ENVELOPE_BLOCK * 4
+    buf = np.empty(ENVELOPE_BLOCK * 1024, dtype=np.float32)
+    view = memoryview(buf).cast('B')
+    peaks = []
+    fill = 0
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE)
+    try:
+        while True:
+            n = proc.stdout.readinto(view[fill:])
+            if not n: break
+            fill += n
+            whole = fill // block_bytes * ENVELOPE_BLOCK
+            if whole:
+                peaks.append(np.abs(buf[:whole]).reshape(-1, ENVELOPE_BLOCK).max(axis=1))
+                rest = fill - whole * 4 # Partial block carries over to the front
+                view[:rest] = view[whole * 4:fill]
+                fill = rest
+        if fill >= 4: peaks.append(np.abs(buf[:fill // 4]).max(keepdims=True))
+    finally:
+        proc.stdout.close()
+        proc.wait()
+    if proc.returncode != 0 and not peaks: raise subprocess.CalledProcessError(proc.returncode, cmd)
+    return np.concatenate(peaks) if peaks else np.empty(0, dtype=np.float32)
+
+def _decode_samples(filepath):
+    # Fast path: plain WAV needs no subprocess at all
+    if filepath.lower().endswith('.wav'):
+        samples = _read_wav(filepath)
+        if samples is not None: return samples
+
+    if shutil.which("ffmpeg"):
+        # SAFETY: ffmpeg stops decoding at 60 seconds and hands back mono floats, no full-file load
+        cmd = ['ffmpeg', '-v', 'quiet', '-ss', '0', '-t', str(WAVEFORM_SECONDS), '-i', filepath,
+               '-f', 'f32le', '-ac', '1', '-ar', str(WAVEFORM_RATE), 'pipe:1']
+        return _stream_peaks(cmd)
+
+    # Fallback: pydub (decodes the whole file, then trims)
+    audio = AudioSegment.from_file(filepath)
+    if len(audio) > WAVEFORM_SECONDS * 1000: 
+        audio = audio[:WAVEFORM_SECONDS * 1000] 
+    audio = audio.set_channels(1).set_frame_rate(50)
+    dtype = {1: np.int8, 2: np.int16, 4: np.int32}.get(audio.sample_width)
+    if dtype is None: return np.array(audio.get_array_of_samples())
+    return np.frombuffer(audio.raw_data, dtype=dtype) # View of pydub's bytes, no per-element copy
+
+def _decode_heights(filepath, width):
+    """ Per-column peaks (0..1) for the start of a clip; None if it couldn't be decoded. """
+    try:
+        samples = _decode_samples(filepath)
+        if len(samples) == 0: return np.empty(0, dtype=np.float32)
+        # One abs-max pass over a (columns, bin) view instead of a slice per pixel
+        step = max(1, len(samples) // width)
+        cols = min(width, len(samples) // step)
+        heights = np.abs(samples[:cols * step].astype(np.float32)).reshape(cols, step).max(axis=1)
+        return heights / (heights.max() or 1)
+    except Exception as e:
+        print(f"Waveform Error: {e}")
+        return None
+
+def _paint_waveform(heights, width, height, color_hex):
+    """ GUI side: a couple of hundred lines, cheap enough to draw where the pixmap will live. """
+    image = QImage(width, height, QImage.Format.Format_ARGB32_Premultiplied)
+    image.fill(Qt.GlobalColor.transparent)
+    painter = QPainter(image)
+    painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+    painter.setPen(QPen(QColor(color_hex).darker(150), 1))
+    center_y = height / 2
+    lines = [QLineF(x, center_y - h/2, x, center_y + h/2) for x, h in enumerate((heights * (height * 0.9)).tolist())]
+    painter.drawLines(lines) # One call into Qt for every column
+    painter.end()
+    return image
 
 # --- INTERACTIVE BUTTON ---
 class InteractiveWaveform(QLabel):
@@ -107,29 +163,53 @@ class InteractiveWaveform(QLabel):
         self.selection_start = 0
         self.selection_end = 0
         self.has_active_loop = False
+        self._base_pixmap = None # Waveform + key/filename text, rebuilt only when either changes
+        self._pending_update = False
+        self._painted_selection_end = 0
+
+        # Paint state built once, reused by every paint
+        self._selection_pen = QPen(QColor(0, 255, 255), 1)
+        self._selection_fill = QColor(0, 255, 255, 40)
+        self._playhead_pen = QPen(self.base_color, 2)
+        self._text_pen_black = QPen(QColor("black"))
+        self._text_pen_white = QPen(QColor("white"))
+        self._bold_font = None # Made on first paint, once the style sheet has set our font
+
+    def _rebuild_base(self):
+        dpr = self.devicePixelRatioF()
+        base = QPixmap(int(self.width() * dpr), int(self.height() * dpr))
+        base.setDevicePixelRatio(dpr)
+        base.fill(Qt.GlobalColor.transparent)
+        painter = QPainter(base)
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        if self.waveform_pixmap: painter.drawPixmap(0, 0, self.waveform_pixmap)
+        if self._bold_font is None:
+            self._bold_font = self.font()
+            self._bold_font.setBold(True)
+            self._bold_font.setPointSize(12)
+        painter.setPen(self._text_pen_black)
+        painter.setFont(self._bold_font)
+        rect = self.rect()
+        painter.drawText(rect.adjusted(1,1,1,1), Qt.AlignmentFlag.AlignCenter, f"KEY: {self.key_char.upper()}\n{self.filename}")
+        painter.setPen(self._text_pen_white)
+        painter.drawText(rect, Qt.AlignmentFlag.AlignCenter, f"KEY: {self.key_char.upper()}\n{self.filename}")
+        painter.end()
+        self._base_pixmap = base
 
     def paintEvent(self, event):
+        if self._base_pixmap is None: self._rebuild_base()
         painter = QPainter(self)
         painter.setRenderHint(QPainter.RenderHint.Antialiasing)
-        if self.waveform_pixmap: painter.drawPixmap(0, 0, self.waveform_pixmap)
+        painter.drawPixmap(0, 0, self._base_pixmap)
         if self.has_active_loop or self.is_selecting:
             x = min(self.selection_start, self.selection_end)
             w = abs(self.selection_end - self.selection_start)
-            painter.fillRect(QRectF(x, 0, w, self.height()), QColor(0, 255, 255, 40)) 
-            painter.setPen(QPen(QColor(0, 255, 255), 1))
+            painter.fillRect(QRectF(x, 0, w, self.height()), self._selection_fill) 
+            painter.setPen(self._selection_pen)
             painter.drawRect(QRectF(x, 0, w, self.height()))
         if self.filename != "[Empty]":
-            painter.setPen(QPen(self.base_color, 2))
+            painter.setPen(self._playhead_pen)
             painter.drawLine(int(self.playhead_x), 0, int(self.playhead_x), self.height())
-        painter.setPen(QColor("black"))
-        font = painter.font()
-        font.setBold(True)
-        font.setPointSize(12)
-        painter.setFont(font)
-        rect = self.rect()
-        painter.drawText(rect.adjusted(1,1,1,1), Qt.AlignmentFlag.AlignCenter, f"KEY: {self.key_char.upper()}\n{self.filename}")
-        painter.setPen(QColor("white"))
-        painter.drawText(rect, Qt.AlignmentFlag.AlignCenter, f"KEY: {self.key_char.upper()}\n{self.filename}")
         painter.end()
 
     def mousePressEvent(self, event):
@@ -137,6 +217,7 @@ class InteractiveWaveform(QLabel):
             self.is_selecting = True
             self.selection_start = event.pos().x()
             self.selection_end = event.pos().x()
+            self._painted_selection_end = self.selection_end
             self.has_active_loop = False
             self.update()
         elif event.button() == Qt.MouseButton.RightButton:
@@ -145,7 +226,18 @@ class InteractiveWaveform(QLabel):
     def mouseMoveEvent(self, event):
         if self.is_selecting:
             self.selection_end = max(0, min(event.pos().x(), self.width()))
-            self.update()
+            # Drag events outpace the screen: repaint at most every 16 ms
+            if not self._pending_update:
+                self._pending_update = True
+                QTimer.singleShot(16, self._do_update)
+
+    def _do_update(self):
+        self._pending_update = False
+        # Only the span between where the edge was last painted and where it is now changes
+        left = min(self._painted_selection_end, self.selection_end)
+        right = max(self._painted_selection_end, self.selection_end)
+        self._painted_selection_end = self.selection_end
+        self.update(QRect(left - 2, 0, right - left + 4, self.height()))
 
     def mouseReleaseEvent(self, event):
         if event.button() == Qt.MouseButton.LeftButton and self.is_selecting:
@@ -172,14 +264,36 @@ class InteractiveWaveform(QLabel):
 
     def set_waveform(self, pixmap):
         self.waveform_pixmap = pixmap
+        self._rebuild_base()
         self.update()
 
-    def update_playhead(self, ratio):
-        self.playhead_x = int(ratio * self.width())
+    def set_filename(self, filename):
+        if filename == self.filename: return
+        self.filename = filename
+        self._rebuild_base()
         self.update()
 
+    def update_playhead(self, ratio):
+        new_x = int(ratio * self.width())
+        old_x = self.playhead_x
+        if new_x == old_x: return # Same pixel column, nothing to repaint
+        self.playhead_x = new_x
+        # Only the strips under the old and new line; paintEvent is clipped to them
+        self.update(QRect(old_x - 2, 0, 4, self.height()))
+        self.update(QRect(new_x - 2, 0, 4, self.height()))
+
 
 # --- GRAPHICS VIEW PROJECTOR ---
+class ProjectorView(QGraphicsView):
+    """ Paints the effect tint over the scene itself, so toggling it touches no scene item. """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.overlay_brush = None
+
+    def drawForeground(self, painter, rect):
+        if self.overlay_brush is not None: painter.fillRect(rect, self.overlay_brush)
+
+
 class ProjectorWindow(QWidget):
     def __init__(self):
         super().__init__()
@@ -187,7 +301,7 @@ class ProjectorWindow(QWidget):
         self.resize(800, 600)
         self.setStyleSheet("background-color: black;")
         
-        self.view = QGraphicsView(self)
+        self.view = ProjectorView(self)
         self.view.setStyleSheet("background: black; border: none;")
         self.view.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
         self.view.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
@@ -200,18 +314,18 @@ class ProjectorWindow(QWidget):
         layout.addWidget(self.view)
         layout.setContentsMargins(0, 0, 0, 0)
         self.setLayout(layout)
-        
-        self.overlay_item = QGraphicsRectItem()
-        self.overlay_item.setBrush(QColor(0, 0, 0, 0)) 
-        self.overlay_item.setPen(QPen(Qt.PenStyle.NoPen)) 
-        self.overlay_item.setZValue(100) 
-        self.scene.addItem(self.overlay_item)
+
+        # Built once; effects just swap which brush the overlay holds
+        self._brushes = {
+            "INVERT": QBrush(QColor(255, 255, 255, 220)),
+            "RED": QBrush(QColor(255, 0, 0, 100)),
+            "BLUR": QBrush(QColor(0, 0, 0, 180)),
+        }
         
     def resizeEvent(self, event):
         w, h = self.width(), self.height()
         self.scene.setSceneRect(0, 0, w, h)
         self.view.resize(w, h)
-        self.overlay_item.setRect(0, 0, w, h)
         super().resizeEvent(event)
 
     def closeEvent(self, event):
@@ -219,24 +333,29 @@ class ProjectorWindow(QWidget):
         self.hide()
 
     def apply_effect(self, effect_type):
-        if effect_type == "INVERT": 
-            self.overlay_item.setBrush(QColor(255, 255, 255, 220))
-        elif effect_type == "RED": 
-            self.overlay_item.setBrush(QColor(255, 0, 0, 100))
-        elif effect_type == "BLUR": 
-            self.overlay_item.setBrush(QColor(0, 0, 0, 180))
+        if effect_type in self._brushes: 
+            self.view.overlay_brush = self._brushes[effect_type]
+            self.view.viewport().update()
 
     def clear_effects(self):
-        self.overlay_item.setBrush(QColor(0, 0, 0, 0)) 
+        self.view.overlay_brush = None # No brush at all: the foreground pass paints nothing
+        self.view.viewport().update()
 
 
 class LooperApp(QMainWindow):
+    waveform_decoded = pyqtSignal(str, int, str, object) # key, request id, cache path, heights; emitted from the pool's callback thread
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("VJ Looper v21 (Stability Fixed)")
         self.resize(600, 850)
         QApplication.instance().setStyleSheet(DARK_THEME)
 
+        # One player/output/video item per (bank, key), made on first assignment and kept for the session;
+        # players/audio_outputs/video_items are views of the current bank's entries
+        self._bank_players = {}
+        self._bank_audio_outputs = {}
+        self._bank_video_items = {}
         self.players = {}
         self.audio_outputs = {}
         self.video_items = {} 
@@ -251,10 +370,20 @@ class LooperApp(QMainWindow):
         self.is_stuttering = False
         self.current_loop_speed = DEFAULT_LOOP_SPEED
         self.playback_rate = 1.0
-        self.active_workers = [] # Track threads
-        self.manual_loops = {} 
+        # Manual loops as parallel arrays indexed by pad (see _key_idx), checked on every position tick
+        self._key_idx = {key: i for i, key in enumerate(KEY_MAP)}
+        self._loop_active = np.zeros(len(KEY_MAP), dtype=bool)
+        self._loop_start = np.zeros(len(KEY_MAP), dtype=np.int64)
+        self._loop_end = np.zeros(len(KEY_MAP), dtype=np.int64)
         self.active_effect = None 
 
+        # Decode + peak reduction in separate processes so four drops don't fight the GUI for the GIL
+        self._decode_pool = self._new_decode_pool()
+        self._inflight = {} # (filepath, width, height, color) -> decode future still running
+        self._waveform_seq = 0; self._waveform_req = {} # key -> id of its latest waveform request; anything older is stale
+        self.waveform_decoded.connect(self.on_waveform_decoded)
+        QApplication.instance().aboutToQuit.connect(lambda: self._decode_pool.shutdown(wait=False, cancel_futures=True))
+
         self.stutter_timer = QTimer()
         self.stutter_timer.timeout.connect(self.perform_stutter_loop)
 
@@ -305,27 +434,6 @@ class LooperApp(QMainWindow):
             self.buttons[key] = btn
             grid_layout.addWidget(btn, row, col)
 
-            vid_item = QGraphicsVideoItem()
-            self.projector.scene.addItem(vid_item)
-            vid_item.hide()
-            vid_item.setZValue(0) 
-            self.video_items[key] = vid_item
-
-            audio_out = QAudioOutput()
-            audio_out.setVolume(1.0)
-            self.audio_outputs[key] = audio_out
-
-            player = QMediaPlayer()
-            player.setAudioOutput(audio_out)
-            player.setVideoOutput(vid_item)
-            player.setLoops(QMediaPlayer.Loops.Infinite)
-            
-            player.positionChanged.connect(lambda pos, k=key: self.on_position_changed(k, pos))
-            player.durationChanged.connect(lambda dur, k=key: self.on_duration_changed(k, dur))
-
-            self.players[key] = player
-            self.manual_loops[key] = {'active': False, 'start': 0, 'end': 0}
-
             pbar = QProgressBar()
             pbar.setTextVisible(False)
             self.progress_bars[key] = pbar
@@ -358,52 +466,106 @@ class LooperApp(QMainWindow):
             self.update_status(f"EFFECT: {effect_name}")
 
     def set_manual_loop(self, key, start_ratio, end_ratio):
+        if key not in self.players: return
         duration = self.players[key].duration()
         if duration > 0:
-            self.manual_loops[key] = {'active': True, 'start': int(start_ratio*duration), 'end': int(end_ratio*duration)}
-            if self.current_key == key: self.players[key].setPosition(self.manual_loops[key]['start'])
+            i = self._key_idx[key]
+            self._loop_start[i] = int(start_ratio*duration)
+            self._loop_end[i] = int(end_ratio*duration)
+            self._loop_active[i] = True
+            if self.current_key == key: self.players[key].setPosition(int(self._loop_start[i]))
 
     def clear_manual_loop(self, key):
-        self.manual_loops[key]['active'] = False
+        self._loop_active[self._key_idx[key]] = False
 
     def on_position_changed(self, key, position):
         duration = self.players[key].duration()
         if duration == 0: return
         self.buttons[key].update_playhead(position / duration)
         
-        loop_data = self.manual_loops[key]
-        if loop_data['active'] and not self.is_stuttering:
-            if position >= loop_data['end']: self.players[key].setPosition(loop_data['start'])
+        i = self._key_idx[key]
+        if self._loop_active[i] and not self.is_stuttering:
+            if position >= self._loop_end[i]: self.players[key].setPosition(int(self._loop_start[i]))
 
     def on_duration_changed(self, key, duration):
         pass
 
     def generate_waveform(self, key, filepath):
-        self.buttons[key].filename = os.path.basename(filepath)
-        self.buttons[key].update()
+        self._waveform_seq += 1; req = self._waveform_req[key] = self._waveform_seq
+        self.buttons[key].set_filename(os.path.basename(filepath))
         color = self.buttons[key].base_color.name()
-        
-        worker = WaveformWorker(key, filepath, 200, 120, color)
-        
-        # --- THE STABILITY FIX: CONNECT FINISHED TO CLEANUP ---
-        worker.finished.connect(self.on_waveform_ready)
-        worker.finished.connect(lambda: self.cleanup_worker(worker))
-        
-        self.active_workers.append(worker)
-        worker.start()
+        width, height = self.waveform_size(key)
 
-    def cleanup_worker(self, worker):
-        """ Removes thread from memory once done. """
-        if worker in self.active_workers:
-            self.active_workers.remove(worker)
-        worker.deleteLater()
+        # --- DISK CACHE: same file (unchanged on disk) + same look = reuse the PNG ---
+        cache_path = None
+        try:
+            st = os.stat(filepath)
+            cache_path = _waveform_cache_path((os.path.abspath(filepath), st.st_mtime_ns, st.st_size, width, height, color))
+            if os.path.exists(cache_path):
+                image = QImage()
+                if image.load(cache_path, "PNG"):
+                    self.on_waveform_ready(key, image)
+                    return
+        except OSError: pass
+        
+        # Same file + same look already decoding (double drop, set load): wait on that job instead
+        job = (filepath, width, height, color)
+        future = self._inflight.get(job)
+        if future is None:
+            try: future = self._submit_decode(filepath, width)
+            except RuntimeError: # Pool shut down (app quitting) or broken again straight away
+                self.on_waveform_decoded(key, req, "", None)
+                return
+            self._inflight[job] = future
+            future.add_done_callback(lambda f, j=job: self._inflight.pop(j, None) if self._inflight.get(j) is f else None)
+        # Done-callbacks run on an executor thread (or right here if it already finished); the signal queues the result to the GUI thread
+        future.add_done_callback(lambda f, k=key, r=req, path=cache_path or "": self.waveform_decoded.emit(
+            k, r, path, f.result() if not f.cancelled() and f.exception() is None else None))
+
+    def _new_decode_pool(self):
+        return ProcessPoolExecutor(max_workers=2, mp_context=multiprocessing.get_context("spawn"))
+
+    def _submit_decode(self, filepath, width):
+        try: return self._decode_pool.submit(_decode_heights, filepath, width)
+        except BrokenProcessPool:
+            # A worker died (decoder crash, OOM kill) and the executor refuses all further work: replace it once
+            self._decode_pool.shutdown(wait=False, cancel_futures=True)
+            self._decode_pool = self._new_decode_pool()
+            return self._decode_pool.submit(_decode_heights, filepath, width)
+
+    def on_waveform_decoded(self, key, req, cache_path, heights):
+        if key not in self.buttons: return
+        # Rapid bank cycling / re-drops: only the pad's latest request may paint it
+        current = self._waveform_req.get(key) == req
+        if heights is None: # Undecodable clip or a dead pool worker: blank the pad rather than keep the previous clip's waveform
+            if current: self.buttons[key].set_waveform(None)
+            return
+        image = _paint_waveform(heights, *self.waveform_size(key), self.buttons[key].base_color.name())
+        if cache_path: self.store_waveform(cache_path, image) # Cached even if stale: the bank will come round again
+        if current: self.on_waveform_ready(key, image)
 
-    def on_waveform_ready(self, key, pixmap):
-        if key in self.buttons: self.buttons[key].set_waveform(pixmap)
+    def store_waveform(self, cache_path, image):
+        try:
+            os.makedirs(WAVEFORM_CACHE_DIR, exist_ok=True)
+            image.save(cache_path, "PNG")
+        except OSError as e: print(f"Waveform Cache Error: {e}")
+
+    def waveform_size(self, key):
+        """ Pad size in device pixels, so HiDPI screens get a native-resolution waveform. """
+        dpr = self.buttons[key].devicePixelRatioF()
+        return int(200 * dpr), int(120 * dpr)
+
+    def on_waveform_ready(self, key, image):
+        if key not in self.buttons: return
+        pixmap = QPixmap.fromImage(image)
+        # Tag with the scale it was drawn at (PNGs don't keep it) so drawPixmap blits 1:1 instead of resampling
+        pixmap.setDevicePixelRatio(image.width() / self.buttons[key].width())
+        self.buttons[key].set_waveform(pixmap)
 
     def assign_clip_to_bank(self, key, filepath):
         self.bank_data[self.current_bank][key] = filepath
-        self.load_player(key, filepath)
+        self.load_player(self.current_bank, key, filepath)
+        self.refresh_bank_view()
         self.generate_waveform(key, filepath)
 
     def switch_bank(self, new_bank_index):
@@ -412,27 +574,72 @@ class LooperApp(QMainWindow):
             self.players[self.current_key].stop()
             self.video_items[self.current_key].hide()
             self.current_key = None
+        self.drum_key_active = None
         self.current_bank = new_bank_index
         self.update_bank_visuals()
+        # Players for this bank are already loaded: swapping is just changing which ones we address
+        self.refresh_bank_view()
         current_data = self.bank_data[self.current_bank]
         for key in KEY_MAP.keys():
-            self.manual_loops[key]['active'] = False
+            self._loop_active[self._key_idx[key]] = False
             self.buttons[key].clear_loop()
             if key in current_data:
-                path = current_data[key]
-                self.load_player(key, path)
-                self.generate_waveform(key, path)
+                self.generate_waveform(key, current_data[key])
             else:
-                self.players[key].setSource(QUrl())
-                self.buttons[key].filename = "[Empty]"
+                self._waveform_req.pop(key, None) # A decode still running for the old bank must not land here
+                self.buttons[key].filename = "[Empty]" # set_waveform rebuilds the base for both
                 self.buttons[key].set_waveform(None)
 
-    def load_player(self, key, filepath):
-        self.players[key].setSource(QUrl.fromLocalFile(filepath))
-        self.audio_outputs[key].setVolume(1.0)
-        self.players[key].pause()
-        self.players[key].setPosition(0)
-        self.players[key].setPlaybackRate(self.playback_rate)
+    def refresh_bank_view(self):
+        bank = self.current_bank
+        self.players = {k: p for (b, k), p in self._bank_players.items() if b == bank}
+        self.audio_outputs = {k: a for (b, k), a in self._bank_audio_outputs.items() if b == bank}
+        self.video_items = {k: v for (b, k), v in self._bank_video_items.items() if b == bank}
+
+    def ensure_player(self, bank, key):
+        slot = (bank, key)
+        if slot in self._bank_players: return self._bank_players[slot]
+
+        vid_item = QGraphicsVideoItem()
+        self.projector.scene.addItem(vid_item)
+        vid_item.hide()
+        vid_item.setZValue(0) 
+
+        audio_out = QAudioOutput()
+        audio_out.setVolume(1.0)
+
+        player = QMediaPlayer()
+        player.setAudioOutput(audio_out)
+        player.setVideoOutput(vid_item)
+        player.setLoops(QMediaPlayer.Loops.Infinite)
+        
+        # Parked banks' players are paused, but ignore them anyway so they can't drive the visible pads
+        player.positionChanged.connect(lambda pos, b=bank, k=key: self.on_position_changed(k, pos) if b == self.current_bank else None)
+        player.durationChanged.connect(lambda dur, b=bank, k=key: self.on_duration_changed(k, dur) if b == self.current_bank else None)
+
+        self._bank_players[slot] = player
+        self._bank_audio_outputs[slot] = audio_out
+        self._bank_video_items[slot] = vid_item
+        return player
+
+    def release_player(self, bank, key):
+        player = self._bank_players.pop((bank, key), None)
+        if player is None: return
+        player.stop()
+        player.setSource(QUrl())
+        player.setVideoOutput(None)
+        self.projector.scene.removeItem(self._bank_video_items.pop((bank, key)))
+        self._bank_audio_outputs.pop((bank, key))
+        player.deleteLater()
+
+    def load_player(self, bank, key, filepath):
+        player = self.ensure_player(bank, key)
+        url = QUrl.fromLocalFile(filepath)
+        if player.source() != url: player.setSource(url) # Same clip: keep the decoder it already has
+        self._bank_audio_outputs[(bank, key)].setVolume(1.0)
+        player.pause()
+        player.setPosition(0)
+        player.setPlaybackRate(self.playback_rate)
 
     def update_bank_visuals(self):
         for i, lbl in enumerate(self.bank_labels):
@@ -456,6 +663,15 @@ class LooperApp(QMainWindow):
                 with open(filename, 'r') as f:
                     raw_data = json.load(f)
                     self.bank_data = {int(k): v for k, v in raw_data.items()}
+                if self.current_key:
+                    self.players[self.current_key].stop()
+                    self.video_items[self.current_key].hide()
+                    self.current_key = None
+                # Preload every bank now so later bank switches never touch setSource
+                for bank, key in list(self._bank_players):
+                    if key not in self.bank_data.get(bank, {}): self.release_player(bank, key)
+                for bank, slots in self.bank_data.items():
+                    for key, path in slots.items(): self.load_player(bank, key, path)
                 saved_bank = self.current_bank
                 self.current_bank = -1 
                 self.switch_bank(saved_bank)
@@ -464,9 +680,10 @@ class LooperApp(QMainWindow):
 
     def perform_stutter_loop(self):
         if self.current_key:
-            self.players[self.current_key].setPosition(self.cue_point)
-            if self.players[self.current_key].playbackState() != QMediaPlayer.PlaybackState.PlayingState:
-                self.players[self.current_key].play()
+            player = self.players[self.current_key]
+            player.setPosition(self.cue_point) # The timer fires once per loop, so every tick is a boundary
+            if player.playbackState() != QMediaPlayer.PlaybackState.PlayingState:
+                player.play()
 
     def set_loop_speed(self, ms, name):
         self.current_loop_speed = ms
@@ -529,8 +746,9 @@ class LooperApp(QMainWindow):
             elif not modifiers:
                 self.switch_to_key(key)
                 self.drum_key_active = None
-                if self.manual_loops[key]['active']:
-                    self.players[key].setPosition(self.manual_loops[key]['start'])
+                i = self._key_idx[key]
+                if self._loop_active[i]:
+                    self.players[key].setPosition(int(self._loop_start[i]))
                 else:
                     self.players[key].setPosition(0)
                 self.players[key].play()